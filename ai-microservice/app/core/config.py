@@ -3,22 +3,71 @@
 # 1. Imports
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from app.core.versions import current_version
+
 # The service package lives at ai-microservice/app/core/config.py, so the model
 # file (ai-microservice/best.pt) sits three parents up. Resolved to an absolute
 # path so the model loads regardless of the process working directory.
 _DEFAULT_MODEL_PATH = str((Path(__file__).resolve().parents[2] / "best.pt"))
+_DEFAULT_ONNX_MODEL_PATH = str((Path(__file__).resolve().parents[2] / "best.onnx"))
+_DEFAULT_ONNX_INT8_MODEL_PATH = str((Path(__file__).resolve().parents[2] / "best.int8.onnx"))
 
 
 # 2. Settings
 class Settings(BaseSettings):
     """Typed application settings. Values come from environment variables or .env."""
 
-    # Path to the trained YOLO weights.
+    # Which runtime executes the network: "torch" loads best.pt through
+    # ultralytics; "onnx" runs the graph from scripts/ai-model/export-onnx.py
+    # with onnxruntime (no torch in the image).
+    inference_backend: Literal["torch", "onnx"] = "torch"
+
+    # Path to the trained YOLO weights (torch backend).
     model_path: str = _DEFAULT_MODEL_PATH
 
+    # Path to the exported ONNX graph (onnx backend).
+    onnx_model_path: str = _DEFAULT_ONNX_MODEL_PATH
+
+    # Weight precision for the onnx backend: "fp32" serves onnx_model_path,
+    # "int8" the dynamically quantized graph from scripts/ai-model/quantize-model.py
+    # (cheaper on CPU; check its accuracy with compare-backends.py first).
+    model_precision: Literal["fp32", "int8"] = "fp32"
+    onnx_int8_model_path: str = _DEFAULT_ONNX_INT8_MODEL_PATH
+
+    # Versioned model directory (see app/core/versions.py): when set, the
+    # weights are read from MODEL_DIR/<version>/ under the file names of the
+    # three paths above. `model_version` pins the startup version; empty serves
+    # the one MODEL_DIR/CURRENT names, else the newest. POST /admin/model swaps
+    # versions at runtime (only with `admin_token` set, sent as X-Admin-Token);
+    # every `model_watch_interval_s` seconds each process also checks CURRENT
+    # and follows a swap made elsewhere (another pre-fork worker). 0 disables.
+    model_dir: str = ""
+    model_version: str = ""
+    admin_token: str = ""
+    model_watch_interval_s: float = 5.0
+
+    # Square model input size (matches training imgsz=640). The onnx backend
+    # letterboxes to it, and the fast decode path sizes uploads to it.
+    imgsz: int = 640
+
+    # Decode JPEG uploads straight to ~imgsz (DCT-scaled) and hand the model a
+    # ready-sized array; boxes are mapped back to original pixels. Disable to
+    # decode every upload at full resolution.
+    fast_decode: bool = True
+
+    # Cold start: with `background_warmup` uvicorn binds its port immediately and
+    # the model loads in a background thread (GET /ready turns 200 once done);
+    # disable it to finish loading before the port opens. `warmup_inference`
+    # runs one dummy forward pass at imgsz so the first real request doesn't
+    # pay for lazy kernel init and first-call allocations.
+    background_warmup: bool = True
+    warmup_inference: bool = True
+
     # Minimum per-box confidence for a detection to count (matches the FYP
     # evaluation script's CONF_THRESHOLD so the service and the report agree).
     conf_threshold: float = 0.25
@@ -27,9 +76,83 @@ class Settings(BaseSettings):
     # by the custom NMS. Differing types (pothole inside a crack) are exempt.
     iomin_threshold: float = 0.45
 
+    # Cascade mode: run a cheap pass at `cascade_imgsz` first. If it finds no
+    # box at or above `cascade_empty_conf`, the image is answered "no hazard";
+    # if every box it finds scores at least `cascade_accept_conf`, its result
+    # stands. Anything in between is re-run at full imgsz. Results record the
+    # path taken in `inference_path`. Needs empty <= conf_threshold <= accept.
+    cascade_enabled: bool = False
+    cascade_imgsz: int = 320
+    cascade_empty_conf: float = 0.10
+    cascade_accept_conf: float = 0.60
+
+    # Micro-batching: requests arriving within `batch_max_wait_ms` of each other
+    # are grouped (up to `batch_max_size` images) into one forward pass.
+    # A batch size of 1 restores strict one-image-at-a-time inference.
+    batch_max_size: int = 8
+    batch_max_wait_ms: float = 5.0
+
+    # Process-pool inference: N model replicas in worker processes, each limited
+    # to `threads_per_replica` intra-op threads (YOLOv8s scales poorly past ~2).
+    # 0 keeps inference in-process behind the micro-batcher above.
+    inference_replicas: int = 0
+    threads_per_replica: int = 2
+    # A replica that takes longer than this on one image is killed and restarted.
+    replica_timeout_s: float = 60.0
+
+    # Admission control for /detect: decode + inference run on a dedicated pool
+    # of `inference_workers` threads (keep it >= batch_max_size, or the replica
+    # count, so batches can fill), with at most `inference_queue_depth` requests
+    # waiting. Beyond that the endpoint sheds load with 503 + Retry-After.
+    inference_workers: int = 8
+    inference_queue_depth: int = 32
+    overload_retry_after_s: int = 2
+
+    # Result cache keyed by image-content hash + model + thresholds. Identical
+    # uploads (app retries, re-submitted photos) skip decode and inference, and
+    # concurrent identical uploads share one computation. 0 entries disables.
+    result_cache_entries: int = 512
+    result_cache_max_bytes: int = 8 * 1024 * 1024
+    result_cache_ttl_s: float = 600.0
+
+    # Near-duplicate index of recently validated uploads (64-bit perceptual
+    # hash). An upload within `dedup_max_distance` bits of one seen in the last
+    # `dedup_ttl_s` seconds gets that result back, flagged `probable_duplicate`,
+    # without inference. With `lat`/`lon` on the request, only photos from the
+    # same or an adjacent `dedup_cell_deg` grid cell match (0.001° ≈ 110 m);
+    # without them, only photos that also came without a location.
+    # 0 entries disables.
+    dedup_entries: int = 1024
+    dedup_max_distance: int = 8
+    dedup_ttl_s: float = 24 * 3600.0
+    dedup_cell_deg: float = 0.001
+
+    # Add a Server-Timing header (upload_read, queue_wait, decode, infer, nms,
+    # aggregate, serialize, total — in ms) to /detect responses. The same stages
+    # are always recorded as histograms on /metrics.
+    server_timing: bool = False
+
     # Cap on the uploaded image size (bytes) the endpoint will accept (10 MB).
     max_upload_bytes: int = 10 * 1024 * 1024
 
+    # POST /detect/batch limits: images per request and total request body size.
+    # Each image is still individually capped at max_upload_bytes.
+    batch_max_images: int = 200
+    batch_max_upload_bytes: int = 100 * 1024 * 1024
+
+    # WebSocket /stream (dashcam frames). A frame whose 16×16 grayscale thumbnail
+    # differs from one of the last `stream_duplicate_window` processed frames by
+    # less than `stream_duplicate_threshold` (mean absolute difference, 0–1; 0
+    # disables) is skipped. Detections of the same type overlapping by at least
+    # `stream_track_iou` in consecutive processed frames are merged into one
+    # hazard, which ends after `stream_track_max_gap` processed frames without it.
+    # At most `stream_max_pending` received frames wait for the model.
+    stream_duplicate_threshold: float = 0.03
+    stream_duplicate_window: int = 4
+    stream_track_iou: float = 0.3
+    stream_track_max_gap: int = 3
+    stream_max_pending: int = 32
+
     cors_origins: str = "*"
 
     api_title: str = "JalanGuard AI Detection Service"
@@ -42,10 +165,49 @@ class Settings(BaseSettings):
         """CORS origins as a list. A bare '*' means allow all."""
         return [origin.strip() for origin in self.cors_origins.split(",") if origin.strip()]
 
+    @model_validator(mode="after")
+    def _check_precision(self) -> "Settings":
+        if self.model_precision == "int8" and self.inference_backend != "onnx":
+            raise ValueError("MODEL_PRECISION=int8 requires INFERENCE_BACKEND=onnx.")
+        return self
+
+    @model_validator(mode="after")
+    def _check_cascade(self) -> "Settings":
+        if self.cascade_enabled and not (
+            self.cascade_empty_conf <= self.conf_threshold <= self.cascade_accept_conf
+        ):
+            raise ValueError(
+                "Cascade thresholds must satisfy "
+                "CASCADE_EMPTY_CONF <= CONF_THRESHOLD <= CASCADE_ACCEPT_CONF."
+            )
+        return self
+
+    @model_validator(mode="after")
+    def _resolve_model_version(self) -> "Settings":
+        if self.model_dir and not self.model_version:
+            self.model_version = current_version(self.model_dir) or ""
+        return self
+
+    @property
+    def active_model_path(self) -> str:
+        """Weights file used by the selected inference backend, precision and
+        (with ``model_dir``) model version."""
+        if self.inference_backend == "torch":
+            path = self.model_path
+        else:
+            path = self.onnx_int8_model_path if self.model_precision == "int8" else self.onnx_model_path
+        if self.model_dir:
+            return str(Path(self.model_dir) / self.model_version / Path(path).name)
+        return path
+
+    def for_version(self, version: str) -> "Settings":
+        """These settings, serving ``version`` of ``model_dir`` instead."""
+        return self.model_copy(update={"model_version": version})
+
     @property
     def model_exists(self) -> bool:
-        """True when the configured weights file is present on disk."""
-        return Path(self.model_path).is_file()
+        """True when the selected backend's weights file is present on disk."""
+        return Path(self.active_model_path).is_file()
 
 
 # 3. Cached accessor — a single Settings instance per process
@@ -0,0 +1,225 @@
+"""Prometheus metrics and per-request stage timing.
+
+A deliberately small, dependency-free registry: counters, gauges (set directly
+or read from a callback at scrape time) and cumulative-bucket histograms,
+rendered in the Prometheus text exposition format on ``/metrics``. Observing
+is a dict lookup, a ``bisect`` and an increment under a per-metric lock, so it
+stays on in production.
+
+:func:`stage` times one step of the pipeline into the ``stage`` histogram and,
+when the current request opted in via :func:`start_request_timing`, into that
+request's breakdown too — which the detect router turns into a
+``Server-Timing`` header. The breakdown travels in a ``ContextVar``, so it
+follows the request onto the inference executor's worker thread.
+"""
+
+# 1. Imports
+import bisect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+_PREFIX = "jalanguard_ai_"
+
+# Seconds; spans sub-millisecond NMS up to a cold multi-second forward pass.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_timings: ContextVar[dict[str, float] | None] = ContextVar("request_timings", default=None)
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# 2. Metric types
+class _Metric(ABC):
+    """Name, help text and labels shared by every metric type; subclasses
+    provide the exposition lines."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = _PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """This metric's sample lines, without the HELP/TYPE header."""
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in values]
+
+
+class Gauge(_Metric):
+    """A settable gauge, or — with ``callback`` — one read fresh at each scrape.
+    The callback returns ``{labelvalues: value}`` (``{(): value}`` if unlabelled)."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        callback: Callable[[], dict[tuple[str, ...], float]] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def _samples(self) -> list[str]:
+        if self.callback is not None:
+            values = list(self.callback().items())
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._bounds = tuple(sorted(buckets))
+        # labelvalues -> [per-bucket counts (last = +Inf), sum]
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = ([0] * (len(self._bounds) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            snapshot = [(k, list(counts), total[0]) for k, (counts, total) in self._series.items()]
+        lines = []
+        for labelvalues, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip((*self._bounds, math.inf), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return lines
+
+
+# 3. Registry
+REGISTRY: list[_Metric] = []
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "".join(metric.render() for metric in REGISTRY)
+
+
+# 4. Pipeline metrics
+STAGE_SECONDS = Histogram(
+    "stage_seconds",
+    "Time spent in each stage of a detection request.",
+    ("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "request_seconds",
+    "End-to-end handler time of detection requests.",
+    ("endpoint", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "requests_in_flight",
+    "Detection requests currently being handled (reading, queued or running).",
+    ("endpoint",),
+)
+BATCH_SIZE = Histogram(
+    "batch_size",
+    "Images per model forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record one stage duration globally and in the current request's breakdown."""
+    STAGE_SECONDS.observe(seconds, name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as pipeline stage ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+# 5. Server-Timing
+def start_request_timing() -> dict[str, float]:
+    """Collect stage timings for the current request (and the work it hands off)."""
+    timings: dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: dict[str, float]) -> str:
+    """``Server-Timing`` value, durations in milliseconds."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
@@ -0,0 +1,60 @@
+"""Versioned model directory layout.
+
+With ``MODEL_DIR`` set, each model version is a subdirectory holding the same
+file names the single-file setup uses (best.pt, best.onnx, best.int8.onnx)::
+
+    models/
+      2024-05-v1/best.pt
+      2024-07-v2/best.pt
+      CURRENT            <- "2024-07-v2"
+
+``CURRENT`` names the version to serve; without it the newest version (natural
+sort order of the directory names) is served. Hot swaps rewrite it atomically,
+so restarts and sibling workers follow the swap.
+"""
+
+# 1. Imports
+import os
+import re
+from pathlib import Path
+
+POINTER_FILE = "CURRENT"
+
+# Response header naming the model version that served a request.
+VERSION_HEADER = "X-Model-Version"
+
+
+# 2. Layout
+def _natural_key(name: str) -> list:
+    """Sort key under which "v10" comes after "v9"."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def list_versions(model_dir: str) -> list[str]:
+    """Version names (subdirectories of ``model_dir``), oldest first."""
+    root = Path(model_dir)
+    if not root.is_dir():
+        return []
+    return sorted((p.name for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")), key=_natural_key)
+
+
+def read_pointer(model_dir: str) -> str | None:
+    """The version ``CURRENT`` names, or None when it is missing or empty."""
+    try:
+        return (Path(model_dir) / POINTER_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_version(model_dir: str) -> str | None:
+    """The version to serve: ``CURRENT`` if set, else the newest one."""
+    versions = list_versions(model_dir)
+    return read_pointer(model_dir) or (versions[-1] if versions else None)
+
+
+def write_pointer(model_dir: str, version: str) -> None:
+    """Point ``CURRENT`` at ``version`` (write to a temp file, then rename)."""
+    target = Path(model_dir) / POINTER_FILE
+    tmp = target.with_name(f".{POINTER_FILE}.{os.getpid()}.tmp")
+    tmp.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp, target)
@@ -1,4 +1,4 @@
-"""Pydantic response models for the detection endpoint.
+"""Pydantic response models for the detection endpoints.
 
 The mobile app consumes these directly to auto-fill the hazard report, so the
 field names here are the contract between the two services.
@@ -54,3 +54,123 @@ class DetectionResult(BaseModel):
         default_factory=list, description="Per-box breakdown, for transparency/debugging."
     )
     message: str = Field(..., description="Human-readable summary of the outcome.")
+    inference_path: Optional[Literal["low_res_empty", "low_res_positive", "full_res"]] = Field(
+        None,
+        description=(
+            "Cascade mode only: which pass produced the result — the low-resolution "
+            "pass (confidently empty / confidently positive) or the full-resolution one."
+        ),
+    )
+    probable_duplicate: bool = Field(
+        False,
+        description=(
+            "True when the photo nearly matches a recently validated one (from the same "
+            "area, when a location was sent). The result is then that photo's, returned "
+            "without inference."
+        ),
+    )
+    duplicate_distance: Optional[int] = Field(
+        None, description="Probable duplicates only: perceptual-hash distance in bits (0 = alike)."
+    )
+    model_version: Optional[str] = Field(
+        None, description="Model version that produced the result (see GET /health)."
+    )
+
+
+class BatchItemResult(BaseModel):
+    """Outcome for one image of a batch: a result, or the reason it failed."""
+
+    index: int = Field(..., description="Position of the image in the request (0-based).")
+    filename: Optional[str] = Field(None, description="Client-supplied file name, if any.")
+    result: Optional[DetectionResult] = Field(
+        None, description="Detection result; null when this image failed."
+    )
+    error: Optional[str] = Field(
+        None, description="Why this image could not be processed; null on success."
+    )
+
+
+class BatchDetectionResult(BaseModel):
+    """Per-image results of POST /detect/batch, in request order.
+
+    A bad image fails only its own item — the request as a whole still succeeds.
+    """
+
+    count: int = Field(..., description="Number of images received.")
+    succeeded: int = Field(..., description="Images that produced a result.")
+    failed: int = Field(..., description="Images that produced an error instead.")
+    items: list[BatchItemResult] = Field(default_factory=list)
+
+
+class StreamHazard(BaseModel):
+    """One hazard merged across consecutive frames of a /stream session."""
+
+    track_id: int = Field(..., description="Session-unique id; frame events reference it.")
+    type: DefectType = Field(..., description="Base hazard type (crack | pothole).")
+    severity: Severity = Field(..., description="Worst severity seen across its frames.")
+    confidence: float = Field(..., ge=0, le=1, description="Best confidence seen across its frames.")
+    box: list[int] = Field(..., description="Pixel box [x1, y1, x2, y2] in its best frame.")
+    first_frame: int = Field(..., description="Index of the first frame it was detected in.")
+    last_frame: int = Field(..., description="Index of the last frame it was detected in.")
+    frames: int = Field(..., description="Number of processed frames it was detected in.")
+
+
+class StreamFrameEvent(BaseModel):
+    """Outcome for one received frame, sent in frame order."""
+
+    event: Literal["frame"] = "frame"
+    frame: int = Field(..., description="Index of the frame in the stream (0-based).")
+    status: Literal["processed", "skipped", "failed", "dropped"] = Field(
+        ...,
+        description=(
+            "processed — run through the model; skipped — near-duplicate of a recently "
+            "processed frame; failed — unreadable or oversized; dropped — the service was busy."
+        ),
+    )
+    duplicate_of: Optional[int] = Field(None, description="Skipped frames: the frame it duplicates.")
+    result: Optional[DetectionResult] = Field(None, description="Processed frames: the detection result.")
+    track_ids: list[int] = Field(
+        default_factory=list, description="Hazard track of each entry in `result.detections`, in order."
+    )
+    error: Optional[str] = Field(None, description="Failed / dropped frames: the reason.")
+
+
+class StreamHazardEvent(BaseModel):
+    """A hazard track that has ended: not seen for a few processed frames, or the stream closed."""
+
+    event: Literal["hazard"] = "hazard"
+    hazard: StreamHazard
+
+
+class StreamSummary(BaseModel):
+    """Last event of a stream, sent after the client's end message."""
+
+    event: Literal["summary"] = "summary"
+    frames: int = Field(..., description="Frames received.")
+    processed: int = Field(..., description="Frames run through the model.")
+    skipped: int = Field(..., description="Near-duplicate frames not run through the model.")
+    failed: int = Field(..., description="Frames that failed or were dropped.")
+    hazards: int = Field(..., description="Distinct hazards after merging across frames.")
+
+
+class ModelSwapRequest(BaseModel):
+    """Body of POST /admin/model."""
+
+    version: str = Field(..., min_length=1, description="Version (subdirectory of MODEL_DIR) to serve.")
+
+
+class ModelSwapResult(BaseModel):
+    """Outcome of a model swap."""
+
+    previous_version: str = Field(..., description="Version that was serving before the swap.")
+    model_version: str = Field(..., description="Version serving new requests now.")
+    timings_ms: dict[str, float] = Field(
+        default_factory=dict, description="Load and warm-up time of the new version, by stage."
+    )
+
+
+class ModelVersions(BaseModel):
+    """Response of GET /admin/model."""
+
+    model_version: Optional[str] = Field(None, description="Active version; null until the model has loaded.")
+    available: list[str] = Field(default_factory=list, description="Versions in MODEL_DIR, oldest first.")
@@ -0,0 +1,56 @@
+"""Admin endpoints — model version rollout without a redeploy.
+
+Disabled (404) unless ``ADMIN_TOKEN`` is set; callers send it in the
+``X-Admin-Token`` header.
+"""
+
+# 1. Imports
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from app.core.config import get_settings
+from app.models.schemas import ModelSwapRequest, ModelSwapResult, ModelVersions
+from app.services import detector
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+# 2. Auth
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    token = get_settings().admin_token
+    if not token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token.encode(), token.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token.")
+
+
+# 3. Endpoints
+@router.get("/model", response_model=ModelVersions, dependencies=[Depends(require_admin)])
+def model_versions() -> ModelVersions:
+    """The active model version and the versions available in MODEL_DIR."""
+    return ModelVersions(model_version=detector.model_version(), available=detector.available_versions())
+
+
+@router.post("/model", response_model=ModelSwapResult, dependencies=[Depends(require_admin)])
+def swap_model(request: ModelSwapRequest) -> ModelSwapResult:
+    """Swap the served model to another version of MODEL_DIR.
+
+    The new version is loaded and warmed while the current one keeps serving,
+    then takes over new requests; requests already running finish on the old
+    one. MODEL_DIR/CURRENT is updated, so restarts and other workers follow.
+    Returns 404 for an unknown version, 409 without MODEL_DIR or while another
+    swap is loading, and 500 if the new version fails to load (the old one
+    keeps serving).
+    """
+    try:
+        return ModelSwapResult(**detector.swap_model(request.version))
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc)) from exc
+    except (ValueError, detector.SwapInProgress) as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    except Exception as exc:  # noqa: BLE001 — a broken version must not take the service down
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Model version '{request.version}' failed to load: {type(exc).__name__}: {exc}",
+        ) from exc
@@ -1,13 +1,23 @@
 """Detection endpoint — accepts a photo, returns the validated hazard result."""
 
 # 1. Imports
+import asyncio
+import functools
 import logging
+import time
+from typing import Any, Awaitable, Callable
 
-from fastapi import APIRouter, File, HTTPException, UploadFile, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from pydantic import BaseModel
+from starlette.datastructures import UploadFile
+from starlette.types import Message, Receive
 
+from app.core import metrics, versions
 from app.core.config import get_settings
-from app.models.schemas import DetectionResult
+from app.models.schemas import BatchDetectionResult, BatchItemResult, DetectionResult
 from app.services import detector
+from app.services.admission import Overloaded
+from app.services.engine import ReplicaCrashed
 
 logger = logging.getLogger(__name__)
 
@@ -15,19 +25,311 @@ router = APIRouter(tags=["Detection"])
 
 _ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp", "image/bmp"}
 
+# Raw-body mode: the request body IS the image — no multipart parsing at all.
+_RAW_CONTENT_TYPES = _ALLOWED_CONTENT_TYPES | {"application/octet-stream"}
 
-# 2. Endpoint
+# Headroom on top of max_upload_bytes for the multipart boundary and part headers.
+_MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+# Non-standard (nginx) status for "client closed the connection first".
+_CLIENT_CLOSED_REQUEST = 499
+
+# Documents both accepted body shapes (and the optional location), since the
+# handler reads the stream and query itself.
+_REQUEST_BODY_DOC = {
+    "parameters": [
+        {
+            "name": name,
+            "in": "query",
+            "required": False,
+            "schema": {"type": "number"},
+            "description": f"{label} of the photo, in degrees; scopes the near-duplicate check.",
+        }
+        for name, label in (("lat", "Latitude"), ("lon", "Longitude"))
+    ],
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["image"],
+                    "properties": {
+                        "image": {
+                            "type": "string",
+                            "format": "binary",
+                            "description": "Road photo (JPEG/PNG/WebP).",
+                        }
+                    },
+                }
+            },
+            "application/octet-stream": {
+                "schema": {"type": "string", "format": "binary"},
+            },
+        },
+    }
+}
+
+_BATCH_REQUEST_BODY_DOC = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["images"],
+                    "properties": {
+                        "images": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "Road photos (JPEG/PNG/WebP), one part per image.",
+                        }
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+# 2. Upload ingestion
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="Image exceeds the maximum allowed size.",
+    )
+
+
+def _media_type(request: Request) -> str:
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+def _check_declared_length(request: Request, budget: int) -> None:
+    """Reject on the Content-Length header alone, before reading any body."""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > budget:
+        raise _too_large()
+
+
+def _budgeted_receive(receive: Receive, budget: int) -> Receive:
+    """Wrap the ASGI receive channel so the body stream aborts with 413 the
+    moment more than ``budget`` bytes have arrived (Content-Length can lie or
+    be absent with chunked transfer encoding)."""
+    received = 0
+
+    async def wrapped() -> Message:
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > budget:
+                raise _too_large()
+        return message
+
+    return wrapped
+
+
+async def _read_raw_body(request: Request, budget: int) -> bytes:
+    """Stream an octet-stream / image/* body in chunks under a running budget."""
+    chunks: list[bytes] = []
+    async for chunk in Request(request.scope, _budgeted_receive(request.receive, budget)).stream():
+        chunks.append(chunk)
+    # One join → immutable bytes the decoder can wrap without copying again.
+    return b"".join(chunks)
+
+
+async def _read_multipart_image(request: Request, budget: int) -> bytes:
+    """Parse a multipart body whose stream is budgeted, and return the `image` part."""
+    limited = Request(request.scope, _budgeted_receive(request.receive, budget))
+    async with limited.form(max_files=1, max_fields=8) as form:
+        image = form.get("image")
+        if not isinstance(image, UploadFile):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Multipart body must contain an 'image' file field.",
+            )
+        if image.content_type and image.content_type not in _ALLOWED_CONTENT_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Unsupported image type '{image.content_type}'.",
+            )
+        return await image.read()
+
+
+async def read_image_upload(request: Request) -> bytes:
+    """Read the uploaded image from either body mode, enforcing max_upload_bytes
+    up front (Content-Length) and while streaming (running byte budget)."""
+    max_bytes = get_settings().max_upload_bytes
+    media_type = _media_type(request)
+
+    if media_type == "multipart/form-data":
+        budget = max_bytes + _MULTIPART_OVERHEAD_BYTES
+        _check_declared_length(request, budget)
+        data = await _read_multipart_image(request, budget)
+    elif media_type in _RAW_CONTENT_TYPES:
+        _check_declared_length(request, max_bytes)
+        data = await _read_raw_body(request, max_bytes)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=(
+                f"Unsupported content type '{media_type or 'none'}'. Send multipart/form-data "
+                "with an 'image' field, or the raw image as application/octet-stream."
+            ),
+        )
+
+    if not data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image upload.")
+    if len(data) > max_bytes:
+        raise _too_large()
+    return data
+
+
+def read_location(request: Request) -> tuple[float, float] | None:
+    """Optional ``lat`` / ``lon`` query parameters (WGS84 degrees), which scope
+    the near-duplicate check to photos taken nearby. Both or neither."""
+    lat, lon = request.query_params.get("lat"), request.query_params.get("lon")
+    if lat is None and lon is None:
+        return None
+    try:
+        location = (float(lat), float(lon))
+    except (TypeError, ValueError):
+        location = None
+    if location is None or not (-90 <= location[0] <= 90 and -180 <= location[1] <= 180):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="'lat' and 'lon' must be given together, as degrees within range.",
+        )
+    return location
+
+
+# 3. Inference admission
+async def _client_disconnected(request: Request) -> None:
+    """Return once the client has gone away. Only valid after the body has been
+    fully read, when the next ASGI message can only be the disconnect."""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def run_admitted(request: Request, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a detection call on the inference executor, off the event loop.
+
+    Answers 503 + Retry-After at once when the executor's queue is full. If the
+    client disconnects while the call is still queued it is cancelled and never
+    runs; once running it is left to finish (its result still fills the cache).
+    """
+    try:
+        future = detector.submit(fn, *args)
+    except Overloaded as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Detection service is busy; retry shortly.",
+            headers={"Retry-After": str(get_settings().overload_retry_after_s)},
+        ) from exc
+
+    result = asyncio.wrap_future(future)
+    disconnect = asyncio.ensure_future(_client_disconnected(request))
+    try:
+        await asyncio.wait({result, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if not result.done() and future.cancel():
+            raise HTTPException(
+                status_code=_CLIENT_CLOSED_REQUEST, detail="Client closed the request."
+            )
+        # asyncio.shield: leaving early must not cancel the (running) call.
+        return await asyncio.shield(result)
+    finally:
+        disconnect.cancel()
+
+
+async def run_detection(request: Request, fn: Callable[..., Any], *args: Any) -> Any:
+    """:func:`run_admitted`, with the call's failures mapped to JSON errors:
+    ValueError (unreadable image) → 400, a crashed replica → 503, anything
+    else (e.g. a model that failed to load) → 500, logged."""
+    try:
+        return await run_admitted(request, fn, *args)
+    except HTTPException:
+        raise
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    except ReplicaCrashed as exc:
+        logger.error("Detection failed: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Detection service is restarting; retry shortly.",
+            headers={"Retry-After": str(get_settings().overload_retry_after_s)},
+        ) from exc
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Detection failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Detection failed while processing the image.",
+        ) from exc
+
+
+# 4. Instrumentation
+def _instrumented(endpoint: str):
+    """Wrap a handler with the request metrics (in-flight gauge, latency by
+    status) and per-stage timing. The result is serialised here, as its own
+    stage, and — with ``server_timing`` on — the breakdown is returned to the
+    client in a ``Server-Timing`` header."""
+
+    def decorate(handler: Callable[[Request], Awaitable[BaseModel]]):
+        @functools.wraps(handler)
+        async def wrapper(request: Request) -> Response:
+            timings = metrics.start_request_timing()
+            metrics.REQUESTS_IN_FLIGHT.inc(endpoint)
+            started = time.perf_counter()
+            status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+            try:
+                result = await handler(request)
+                with metrics.stage("serialize"):
+                    body = result.model_dump_json()
+                status_code = status.HTTP_200_OK
+            except HTTPException as exc:
+                status_code = exc.status_code
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.REQUESTS_IN_FLIGHT.dec(endpoint)
+                metrics.REQUEST_SECONDS.observe(elapsed, endpoint, str(status_code))
+
+            headers = {}
+            if version := getattr(result, "model_version", None):
+                headers[versions.VERSION_HEADER] = version  # the version that produced it
+            if get_settings().server_timing:
+                timings["total"] = elapsed
+                headers["Server-Timing"] = metrics.server_timing_header(timings)
+            return Response(body, media_type="application/json", headers=headers)
+
+        return wrapper
+
+    return decorate
+
+
+# 5. Endpoints
 @router.post(
     "/detect",
     response_model=DetectionResult,
     summary="Validate a road-hazard photo and auto-classify it",
+    openapi_extra=_REQUEST_BODY_DOC,
 )
-async def detect(image: UploadFile = File(..., description="Road photo (JPEG/PNG/WebP).")) -> DetectionResult:
+@_instrumented("detect")
+async def detect(request: Request) -> DetectionResult:
     """Run the YOLO model on an uploaded photo.
 
+    Accepts either a multipart form with an `image` file field, or the raw image
+    bytes as the request body (`application/octet-stream` or `image/*`), which
+    skips multipart parsing entirely. Optional `lat` / `lon` query parameters
+    scope the near-duplicate check to photos taken nearby.
+
+    A photo that nearly matches a recently validated one gets that photo's
+    result back at once, with `probable_duplicate: true`.
+
     Returns 200 with `detected: false` when the image is valid but contains no
     hazard (the caller shows a "no hazard found" message and blocks the report).
-    Returns 4xx only for malformed requests, and 503 when the model is missing.
+    Returns 4xx only for malformed requests, and 503 when the model is missing,
+    the inference queue is full or no model replica is available (with
+    `Retry-After`).
     """
     settings = get_settings()
 
@@ -37,28 +339,88 @@ async def detect(image: UploadFile = File(..., description="Road photo (JPEG/PNG
             detail="Detection model is not available on the server.",
         )
 
-    if image.content_type and image.content_type not in _ALLOWED_CONTENT_TYPES:
+    location = read_location(request)
+    with metrics.stage("upload_read"):
+        data = await read_image_upload(request)
+
+    # Off the event loop, so concurrent uploads reach the micro-batcher
+    # together instead of being serialised by this handler.
+    return await run_detection(request, detector.analyze_image, data, location)
+
+
+@router.post(
+    "/detect/batch",
+    response_model=BatchDetectionResult,
+    summary="Validate and classify a set of road-hazard photos in one request",
+    openapi_extra=_BATCH_REQUEST_BODY_DOC,
+)
+@_instrumented("detect_batch")
+async def detect_batch(request: Request) -> BatchDetectionResult:
+    """Run the YOLO model over many photos (multipart, repeated `images` field).
+
+    Images go through the model in batched forward passes. The response holds
+    one item per image, in request order; an unreadable, oversized or
+    unsupported image fails only its own item (``error`` set, ``result`` null).
+    The request itself fails only when it is malformed, exceeds
+    ``batch_max_images`` / ``batch_max_upload_bytes``, or the model is missing.
+    """
+    settings = get_settings()
+
+    if not settings.model_exists:
         raise HTTPException(
-            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-            detail=f"Unsupported image type '{image.content_type}'.",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Detection model is not available on the server.",
         )
-
-    data = await image.read()
-    if not data:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image upload.")
-    if len(data) > settings.max_upload_bytes:
+    if _media_type(request) != "multipart/form-data":
         raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="Image exceeds the maximum allowed size.",
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send multipart/form-data with one 'images' file part per photo.",
         )
 
-    try:
-        return detector.analyze_image(data)
-    except ValueError as exc:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
-    except Exception as exc:  # noqa: BLE001
-        logger.exception("Detection failed")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Detection failed while processing the image.",
-        ) from exc
+    budget = settings.batch_max_upload_bytes
+    _check_declared_length(request, budget)
+    limited = Request(request.scope, _budgeted_receive(request.receive, budget))
+
+    async with limited.form(max_files=settings.batch_max_images, max_fields=8) as form:
+        uploads = [u for u in form.getlist("images") if isinstance(u, UploadFile)]
+        if not uploads:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Multipart body must contain at least one 'images' file field.",
+            )
+
+        # Per-item validation; only the survivors are read and sent to the model.
+        items = [BatchItemResult(index=i, filename=u.filename) for i, u in enumerate(uploads)]
+        accepted: list[int] = []
+        for item, upload in zip(items, uploads):
+            if upload.content_type and upload.content_type not in _ALLOWED_CONTENT_TYPES:
+                item.error = f"Unsupported image type '{upload.content_type}'."
+            elif not upload.size:
+                item.error = "Empty image upload."
+            elif upload.size > settings.max_upload_bytes:
+                item.error = "Image exceeds the maximum allowed size."
+            else:
+                accepted.append(item.index)
+
+        def read_accepted():
+            # Runs on the worker thread; the spooled parts are read one chunk
+            # of the batch at a time rather than all up front.
+            for index in accepted:
+                uploads[index].file.seek(0)
+                yield uploads[index].file.read()
+
+        outcomes = await run_detection(request, detector.analyze_batch, read_accepted())
+
+    for index, outcome in zip(accepted, outcomes):
+        if isinstance(outcome, DetectionResult):
+            items[index].result = outcome
+        elif isinstance(outcome, ValueError):
+            items[index].error = str(outcome)
+        else:
+            logger.error("Batch item %d failed", index, exc_info=outcome)
+            items[index].error = "Detection failed while processing the image."
+
+    succeeded = sum(item.result is not None for item in items)
+    return BatchDetectionResult(
+        count=len(items), succeeded=succeeded, failed=len(items) - succeeded, items=items
+    )
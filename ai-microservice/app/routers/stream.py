@@ -0,0 +1,117 @@
+"""Frame-stream endpoint — dashcam footage over a WebSocket.
+
+Protocol (``ws://…/stream``):
+
+* the client sends each frame as one **binary** message (JPEG, or any format
+  ``/detect`` accepts), then the text message ``end`` when the footage is over;
+* the server sends JSON text messages: one ``frame`` event per received frame,
+  in order (processed with its ``DetectionResult``, skipped as a near-duplicate,
+  failed or dropped); a ``hazard`` event whenever a hazard tracked across
+  consecutive frames ends; and, after ``end``, the remaining ``hazard`` events
+  and one ``summary`` event, after which it closes the socket.
+
+Frames that arrive while the previous batch is being processed are queued and
+handed to the model together as the next batch (up to ``batch_max_size``).
+"""
+
+# 1. Imports
+import asyncio
+import logging
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+
+from app.core.config import get_settings
+from app.services import detector
+from app.services.admission import Overloaded
+from app.services.stream import StreamSession
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Detection"])
+
+_END_MESSAGE = "end"
+
+
+# 2. Receiving
+async def _receive_frames(websocket: WebSocket, pending: asyncio.Queue, closed: asyncio.Event) -> None:
+    """Number and queue incoming frames until the client ends the stream (or
+    goes away); ``None`` marks the end. A full queue blocks reading, which
+    pushes back on the client through the socket."""
+    index = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                closed.set()
+                break
+            if message.get("bytes") is not None:
+                await pending.put((index, message["bytes"]))
+                index += 1
+            elif (message.get("text") or "").strip().lower() == _END_MESSAGE:
+                break
+    except RuntimeError:  # receive() after the socket has already closed
+        closed.set()
+    await pending.put(None)
+
+
+def _next_batch(first: tuple[int, bytes], pending: asyncio.Queue, limit: int) -> tuple[list, bool]:
+    """``first`` plus whatever else is already queued, up to ``limit`` frames;
+    also whether the end marker was reached."""
+    batch = [first]
+    while len(batch) < limit and not pending.empty():
+        item = pending.get_nowait()
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+async def _process(session: StreamSession, batch: list[tuple[int, bytes]]) -> list:
+    """Run one batch on the inference executor; when it is full, the batch is
+    dropped (live footage moves on) rather than delaying every later frame."""
+    try:
+        future = detector.submit(session.process, batch)
+    except Overloaded:
+        return session.dropped(batch, "Detection service is busy; frame dropped.")
+    return await asyncio.wrap_future(future)
+
+
+# 3. Endpoint
+@router.websocket("/stream")
+async def stream(websocket: WebSocket) -> None:
+    """Detect hazards in a stream of frames; see the module docstring for the protocol."""
+    settings = get_settings()
+    await websocket.accept()
+    if not settings.model_exists:
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason="Detection model is not available.")
+        return
+
+    session = StreamSession(settings)
+    pending: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.stream_max_pending))
+    closed = asyncio.Event()
+    reader = asyncio.create_task(_receive_frames(websocket, pending, closed))
+    try:
+        ended = False
+        while not ended:
+            first = await pending.get()
+            if first is None:
+                break
+            batch, ended = _next_batch(first, pending, max(1, settings.batch_max_size))
+            events = await _process(session, batch)
+            if closed.is_set():
+                return
+            for event in events:
+                await websocket.send_text(event.model_dump_json())
+
+        if closed.is_set():
+            return
+        for event in session.finish():
+            await websocket.send_text(event.model_dump_json())
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception:  # noqa: BLE001
+        logger.exception("Frame stream failed")
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason="Detection failed.")
+    finally:
+        reader.cancel()
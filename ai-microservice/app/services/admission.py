@@ -0,0 +1,113 @@
+"""Bounded inference executor — admission control and load shedding for /detect.
+
+Decode + inference is CPU-bound and must never run on uvicorn's event loop
+(it stalls /health probes and new connections). It also must not queue without
+bound: under a burst, requests that will time out anyway only add latency for
+everyone behind them. :class:`InferenceExecutor` runs calls on a dedicated
+thread pool and admits at most ``workers + max_queue`` calls at a time; past
+that, :meth:`~InferenceExecutor.submit` raises :class:`Overloaded` at once, and
+the endpoint answers 503 with ``Retry-After``.
+
+Queued calls can be cancelled (the client went away) before they start; a call
+that is already running finishes, since a forward pass cannot be interrupted.
+How long calls waited for a worker is kept for ``/health``.
+"""
+
+# 1. Imports
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+import numpy as np
+
+from app.core import metrics
+
+# Queue-wait samples kept for the /health percentiles.
+_WAIT_WINDOW = 512
+
+
+class Overloaded(RuntimeError):
+    """The executor's queue is full; the call was not admitted."""
+
+
+# 2. Executor
+class InferenceExecutor:
+    """A thread pool with a hard cap on queued work and queue-wait accounting."""
+
+    def __init__(self, workers: int, max_queue: int, name: str = "inference") -> None:
+        self._workers = max(1, workers)
+        self._max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._admitted = 0  # queued + running
+        self._running = 0
+        self._waits: deque[float] = deque(maxlen=_WAIT_WINDOW)
+        self.rejected = 0
+        self.cancelled = 0
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Queue ``fn(*args)``; raise :class:`Overloaded` if the queue is full."""
+        with self._lock:
+            if self._admitted >= self._workers + self._max_queue:
+                self.rejected += 1
+                raise Overloaded(f"inference queue full ({self._max_queue} waiting)")
+            self._admitted += 1
+
+        enqueued = time.perf_counter()
+        # The worker runs in the submitter's context, so per-request stage
+        # timings (see app.core.metrics) follow the work onto the thread.
+        context = contextvars.copy_context()
+
+        def call() -> Any:
+            waited = time.perf_counter() - enqueued
+            with self._lock:
+                self._running += 1
+                self._waits.append(waited)
+            try:
+                context.run(metrics.observe_stage, "queue_wait", waited)
+                return context.run(fn, *args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        try:
+            future = self._pool.submit(call)
+        except BaseException:
+            with self._lock:
+                self._admitted -= 1
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._admitted -= 1
+            if future.cancelled():
+                self.cancelled += 1
+
+    def stats(self) -> dict:
+        """Queue depth and recent queue-wait percentiles for /health."""
+        with self._lock:
+            waits = np.fromiter(self._waits, dtype=np.float64)
+            queued = self._admitted - self._running
+            running = self._running
+        if waits.size:
+            p50, p95, worst = (float(v) * 1000 for v in np.percentile(waits, [50, 95, 100]))
+            wait_ms = {"p50": round(p50, 1), "p95": round(p95, 1), "max": round(worst, 1)}
+        else:
+            wait_ms = None
+        return {
+            "workers": self._workers,
+            "max_queue": self._max_queue,
+            "running": running,
+            "queued": queued,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "wait_ms": wait_ms,
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,239 @@
+"""Inference backends — the part of the detector that actually runs the network.
+
+Every backend takes a list of RGB ``HxWx3`` uint8 arrays and returns one
+:class:`RawBoxes` per image (pre-custom-NMS, in that image's pixel coordinates),
+so the rest of the pipeline (batching, post-processing, aggregation) does not
+care which one is active. ``Settings.inference_backend`` picks it:
+
+* ``torch`` — `best.pt` through ``ultralytics.YOLO`` (the original path).
+* ``onnx`` — the graph exported by ``scripts/ai-model/export-onnx.py`` (or its
+  INT8 variant from ``quantize-model.py``), run with onnxruntime on CPU.
+  Letterboxing, output decoding and the class-aware IoU NMS that ultralytics
+  normally does are reimplemented here with NumPy + Pillow, so the serving
+  image needs neither torch, torchvision nor OpenCV.
+
+Heavy imports are deferred to the backend constructors: only the selected
+backend's runtime is ever imported, and not before the model is loaded — so
+uvicorn can bind its port first. Each backend records how long its startup
+stages took in ``timings`` (seconds), for the startup breakdown in ``/health``.
+"""
+
+# 1. Imports
+import ast
+import logging
+import time
+from typing import Protocol
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import Settings
+from app.services.postprocess import RawBoxes
+
+logger = logging.getLogger(__name__)
+
+# Matches ultralytics' defaults so both backends hand the custom NMS the same boxes.
+_NMS_IOU = 0.7
+_MAX_DET = 300
+_MAX_NMS = 30000
+_CLASS_OFFSET = 7680  # per-class box offset used for class-aware NMS in one pass
+_PAD_VALUE = 114
+
+
+# 2. Contract
+class InferenceBackend(Protocol):
+    """What the detector needs from a model runtime."""
+
+    name: str
+    names: dict[int, str]
+    timings: dict[str, float]  # startup stage -> seconds
+
+    def predict(
+        self, images: list[np.ndarray], conf: float, imgsz: int | None = None
+    ) -> list[RawBoxes]:
+        """One forward pass over ``images``; one RawBoxes per image, in order.
+        ``imgsz`` overrides the network input size for this pass (None = default)."""
+        ...
+
+
+# 3. PyTorch / ultralytics
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model_path: str, threads: int | None = None) -> None:
+        started = time.perf_counter()
+        import torch  # deferred: only needed for this backend
+        from ultralytics import YOLO
+
+        imported = time.perf_counter()
+        if threads:
+            torch.set_num_threads(threads)
+        self._model = YOLO(model_path)
+        loaded = time.perf_counter()
+        # Conv+BN fusing, which ultralytics would otherwise do inside the first predict.
+        self._model.fuse()
+        fused = time.perf_counter()
+
+        self.names: dict[int, str] = dict(self._model.names)
+        self.timings = {"import": imported - started, "load": loaded - imported, "fuse": fused - loaded}
+
+    def predict(
+        self, images: list[np.ndarray], conf: float, imgsz: int | None = None
+    ) -> list[RawBoxes]:
+        # ultralytics treats NumPy input as BGR (OpenCV order) and flips it to
+        # RGB itself, so hand it BGR rather than our RGB arrays.
+        bgr = [np.ascontiguousarray(image[..., ::-1]) for image in images]
+        size = {"imgsz": imgsz} if imgsz else {}
+        results = self._model(bgr, conf=conf, verbose=False, **size)
+        return [
+            RawBoxes(
+                xyxy=r.boxes.xyxy.cpu().numpy(),
+                conf=r.boxes.conf.cpu().numpy(),
+                cls=r.boxes.cls.cpu().numpy(),
+            )
+            for r in results
+        ]
+
+
+# 4. ONNX Runtime
+def letterbox(image: np.ndarray, size: tuple[int, int]) -> tuple[np.ndarray, float, tuple[float, float]]:
+    """Resize keeping aspect ratio and pad to ``size`` (h, w), centred, grey 114.
+
+    Returns the padded image, the scale gain, and the (left, top) padding —
+    the same geometry ultralytics' LetterBox produces.
+    """
+    height, width = image.shape[:2]
+    gain = min(size[0] / height, size[1] / width)
+    new_w, new_h = round(width * gain), round(height * gain)
+
+    if (new_w, new_h) != (width, height):
+        image = np.asarray(Image.fromarray(image).resize((new_w, new_h), Image.BILINEAR))
+
+    pad_w, pad_h = (size[1] - new_w) / 2, (size[0] - new_h) / 2
+    top, left = round(pad_h - 0.1), round(pad_w - 0.1)
+
+    out = np.full((size[0], size[1], 3), _PAD_VALUE, dtype=np.uint8)
+    out[top : top + new_h, left : left + new_w] = image
+    return out, gain, (left, top)
+
+
+def _iou_nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Plain greedy IoU NMS; returns kept indices by descending score."""
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep: list[int] = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.maximum(xx2 - xx1, 0) * np.maximum(yy2 - yy1, 0)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def decode_yolo_output(
+    output: np.ndarray,
+    conf: float,
+    gain: float,
+    pad: tuple[float, float],
+    shape: tuple[int, int],
+) -> RawBoxes:
+    """Decode one image's ``(4 + num_classes, anchors)`` YOLOv8 head output.
+
+    Applies the confidence filter and class-aware IoU NMS, then maps the boxes
+    from letterboxed input space back to the original ``shape`` (h, w).
+    """
+    preds = output.T  # (anchors, 4 + nc)
+    scores_all = preds[:, 4:]
+    cls = scores_all.argmax(axis=1)
+    scores = scores_all[np.arange(len(cls)), cls]
+
+    mask = scores > conf
+    preds, cls, scores = preds[mask], cls[mask], scores[mask]
+    if len(scores) > _MAX_NMS:
+        top = np.argsort(-scores, kind="stable")[:_MAX_NMS]
+        preds, cls, scores = preds[top], cls[top], scores[top]
+
+    cx, cy, w, h = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    keep = _iou_nms(xyxy + cls[:, None] * _CLASS_OFFSET, scores, _NMS_IOU)[:_MAX_DET]
+    xyxy, cls, scores = xyxy[keep], cls[keep], scores[keep]
+
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / gain).clip(0, shape[1])
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / gain).clip(0, shape[0])
+    return RawBoxes(
+        xyxy=xyxy.astype(np.float32),
+        conf=scores.astype(np.float32),
+        cls=cls.astype(np.float32),
+    )
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, model_path: str, imgsz: int, threads: int | None = None) -> None:
+        started = time.perf_counter()
+        import onnxruntime as ort  # deferred: only needed for this backend
+
+        imported = time.perf_counter()
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        # Session creation includes onnxruntime's graph optimisation (its "fuse").
+        self._session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.timings = {"import": imported - started, "load": time.perf_counter() - imported}
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+
+        # Fixed-shape exports pin batch and/or spatial size; dynamic ones use str dims.
+        _, _, height, width = model_input.shape
+        self._size = (
+            height if isinstance(height, int) else imgsz,
+            width if isinstance(width, int) else imgsz,
+        )
+        self._batchable = not isinstance(model_input.shape[0], int)
+        self._resizable = not isinstance(height, int) and not isinstance(width, int)
+
+        # ultralytics embeds the class names in the graph's metadata as a dict repr.
+        metadata = self._session.get_modelmeta().custom_metadata_map
+        self.names: dict[int, str] = ast.literal_eval(metadata.get("names", "{}"))
+        if not self.names:
+            raise ValueError(f"ONNX model '{model_path}' carries no class-name metadata.")
+
+    def predict(
+        self, images: list[np.ndarray], conf: float, imgsz: int | None = None
+    ) -> list[RawBoxes]:
+        if not self._batchable and len(images) > 1:
+            return [self.predict([image], conf, imgsz)[0] for image in images]
+
+        # A fixed-shape export can only run at its own size.
+        size = (imgsz, imgsz) if imgsz and self._resizable else self._size
+        boxed = [letterbox(image, size) for image in images]
+        batch = np.stack([b[0] for b in boxed]).transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+        outputs = self._session.run(None, {self._input_name: batch})[0]
+        return [
+            decode_yolo_output(output, conf, gain, pad, image.shape[:2])
+            for output, image, (_, gain, pad) in zip(outputs, images, boxed)
+        ]
+
+
+# 5. Factory
+def load_backend(settings: Settings, threads: int | None = None) -> InferenceBackend:
+    """Instantiate the backend selected by ``Settings.inference_backend``.
+
+    ``threads`` caps the runtime's intra-op thread pool (None = its default).
+    """
+    logger.info("Loading %s model from %s", settings.inference_backend, settings.active_model_path)
+    if settings.inference_backend == "onnx":
+        return OnnxBackend(settings.active_model_path, settings.imgsz, threads)
+    return TorchBackend(settings.active_model_path, threads)
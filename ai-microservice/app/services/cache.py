@@ -0,0 +1,108 @@
+"""Bounded detection-result cache with in-flight request coalescing.
+
+The mobile app retries /detect on flaky connections and users re-submit the
+same photo, so identical uploads are common. Results are cached under a
+content hash (see ``detector._cache_key``) with LRU eviction, a TTL and a cap on
+the total serialized size. Concurrent requests for a key that is already being
+computed wait on that one computation instead of starting another
+(single-flight). Failures are never cached — every waiter sees the exception
+and the next request recomputes.
+"""
+
+# 1. Imports
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable
+
+from app.models.schemas import DetectionResult
+
+
+# 2. Entry
+@dataclass
+class _Entry:
+    result: DetectionResult
+    size: int
+    expires_at: float
+
+
+# 3. Cache
+class ResultCache:
+    """Thread-safe LRU + TTL + byte-capped cache of DetectionResults."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_s: float) -> None:
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl_s = ttl_s
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key: str, compute: Callable[[], DetectionResult]) -> DetectionResult:
+        """Return the cached result for ``key``, joining or starting its computation."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.result
+                self._evict(key)
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as exc:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(exc)
+            raise
+
+        size = len(result.model_dump_json())
+        with self._lock:
+            del self._inflight[key]
+            self._store(key, result, size)
+        future.set_result(result)
+        return result
+
+    def stats(self) -> dict:
+        """Counters for /health: is the cache paying for itself?"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    # -- internals (caller holds the lock) ----------------------------------
+    def _store(self, key: str, result: DetectionResult, size: int) -> None:
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = _Entry(result, size, time.monotonic() + self._ttl_s)
+        self._bytes += size
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        self._bytes -= self._entries.pop(key).size
@@ -0,0 +1,146 @@
+"""Near-duplicate photo index — short-circuits repeat photos of the same hazard.
+
+Many citizens photograph the same well-known pothole. Each of those photos has
+different bytes (so the result cache misses), but they look alike. Every upload
+that validated as a hazard is remembered here by a 64-bit perceptual hash
+(pHash: the signs of the low-frequency 8×8 DCT coefficients of a 32×32
+grayscale thumbnail, taken from a 1/8-scale JPEG draft decode). A later upload
+within ``max_distance`` bits of a remembered one gets that photo's result back
+without inference, flagged as a probable duplicate.
+
+When the client sends its location, the index is scoped by it. Locations are
+snapped to a grid of ``cell_deg`` degrees, and only entries in the same or an
+adjacent cell can match. Uploads without a location only match each other:
+a located photo is never answered by one that could have been taken anywhere,
+nor the reverse.
+
+Re-sending the *same* bytes (an app retry) is not a duplicate submission. Such
+an upload is never matched against its own entry. It falls through to the
+normal path, where the result cache answers it.
+
+The index is bounded (LRU over ``max_entries``, each entry lives ``ttl_s``)
+and thread-safe. Lookups are a linear Hamming-distance scan, which takes well
+under a millisecond at the default size.
+"""
+
+# 1. Imports
+import io
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.models.schemas import DetectionResult
+
+_HASH_SIZE = 8  # 8×8 low-frequency coefficients -> 64 bits
+_THUMB_SIZE = 32
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis: ``m @ x @ m.T`` is the 2-D DCT of an n×n block."""
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT = _dct_matrix(_THUMB_SIZE)
+
+
+# 2. Perceptual hash
+def perceptual_hash(data: bytes) -> int:
+    """64-bit pHash of an encoded image. Raises whatever PIL raises for
+    undecodable input."""
+    with Image.open(io.BytesIO(data)) as pil:
+        pil.draft("L", (_THUMB_SIZE * 2, _THUMB_SIZE * 2))
+        gray = ImageOps.exif_transpose(pil).convert("L")
+        thumb = gray.resize((_THUMB_SIZE, _THUMB_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(thumb, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    # The DC term (overall brightness) would skew the median; leave it out.
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+# 3. Index
+Location = tuple[float, float]
+
+
+@dataclass
+class _Entry:
+    phash: int
+    cell: tuple[int, int] | None
+    result: DetectionResult
+    expires_at: float
+
+
+@dataclass(frozen=True)
+class Duplicate:
+    """A remembered upload that a new one nearly matches."""
+
+    result: DetectionResult
+    distance: int  # Hamming distance in bits
+
+
+class DuplicateIndex:
+    """Thread-safe, bounded perceptual-hash index of recently validated uploads."""
+
+    def __init__(self, max_entries: int, max_distance: int, ttl_s: float, cell_deg: float) -> None:
+        self._max_entries = max_entries
+        self._max_distance = max_distance
+        self._ttl_s = ttl_s
+        self._cell_deg = cell_deg
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()  # by content digest
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cell(self, location: Location | None) -> tuple[int, int] | None:
+        if location is None or self._cell_deg <= 0:
+            return None
+        lat, lon = location
+        return math.floor(lat / self._cell_deg), math.floor(lon / self._cell_deg)
+
+    def find(self, phash: int, digest: str, location: Location | None) -> Duplicate | None:
+        """The closest remembered upload within ``max_distance`` bits, other
+        than these exact bytes. With a location only entries near it match;
+        without one, only entries stored without one."""
+        cell = self._cell(location)
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_distance = None, self._max_distance + 1
+            for key, entry in list(self._entries.items()):
+                if entry.expires_at <= now:
+                    del self._entries[key]
+                    continue
+                if key == digest:
+                    continue
+                if (cell is None) != (entry.cell is None):
+                    continue
+                if cell is not None and (abs(entry.cell[0] - cell[0]) > 1 or abs(entry.cell[1] - cell[1]) > 1):
+                    continue
+                distance = (entry.phash ^ phash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return Duplicate(self._entries[best_key].result, best_distance)
+
+    def add(self, phash: int, digest: str, location: Location | None, result: DetectionResult) -> None:
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._entries[digest] = _Entry(phash, self._cell(location), result, time.monotonic() + self._ttl_s)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Counters for /health."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
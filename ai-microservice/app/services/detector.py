@@ -1,207 +1,683 @@
 """YOLO hazard detector.
 
-Loads the trained `best.pt` weights once per process and turns an uploaded
-photo into an aggregated :class:`DetectionResult`. The overlap-filtering logic
-(custom cross-class NMS) is ported verbatim from the FYP evaluation script
-(`scripts/ai-model/model-testing.py`) so the live service and the offline
-evaluation agree box-for-box.
-
-The model's six classes encode BOTH the hazard type and its severity, e.g.
-`pothole-high`, `crack-low`. We split on the hyphen: the left half is the base
-type, the right half is the severity level.
+Loads the trained model once per process — through whichever runtime
+:mod:`app.services.backends` is configured to use — and turns an uploaded
+photo into an aggregated :class:`DetectionResult`. The overlap filtering
+(custom cross-class NMS) and aggregation live in
+:mod:`app.services.postprocess`, whose array path is proven box-for-box
+identical to the FYP evaluation script (`scripts/ai-model/model-testing.py`)
+so the live service and the offline evaluation agree.
+
+With ``MODEL_DIR`` set, the served model version can be swapped at runtime
+(:func:`swap_model`). The new version is loaded and warmed next to the serving
+one, then made active in one step. Every request holds the model it started
+with until it finishes, so in-flight requests complete on the old version, which
+is released once the last of them is done.
 """
 
 # 1. Imports
-import io
+import hashlib
 import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from functools import lru_cache
-from threading import Lock
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
 
 import numpy as np
-from PIL import Image, ImageOps
-from ultralytics import YOLO
 
-from app.core.config import get_settings
-from app.models.schemas import Detection, DetectionResult
+from app.core import metrics
+from app.core import versions
+from app.core.config import Settings, get_settings
+from app.models.schemas import DetectionResult
+from app.services.admission import InferenceExecutor
+from app.services.backends import InferenceBackend, load_backend
+from app.services.cache import ResultCache
+from app.services.dedup import DuplicateIndex, Location, perceptual_hash
+from app.services.engine import InferencePool
+from app.services.postprocess import (
+    ClassTable,
+    RawBoxes,
+    build_class_table,
+    cascade_verdict,
+    postprocess,
+)
+from app.services.preprocess import DecodedImage, decode_image, to_original
+from app.services.scheduler import MicroBatcher
 
 logger = logging.getLogger(__name__)
 
-# low=1, medium=2, high=3 — used to average multiple severities into one level.
-_SEVERITY_ORDINAL = {"low": 1, "medium": 2, "high": 3}
-_ORDINAL_SEVERITY = {1: "low", 2: "medium", 3: "high"}
+# Warm-up progress, reported by /health and /ready.
+_startup: dict = {"state": "starting", "error": None, "timings_ms": {}}
+_startup_lock = threading.Lock()
 
-# Inference is not guaranteed thread-safe; serialise calls to the shared model.
-_INFER_LOCK = Lock()
+# A swapped-out version is released only once its requests finish; while any
+# are still running, a warning is logged this often.
+_RETIRE_WARN_S = 600.0
 
 
-# 2. Overlap detection — ported from scripts/ai-model/model-testing.py
-def compute_iomin(box_a, box_b) -> float:
-    """Intersection over Minimum area — catches a small box enclosed by a larger one."""
-    x1 = max(box_a[0], box_b[0])
-    y1 = max(box_a[1], box_b[1])
-    x2 = min(box_a[2], box_b[2])
-    y2 = min(box_a[3], box_b[3])
+# 2. Model loader — lazy singleton
+@lru_cache
+def _load_model() -> InferenceBackend:
+    """The startup model version, loaded once per process. serve.py loads it in
+    the parent before forking, so the workers share its weights."""
+    settings = get_settings()
+    if not settings.model_exists:
+        raise FileNotFoundError(
+            f"YOLO weights not found at '{settings.active_model_path}'. "
+            "Place best.pt (or best.onnx / best.int8.onnx for the onnx backend) in the "
+            "ai-microservice/ folder, or set MODEL_PATH / ONNX_MODEL_PATH / ONNX_INT8_MODEL_PATH."
+        )
+    return load_backend(settings)
+
+
+@lru_cache
+def _pool() -> InferencePool:
+    """Process-pool engine; the model is loaded in the replicas, not here."""
+    settings = get_settings()
+    if not settings.model_exists:
+        raise FileNotFoundError(f"YOLO weights not found at '{settings.active_model_path}'.")
+    return InferencePool(settings)
+
+
+def _uses_pool() -> bool:
+    return get_settings().inference_replicas > 0
+
+
+@lru_cache
+def _class_table() -> ClassTable:
+    """Type/severity lookups for the startup model's class ids."""
+    names = _pool().names if _uses_pool() else _load_model().names
+    return build_class_table(names)
 
-    intersection = max(0, x2 - x1) * max(0, y2 - y1)
-    if intersection == 0:
-        return 0.0
 
-    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
-    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
-    min_area = min(area_a, area_b)
+@dataclass(eq=False)
+class LoadedModel:
+    """One servable model version and the requests currently using it.
 
-    return intersection / min_area if min_area > 0 else 0.0
+    ``backend`` / ``pool`` are None for the startup version, which lives in the
+    process-wide singletons above; a swapped-in version carries its own."""
 
+    version: str
+    identity: str  # backend, path and file version — part of the cache key
+    classes: ClassTable
+    backend: InferenceBackend | None = None
+    pool: InferencePool | None = None
+    users: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
 
-def apply_custom_nms(detections, iomin_threshold):
-    """Filter redundant boxes, but keep overlapping boxes of *different* base type
-    (e.g. a pothole sitting inside a crack)."""
-    if not detections:
-        return []
 
-    detections = sorted(detections, key=lambda d: d["conf"], reverse=True)
-    kept = []
-    suppressed = set()
+_active: LoadedModel | None = None
+_active_changed = threading.Condition()  # guards _active and LoadedModel.users
+_swap_lock = threading.Lock()
+
+
+class SwapInProgress(RuntimeError):
+    """Another model swap is still loading."""
+
+
+def _describe(settings: Settings) -> tuple[str, str]:
+    """(version label, identity) of the weights ``settings`` points at. Outside
+    ``model_dir`` the label is the file name plus a short content hash."""
+    path = settings.active_model_path
+    stat = os.stat(path)
+    identity = f"{settings.inference_backend}:{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    if settings.model_dir:
+        return settings.model_version, identity
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(1 << 20):
+            digest.update(chunk)
+    return f"{Path(path).name}@{digest.hexdigest()[:12]}", identity
+
+
+def _backend(model: LoadedModel) -> InferenceBackend:
+    return _load_model() if model.backend is None else model.backend
+
+
+def _engine_pool(model: LoadedModel) -> InferencePool:
+    return _pool() if model.pool is None else model.pool
+
+
+def model_version() -> str | None:
+    """Version label of the active model; None until it has loaded."""
+    return _active.version if _active is not None else None
+
+
+@contextmanager
+def _using_model() -> Iterator[LoadedModel]:
+    """Hold the active model for the duration of one request. A swap while it
+    runs does not affect it; the old version is released after it finishes."""
+    _require_ready()
+    with _active_changed:
+        model = _active
+        model.users += 1
+    try:
+        yield model
+    finally:
+        with _active_changed:
+            model.users -= 1
+            _active_changed.notify_all()
+
 
-    for i, det_a in enumerate(detections):
-        if i in suppressed:
+def warm_up() -> bool:
+    """Load the model and run one dummy forward pass, recording how long each
+    startup stage took (see :func:`startup_status`).
+
+    Safe from any thread: concurrent callers wait for the one warm-up in
+    progress, and later calls return at once. Returns True once ready; logs and
+    returns False if the model can't load (the service still runs so /health
+    and /ready can report the misconfiguration)."""
+    if _startup["state"] == "ready":
+        return True
+    with _startup_lock:
+        if _startup["state"] == "ready":
+            return True
+        _startup.update(state="warming", error=None)
+        try:
+            timings = _start_engine()
+        except Exception as exc:  # noqa: BLE001 — startup must not crash on a missing model
+            logger.exception("Model warm-up failed")
+            _startup.update(state="failed", error=f"{type(exc).__name__}: {exc}")
+            return False
+        _startup.update(state="ready", timings_ms={k: round(v * 1000, 1) for k, v in timings.items()})
+        logger.info(
+            "Model ready: %s",
+            ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in _startup["timings_ms"].items()),
+        )
+        return True
+
+
+def start_warm_up(background: bool) -> None:
+    """Warm up now, or in a daemon thread so the server can bind its port first."""
+    if background:
+        threading.Thread(target=warm_up, name="model-warm-up", daemon=True).start()
+    else:
+        warm_up()
+
+
+def _start_engine() -> dict[str, float]:
+    """Bring up the configured engine; per-stage startup seconds."""
+    global _active
+    settings = get_settings()
+    timings = dict(_pool().timings if _uses_pool() else _load_model().timings)
+    version, identity = _describe(settings)
+    model = LoadedModel(version, identity, _class_table())
+    if not _uses_pool():  # replicas load and warm themselves
+        timings.update(_warm(settings, lambda image, *key: _infer_async(model, image, *key).result()))
+    with _active_changed:
+        _active = model
+    if settings.model_dir and settings.model_watch_interval_s > 0:
+        threading.Thread(target=_watch_pointer, name="model-version-watch", daemon=True).start()
+    return timings
+
+
+def _warm(settings: Settings, infer: Callable[..., Any]) -> dict[str, float]:
+    """One dummy forward pass (two in cascade mode) through ``infer(image,
+    imgsz, conf)``."""
+    if not settings.warmup_inference:
+        return {}
+    dummy = np.zeros((settings.imgsz, settings.imgsz, 3), np.uint8)
+    started = time.perf_counter()
+    infer(dummy, None, None)
+    timings = {"first_inference": time.perf_counter() - started}
+    if settings.cascade_enabled:
+        infer(dummy, settings.cascade_imgsz, settings.cascade_empty_conf)
+    return timings
+
+
+def preload() -> None:
+    """Load the startup model's weights without running a forward pass.
+    serve.py calls this in the parent process before forking, pinned to one
+    intra-op thread for the Conv+BN fuse; the workers' own warm-up then reuses
+    the model."""
+    _load_model()
+
+
+def is_ready() -> bool:
+    return _startup["state"] == "ready"
+
+
+def _require_ready() -> None:
+    """Requests arriving mid warm-up wait for it rather than loading a second
+    copy of the model; a failed warm-up is retried by the next request."""
+    if not warm_up():
+        raise RuntimeError(f"Detection model failed to load: {_startup['error']}")
+
+
+def startup_status() -> dict:
+    """Warm-up state (starting / warming / ready / failed), the last error and the
+    per-stage timing breakdown (import, load, fuse, first_inference) in ms."""
+    return dict(_startup)
+
+
+metrics.Gauge("model_ready", "1 once the model is loaded and warm.", callback=lambda: {(): is_ready()})
+metrics.Gauge(
+    "model_startup_seconds",
+    "Model startup time by stage (import, load, fuse, first_inference).",
+    ("stage",),
+    callback=lambda: {(k,): v / 1000 for k, v in _startup["timings_ms"].items()},
+)
+
+
+def pool_status() -> dict | None:
+    """Replica liveness for /health; None when the process pool is disabled
+    or has not started."""
+    if not _uses_pool() or _active is None:
+        return None
+    return _engine_pool(_active).status()
+
+
+# 3. Model versions
+def available_versions() -> list[str]:
+    """Versions in ``model_dir`` (empty when it is not configured)."""
+    settings = get_settings()
+    return versions.list_versions(settings.model_dir) if settings.model_dir else []
+
+
+def swap_model(version: str, write_pointer: bool = True) -> dict:
+    """Load ``version`` from ``model_dir`` next to the serving model, warm it,
+    then make it the active model. Requests already running finish on the old
+    version, which is released once they have.
+
+    ``write_pointer`` also points ``model_dir``/CURRENT at the new version, so a
+    restart keeps it and sibling workers follow (see ``model_watch_interval_s``).
+    Raises ValueError without ``model_dir``, FileNotFoundError for an unknown
+    version, SwapInProgress while another swap is loading; on any failure the
+    old version keeps serving.
+    """
+    settings = get_settings()
+    if not settings.model_dir:
+        raise ValueError("Model swapping needs MODEL_DIR (a versioned model directory).")
+    if not warm_up():
+        raise RuntimeError(f"Detection model failed to load: {_startup['error']}")
+    if not _swap_lock.acquire(blocking=False):
+        raise SwapInProgress("Another model swap is in progress.")
+    try:
+        target = settings.for_version(version)
+        if version not in available_versions() or not target.model_exists:
+            raise FileNotFoundError(f"Model version '{version}' not found at '{target.active_model_path}'.")
+        started = time.perf_counter()
+        model = _load_version(target)
+        previous = _activate(model)
+        if write_pointer:
+            versions.write_pointer(settings.model_dir, version)
+        logger.info("Model swapped: %s -> %s", previous.version, model.version)
+        return {
+            "previous_version": previous.version,
+            "model_version": model.version,
+            "timings_ms": {k: round(v * 1000, 1) for k, v in model.timings.items()}
+            | {"total": round((time.perf_counter() - started) * 1000, 1)},
+        }
+    finally:
+        _swap_lock.release()
+
+
+def _load_version(settings: Settings) -> LoadedModel:
+    """Load (and warm) one version off to the side of the serving one."""
+    version, identity = _describe(settings)
+    if _uses_pool():
+        pool = InferencePool(settings)  # replicas load and warm themselves
+        return LoadedModel(version, identity, build_class_table(pool.names), pool=pool, timings=dict(pool.timings))
+    backend = load_backend(settings)
+    # Warmed on this thread, not the batcher's, which keeps serving meanwhile.
+    warmed = _warm(
+        settings,
+        lambda image, imgsz, conf: backend.predict(
+            [image], settings.conf_threshold if conf is None else conf, imgsz
+        ),
+    )
+    timings = dict(backend.timings) | warmed
+    return LoadedModel(version, identity, build_class_table(backend.names), backend=backend, timings=timings)
+
+
+def _activate(model: LoadedModel) -> LoadedModel:
+    """Make ``model`` the one new requests get; retire the previous one."""
+    global _active
+    with _active_changed:
+        previous, _active = _active, model
+    threading.Thread(target=_retire, args=(previous,), name="model-retire", daemon=True).start()
+    return previous
+
+
+def _retire(model: LoadedModel) -> None:
+    """Wait for the last request on a swapped-out version, then release it.
+    Never released while in use: a request still running on it would
+    otherwise fall back to reloading whatever the settings point at now."""
+    with _active_changed:
+        while not _active_changed.wait_for(lambda: model.users == 0, timeout=_RETIRE_WARN_S):
+            logger.warning(
+                "Model %s still has %d requests running; waiting to release it", model.version, model.users
+            )
+    if model.pool is not None:
+        model.pool.close()
+    elif model.backend is None:  # the startup version, held by the singletons
+        if _uses_pool():
+            _pool().close()
+            _pool.cache_clear()
+        else:
+            _load_model.cache_clear()
+    model.backend = model.pool = None
+    logger.info("Model %s released", model.version)
+
+
+def _watch_pointer() -> None:
+    """Follow swaps made by another process: when ``model_dir``/CURRENT changes
+    to a version other than the active one, swap to it here too."""
+    settings = get_settings()
+    seen = versions.read_pointer(settings.model_dir)
+    while True:
+        time.sleep(settings.model_watch_interval_s)
+        pointer = versions.read_pointer(settings.model_dir)
+        if pointer == seen:
             continue
+        seen = pointer
+        if pointer and pointer != model_version():
+            try:
+                swap_model(pointer, write_pointer=False)
+            except Exception:  # noqa: BLE001 — keep serving the current version
+                logger.exception("Following the swap to model %s failed", pointer)
+
+
+def shutdown() -> None:
+    """Stop the executor threads and replica processes (if any) on application shutdown."""
+    if _executor.cache_info().currsize:
+        _executor().shutdown()
+    if _pool_dispatcher.cache_info().currsize:
+        _pool_dispatcher().shutdown(wait=False, cancel_futures=True)
+    if _pool.cache_info().currsize:
+        _pool().close()
+    if _active is not None and _active.pool is not None:
+        _active.pool.close()
+
+
+# 4. Batched inference
+def _predict_batch(
+    images: list[np.ndarray], key: tuple[LoadedModel, int | None, float | None]
+) -> list[RawBoxes]:
+    """Run one forward pass over a group of RGB arrays; raw boxes per image.
+    ``key`` is the pass's (model, input size, confidence floor); None means
+    configured.
+
+    Only ever called from the batcher's worker thread, which is the sole user
+    of the shared model — so no lock is needed around it.
+    """
+    model, imgsz, conf = key
+    return _backend(model).predict(images, get_settings().conf_threshold if conf is None else conf, imgsz)
 
-        kept.append(det_a)
-        box_a = [det_a["x1"], det_a["y1"], det_a["x2"], det_a["y2"]]
-        base_type_a = det_a["label"].split("-")[0]
 
-        for j, det_b in enumerate(detections):
-            if j <= i or j in suppressed:
-                continue
+@lru_cache
+def _batcher() -> MicroBatcher:
+    settings = get_settings()
+    return MicroBatcher(
+        _predict_batch,
+        max_batch_size=settings.batch_max_size,
+        max_wait_s=settings.batch_max_wait_ms / 1000,
+    )
 
-            box_b = [det_b["x1"], det_b["y1"], det_b["x2"], det_b["y2"]]
-            base_type_b = det_b["label"].split("-")[0]
 
-            if compute_iomin(box_a, box_b) >= iomin_threshold:
-                # Exemption: never suppress a differing hazard type.
-                if base_type_a != base_type_b:
-                    continue
-                suppressed.add(j)
+@lru_cache
+def _pool_dispatcher() -> ThreadPoolExecutor:
+    """One dispatch thread per replica, so a batch keeps every replica busy."""
+    return ThreadPoolExecutor(
+        max_workers=get_settings().inference_replicas, thread_name_prefix="inference-dispatch"
+    )
+
 
-    return kept
+def _infer_async(
+    model: LoadedModel, image: np.ndarray, imgsz: int | None = None, conf: float | None = None
+) -> Future:
+    """Dispatch one decoded image to ``model``'s inference engine: an idle
+    replica of its process pool, or else the in-process micro-batcher (which
+    groups it with any concurrent requests for the same model, input size and
+    confidence floor into a single forward pass)."""
+    if _uses_pool():
+        return _pool_dispatcher().submit(_engine_pool(model).predict, image, conf, imgsz)
+    return _batcher().submit(image, (model, imgsz, conf))
+
+
+_CASCADE_PATHS = metrics.Counter(
+    "cascade_total", "Cascade-mode images by the pass that produced their result.", ("path",)
+)
+
+
+def _outcome(future: Future) -> RawBoxes | Exception:
+    try:
+        return future.result()
+    except Exception as exc:  # noqa: BLE001 — returned, so one image can't fail its group
+        return exc
+
+
+def _infer_many(
+    model: LoadedModel, images: list[np.ndarray]
+) -> list[tuple[RawBoxes | Exception, str | None]]:
+    """Infer a group of decoded images together; per image, its raw boxes (or
+    the exception) and, in cascade mode, the path that produced them.
+
+    In cascade mode the whole group first goes through the low-resolution pass;
+    only the images whose verdict is inconclusive are then re-submitted (again
+    together) at full resolution.
+    """
+    settings = get_settings()
+    if not settings.cascade_enabled:
+        return [(_outcome(f), None) for f in [_infer_async(model, image) for image in images]]
+
+    low = [_infer_async(model, image, settings.cascade_imgsz, settings.cascade_empty_conf) for image in images]
+    results: list[tuple[RawBoxes | Exception, str | None]] = [(_outcome(f), None) for f in low]
+    escalated = {}
+    for index, (raw, _) in enumerate(results):
+        if isinstance(raw, Exception):
+            continue
+        verdict = cascade_verdict(raw, settings.cascade_accept_conf)
+        if verdict is None:
+            escalated[index] = _infer_async(model, images[index])
+        else:
+            results[index] = (raw, f"low_res_{verdict}")
+            _CASCADE_PATHS.inc(f"low_res_{verdict}")
+    for index, future in escalated.items():
+        results[index] = (_outcome(future), "full_res")
+        _CASCADE_PATHS.inc("full_res")
+    return results
 
 
-# 3. Model loader — lazy singleton
 @lru_cache
-def _load_model() -> YOLO:
+def _executor() -> InferenceExecutor:
     settings = get_settings()
-    if not settings.model_exists:
-        raise FileNotFoundError(
-            f"YOLO weights not found at '{settings.model_path}'. "
-            "Place best.pt in the ai-microservice/ folder or set MODEL_PATH."
+    return InferenceExecutor(settings.inference_workers, settings.inference_queue_depth)
+
+
+def submit(fn: Callable[..., Any], *args: Any) -> Future:
+    """Admit a detection call (``analyze_image`` / ``analyze_batch``) to the
+    dedicated inference executor. Raises ``Overloaded`` when its queue is full."""
+    return _executor().submit(fn, *args)
+
+
+def queue_stats() -> dict:
+    """Executor queue depth and queue-wait percentiles for /health."""
+    return _executor().stats()
+
+
+metrics.Gauge(
+    "inference_executor_requests",
+    "Detection calls admitted to the inference executor, by state.",
+    ("state",),
+    callback=lambda: {(state,): queue_stats()[state] for state in ("queued", "running")},
+)
+
+
+# 5. Result cache
+@lru_cache
+def _result_cache() -> ResultCache | None:
+    settings = get_settings()
+    if settings.result_cache_entries <= 0:
+        return None
+    return ResultCache(
+        max_entries=settings.result_cache_entries,
+        max_bytes=settings.result_cache_max_bytes,
+        ttl_s=settings.result_cache_ttl_s,
+    )
+
+
+def _content_digest(image_bytes: bytes) -> str:
+    """Hash of the upload's bytes; keys both the result cache and the dedup index."""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def _cache_key(digest: str, model: LoadedModel) -> str:
+    """Content ``digest`` of the upload plus everything else that shapes the result."""
+    settings = get_settings()
+    return (
+        f"{digest}|{model.identity}|conf={settings.conf_threshold}"
+        f"|iomin={settings.iomin_threshold}|imgsz={settings.imgsz}|fast={settings.fast_decode}"
+        + (
+            f"|cascade={settings.cascade_imgsz}:{settings.cascade_empty_conf}:{settings.cascade_accept_conf}"
+            if settings.cascade_enabled
+            else ""
         )
-    logger.info("Loading YOLO model from %s", settings.model_path)
-    return YOLO(settings.model_path)
+    )
 
 
-def warm_up() -> bool:
-    """Eagerly load the model at startup so the first request isn't slow.
+def cache_stats() -> dict | None:
+    """Hit / miss / coalesced counters for /health; None when caching is off."""
+    cache = _result_cache()
+    return cache.stats() if cache else None
 
-    Returns True on success; logs and returns False if the model can't load
-    (the service still starts so /health can report the misconfiguration)."""
-    try:
-        _load_model()
-        return True
-    except Exception:  # noqa: BLE001 — startup must not crash on a missing model
-        logger.exception("Model warm-up failed")
-        return False
+
+@lru_cache
+def _duplicate_index() -> DuplicateIndex | None:
+    settings = get_settings()
+    if settings.dedup_entries <= 0:
+        return None
+    return DuplicateIndex(
+        max_entries=settings.dedup_entries,
+        max_distance=settings.dedup_max_distance,
+        ttl_s=settings.dedup_ttl_s,
+        cell_deg=settings.dedup_cell_deg,
+    )
+
+
+def dedup_stats() -> dict | None:
+    """Near-duplicate hit / miss counters for /health; None when disabled."""
+    index = _duplicate_index()
+    return index.stats() if index else None
 
 
-# 4. Public API
-def analyze_image(image_bytes: bytes) -> DetectionResult:
+# 6. Public API
+def analyze_image(image_bytes: bytes, location: Location | None = None) -> DetectionResult:
     """Run detection on raw image bytes and aggregate per the product rules.
 
-    Raises ValueError if the bytes are not a decodable image.
+    A near-duplicate of a recently validated photo (near ``location``, a
+    ``(lat, lon)`` pair, when given) gets that photo's result back, flagged
+    ``probable_duplicate``, without inference. Identical uploads are answered
+    from the result cache, and concurrent identical uploads share a single
+    computation. Raises ValueError if the bytes are not a decodable image.
     """
+    index = _duplicate_index()
+    cache = _result_cache()
+    digest = _content_digest(image_bytes) if index is not None or cache is not None else ""
+    phash = None
+    if index is not None:
+        try:
+            with metrics.stage("dedup"):
+                phash = perceptual_hash(image_bytes)
+                duplicate = index.find(phash, digest, location)
+        except Exception:  # noqa: BLE001 — undecodable; _analyze reports it
+            duplicate = None
+        if duplicate is not None:
+            return duplicate.result.model_copy(
+                update={"probable_duplicate": True, "duplicate_distance": duplicate.distance}
+            )
+
+    with _using_model() as model:
+        if cache is None:
+            result = _analyze(image_bytes, model)
+        else:
+            result = cache.get_or_compute(_cache_key(digest, model), lambda: _analyze(image_bytes, model))
+
+    # Only validated hazards are worth matching later uploads against.
+    if phash is not None and result.detected:
+        index.add(phash, digest, location, result)
+    return result
+
+
+def _analyze(image_bytes: bytes, model: LoadedModel) -> DetectionResult:
+    """Decode → infer → post-process, uncached."""
+    settings = get_settings()
     try:
-        pil = Image.open(io.BytesIO(image_bytes))
-        # Respect EXIF orientation from phone cameras, then normalise to RGB.
-        pil = ImageOps.exif_transpose(pil).convert("RGB")
+        with metrics.stage("decode"):
+            decoded = decode_image(image_bytes, settings.imgsz if settings.fast_decode else None)
     except Exception as exc:  # noqa: BLE001
         raise ValueError("Uploaded file is not a valid image.") from exc
 
-    settings = get_settings()
-    model = _load_model()
-    image = np.asarray(pil)  # RGB HxWx3
+    # Batch wait + forward pass(es) (also recorded on their own, globally).
+    with metrics.stage("infer"):
+        [(raw, path)] = _infer_many(model, [decoded.array])
+    if isinstance(raw, Exception):
+        raise raw
+    return _finish(raw, decoded, path, model)
 
-    with _INFER_LOCK:
-        results = model(image, conf=settings.conf_threshold, verbose=False)[0]
 
-    raw = []
-    for box in results.boxes:
-        label = model.names[int(box.cls[0])]
-        if "-" not in label:
-            # Unexpected class naming; skip rather than guess type/severity.
-            continue
-        xyxy = box.xyxy[0]
-        raw.append(
-            {
-                "x1": int(xyxy[0]), "y1": int(xyxy[1]),
-                "x2": int(xyxy[2]), "y2": int(xyxy[3]),
-                "conf": float(box.conf[0]),
-                "label": label,
-            }
-        )
+def _finish(raw: RawBoxes, decoded: DecodedImage, path: str | None, model: LoadedModel) -> DetectionResult:
+    """Map boxes to original pixels, apply the custom NMS + aggregation."""
+    result = postprocess(to_original(raw, decoded), model.classes, get_settings().iomin_threshold)
+    result.inference_path = path
+    result.model_version = model.version
+    return result
 
-    kept = apply_custom_nms(raw, settings.iomin_threshold)
-    return _aggregate(kept)
 
+def analyze_batch(images: Iterable[bytes]) -> list[DetectionResult | Exception]:
+    """Run detection on many images; one result (or the exception it raised) per
+    image, in order. A bad image never fails its neighbours.
 
-# 5. Aggregation
-def _aggregate(kept: list[dict]) -> DetectionResult:
-    """Turn surviving boxes into the report-ready result (types + mean severity)."""
-    if not kept:
-        return DetectionResult(
-            detected=False,
-            message="No road hazard detected. Retake the photo focusing on the defect.",
-        )
+    ``images`` is consumed lazily, ``batch_max_size`` at a time: each chunk is
+    decoded and submitted together so the batcher (or the replica pool) runs it
+    as full forward passes, while memory stays bounded by one chunk of arrays.
+    Batches bypass the result cache — survey photo sets are unique images. The
+    whole batch runs on the model version that was active when it started.
+    """
+    settings = get_settings()
+    target = settings.imgsz if settings.fast_decode else None
+    chunk_size = max(1, settings.batch_max_size)
+    outcomes: list[DetectionResult | Exception] = []
+
+    with _using_model() as model:
+        iterator = iter(images)
+        while chunk := [data for _, data in zip(range(chunk_size), iterator)]:
+            decoded: list[tuple[int, DecodedImage]] = []
+            for data in chunk:
+                outcomes.append(ValueError("Uploaded file is not a valid image."))
+                try:
+                    with metrics.stage("decode"):
+                        decoded.append((len(outcomes) - 1, decode_image(data, target)))
+                except Exception:  # noqa: BLE001 — recorded as this item's error
+                    continue
 
-    detections: list[Detection] = []
-    for det in kept:
-        base_type, _, level = det["label"].partition("-")
-        severity = level if level in _SEVERITY_ORDINAL else "low"
-        detections.append(
-            Detection(
-                type=base_type,
-                severity=severity,
-                confidence=round(det["conf"], 4),
-                box=[det["x1"], det["y1"], det["x2"], det["y2"]],
-            )
-        )
+            for (index, _), outcome in zip(decoded, _analyze_decoded([image for _, image in decoded], model)):
+                outcomes[index] = outcome
 
-    # Distinct base types, sorted for a stable ("crack", "pothole") ordering.
-    defect_types = sorted({d.type for d in detections})
+    return outcomes
 
-    # Mean severity across every box, rounded to the nearest level (ties round up
-    # toward the more severe reading).
-    ordinals = [_SEVERITY_ORDINAL[d.severity] for d in detections]
-    mean_ordinal = sum(ordinals) / len(ordinals)
-    severity = _ORDINAL_SEVERITY[int(mean_ordinal + 0.5)]
 
-    # Primary type = single worst box (highest severity, then highest confidence)
-    # — populates the legacy single-value defect_type column.
-    worst = max(detections, key=lambda d: (_SEVERITY_ORDINAL[d.severity], d.confidence))
+def analyze_decoded(images: list[DecodedImage]) -> list[DetectionResult | Exception]:
+    """Infer already-decoded images together (one batched submission); one
+    result, or the exception it raised, per image. Bypasses the result cache."""
+    with _using_model() as model:
+        return _analyze_decoded(images, model)
 
-    mean_confidence = round(sum(d.confidence for d in detections) / len(detections), 4)
 
-    if len(defect_types) > 1:
-        summary = f"Detected {len(kept)} hazards: {' and '.join(defect_types)}."
-    else:
-        summary = f"Detected {defect_types[0]} ({severity} severity)."
-
-    return DetectionResult(
-        detected=True,
-        defect_types=defect_types,
-        primary_type=worst.type,
-        severity=severity,
-        confidence=mean_confidence,
-        detection_count=len(detections),
-        detections=detections,
-        message=summary,
-    )
+def _analyze_decoded(images: list[DecodedImage], model: LoadedModel) -> list[DetectionResult | Exception]:
+    with metrics.stage("infer"):
+        inferred = _infer_many(model, [image.array for image in images])
+    outcomes: list[DetectionResult | Exception] = []
+    for image, (raw, path) in zip(images, inferred):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            outcomes.append(_finish(raw, image, path, model))
+        except Exception as exc:  # noqa: BLE001 — recorded as this item's error
+            outcomes.append(exc)
+    return outcomes
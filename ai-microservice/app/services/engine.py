@@ -0,0 +1,319 @@
+"""Multi-replica process-pool inference engine.
+
+One Python process can only drive one forward pass at a time efficiently, and
+torch's intra-op threading scales poorly past a couple of cores for a YOLOv8s
+at 640px. On a 4–8 vCPU Cloud Run instance the engine therefore runs
+``inference_replicas`` copies of the model in worker processes, each pinned to
+``threads_per_replica`` threads, and hands each request to an idle replica.
+
+Decoded images reach a replica through a shared-memory segment owned by that
+replica (grown on demand, reused across requests) rather than being pickled
+through the pipe; only the small raw-box arrays travel back. A replica that
+dies or hangs fails its in-flight request, is restarted in the background, and
+rejoins the pool once its model is loaded (and, with ``warmup_inference``, has
+run one dummy forward pass) again. :meth:`InferencePool.status` feeds the
+liveness block of ``/health``.
+"""
+
+# 1. Imports
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+
+from app.core import metrics
+from app.core.config import Settings
+from app.services.postprocess import RawBoxes
+
+logger = logging.getLogger(__name__)
+
+# Loading the model can take a while on a cold instance.
+_READY_TIMEOUT_S = 300.0
+_RESTART_BACKOFF_S = 5.0
+
+
+class ReplicaCrashed(RuntimeError):
+    """The replica serving a request died or timed out before answering."""
+
+
+# 2. Worker process
+def _replica_main(conn: Connection, settings: dict, threads: int, loader: Callable | None) -> None:
+    """Entry point of a replica process: load the model, then serve requests.
+    ``loader`` stands in for ``load_backend`` (it must be importable by name)."""
+    if loader is None:
+        from app.services.backends import load_backend as loader  # imported here, in the child
+
+    config = Settings(**settings)
+    backend = loader(config, threads=threads)
+    timings = dict(backend.timings)
+    if config.warmup_inference:
+        dummy = np.zeros((config.imgsz, config.imgsz, 3), np.uint8)
+        started = time.perf_counter()
+        backend.predict([dummy], config.conf_threshold)
+        timings["first_inference"] = time.perf_counter() - started
+        if config.cascade_enabled:
+            backend.predict([dummy], config.cascade_empty_conf, config.cascade_imgsz)
+    conn.send(("ready", (backend.names, timings)))
+
+    segment: SharedMemory | None = None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:  # parent went away
+            break
+        if message[0] == "stop":
+            break
+
+        _, name, shape, dtype, conf, imgsz = message
+        if segment is None or segment.name != name:
+            if segment is not None:
+                segment.close()
+            # Spawned children share the parent's resource tracker, so attaching
+            # here does not take over the segment — the parent still unlinks it.
+            segment = SharedMemory(name=name)
+
+        image = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        try:
+            conn.send(("ok", backend.predict([image], conf, imgsz)[0]))
+        except Exception as exc:  # noqa: BLE001 — reported to the caller, replica lives on
+            conn.send(("error", f"{type(exc).__name__}: {exc}"))
+        finally:
+            del image  # release the buffer export before the segment can be swapped
+
+    if segment is not None:
+        segment.close()
+
+
+# 3. Parent-side replica handle
+class _Replica:
+    """One worker process, its pipe, and the shared-memory segment it reads from."""
+
+    def __init__(self, index: int, ctx, settings: dict, threads: int, loader: Callable | None) -> None:
+        self.index = index
+        self.restarts = 0
+        self._ctx = ctx
+        self._settings = settings
+        self._threads = threads
+        self._loader = loader
+        self._segment: SharedMemory | None = None
+        self.names: dict[int, str] = {}
+        self.timings: dict[str, float] = {}
+        self._spawn()
+
+    def _spawn(self) -> None:
+        self.conn, child_conn = self._ctx.Pipe()
+        self.process = self._ctx.Process(
+            target=_replica_main,
+            args=(child_conn, self._settings, self._threads, self._loader),
+            name=f"inference-replica-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def wait_ready(self, timeout: float) -> None:
+        """Block until the replica reports its model is loaded and warm."""
+        status, payload = self._receive(timeout)
+        if status != "ready":
+            raise ReplicaCrashed(f"replica {self.index} failed to start: {payload}")
+        self.names, self.timings = payload
+
+    def restart(self) -> None:
+        self.stop(kill=True)
+        self.restarts += 1
+        self._spawn()
+
+    def stop(self, kill: bool = False) -> None:
+        if self.process.is_alive():
+            if kill:
+                self.process.kill()
+            else:
+                try:
+                    self.conn.send(("stop",))
+                except (BrokenPipeError, OSError):
+                    pass
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.conn.close()
+
+    def release_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+
+    def predict(self, image: np.ndarray, conf: float, imgsz: int | None, timeout: float) -> RawBoxes:
+        if not self.alive:
+            raise ReplicaCrashed(f"replica {self.index} is not running")
+
+        # Reuse this replica's segment; only grow it for a larger image.
+        if self._segment is None or self._segment.size < image.nbytes:
+            self.release_segment()
+            self._segment = SharedMemory(create=True, size=image.nbytes)
+        np.ndarray(image.shape, dtype=image.dtype, buffer=self._segment.buf)[...] = image
+
+        try:
+            self.conn.send(("infer", self._segment.name, image.shape, image.dtype.str, conf, imgsz))
+        except (BrokenPipeError, OSError) as exc:
+            raise ReplicaCrashed(f"replica {self.index} pipe closed") from exc
+
+        status, payload = self._receive(timeout)
+        if status == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    def _receive(self, timeout: float):
+        ready = wait([self.conn, self.process.sentinel], timeout=timeout)
+        if self.conn in ready:
+            try:
+                return self.conn.recv()
+            except EOFError:
+                pass
+        elif not ready:
+            raise ReplicaCrashed(f"replica {self.index} timed out after {timeout:.0f}s")
+        raise ReplicaCrashed(f"replica {self.index} exited (code {self.process.exitcode})")
+
+
+# 4. Pool
+class InferencePool:
+    """N replicas behind an idle queue; each request borrows one replica.
+
+    ``loader`` replaces ``load_backend`` in the replicas (tests use a stub)."""
+
+    def __init__(self, settings: Settings, loader: Callable | None = None) -> None:
+        self._timeout = settings.replica_timeout_s
+        self._conf = settings.conf_threshold
+        # spawn, not fork: the parent may already hold torch/BLAS threads.
+        ctx = mp.get_context("spawn")
+        payload = settings.model_dump()
+        self._replicas = [
+            _Replica(i, ctx, payload, settings.threads_per_replica, loader)
+            for i in range(settings.inference_replicas)
+        ]
+        self._idle: queue.Queue[_Replica] = queue.Queue()
+        # Guards _closed against restarts spawning a process after close().
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stopping = threading.Event()
+        self._restarters: list[threading.Thread] = []
+
+        try:
+            for replica in self._replicas:
+                replica.wait_ready(_READY_TIMEOUT_S)
+                self._idle.put(replica)
+        except BaseException:
+            self.close()
+            raise
+        self.names = self._replicas[0].names if self._replicas else {}
+        # Replicas start in parallel, so the slowest one bounds each stage.
+        self.timings = {
+            stage: max(r.timings.get(stage, 0.0) for r in self._replicas)
+            for stage in (self._replicas[0].timings if self._replicas else {})
+        }
+        logger.info("Inference pool ready: %d replica(s)", len(self._replicas))
+
+    def predict(
+        self, image: np.ndarray, conf: float | None = None, imgsz: int | None = None
+    ) -> RawBoxes:
+        """Run one image on the next idle replica (blocks while all are busy,
+        for at most ``replica_timeout_s``). ``conf`` / ``imgsz`` override the
+        configured threshold and input size."""
+        # A replica that died while idle is sent for restart and skipped.
+        replica = self._borrow()
+        while not replica.alive:
+            logger.error("Inference replica %d died while idle; restarting", replica.index)
+            self._schedule_restart(replica)
+            replica = self._borrow()
+
+        started = time.perf_counter()
+        try:
+            result = replica.predict(image, self._conf if conf is None else conf, imgsz, self._timeout)
+        except ReplicaCrashed:
+            logger.exception("Inference replica %d crashed; restarting", replica.index)
+            self._schedule_restart(replica)
+            raise
+        except BaseException:
+            self._idle.put(replica)
+            raise
+        self._idle.put(replica)
+        metrics.observe_stage("forward", time.perf_counter() - started)
+        return result
+
+    def _borrow(self) -> _Replica:
+        """The next idle replica; ReplicaCrashed once closed, or when none has
+        come back within the request timeout (all dead or restarting)."""
+        if self._closed:
+            raise ReplicaCrashed("inference pool is closed")
+        try:
+            return self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            raise ReplicaCrashed(
+                f"no inference replica became available within {self._timeout:.0f}s"
+            ) from None
+
+    def _schedule_restart(self, replica: _Replica) -> None:
+        thread = threading.Thread(
+            target=self._restart, args=(replica,), name="inference-replica-restart", daemon=True
+        )
+        with self._lock:
+            if self._closed:
+                return
+            self._restarters = [t for t in self._restarters if t.is_alive()]
+            self._restarters.append(thread)
+        thread.start()
+
+    def _restart(self, replica: _Replica) -> None:
+        """Replace a dead replica; it rejoins the idle queue once loaded."""
+        while True:
+            # Spawning under the lock: close() either sees the new process and
+            # stops it, or has already run and nothing is spawned.
+            with self._lock:
+                if self._closed:
+                    return
+                replica.restart()
+            try:
+                replica.wait_ready(_READY_TIMEOUT_S)
+            except (ReplicaCrashed, OSError):  # OSError: pipe closed by close()
+                if self._closed:
+                    return
+                logger.exception("Replica %d failed to restart; retrying", replica.index)
+                self._stopping.wait(_RESTART_BACKOFF_S)
+                continue
+            with self._lock:
+                if self._closed:
+                    return
+                self._idle.put(replica)
+            logger.info("Inference replica %d restarted", replica.index)
+            return
+
+    def status(self) -> dict:
+        """Liveness summary for /health."""
+        return {
+            "replicas": len(self._replicas),
+            "alive": sum(r.alive for r in self._replicas),
+            "idle": self._idle.qsize(),
+            "restarts": sum(r.restarts for r in self._replicas),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            restarters = list(self._restarters)
+        self._stopping.set()
+        for replica in self._replicas:
+            replica.stop()
+            replica.release_segment()
+        for thread in restarters:
+            thread.join(timeout=10)
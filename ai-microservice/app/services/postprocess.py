@@ -0,0 +1,318 @@
+"""Post-processing: raw model boxes → custom NMS → aggregated DetectionResult.
+
+Two implementations live here side by side:
+
+* The **reference path** (`compute_iomin`, `apply_custom_nms`, `_aggregate`) is
+  ported verbatim from the FYP evaluation script
+  (`scripts/ai-model/model-testing.py`) and works on per-box Python dicts.
+* The **array path** (`postprocess`) does the same work — box extraction, the
+  class-name split, the IoMin matrix, same-type suppression with the cross-type
+  exemption, and aggregation — as NumPy operations on the raw `xyxy`/`conf`/`cls`
+  arrays. The service uses this one; it is box-for-box identical to the
+  reference (see `smoke_test.py`), which is kept as the oracle.
+
+The model's six classes encode BOTH the hazard type and its severity, e.g.
+`pothole-high`, `crack-low`. We split on the hyphen: the left half is the base
+type, the right half is the severity level.
+"""
+
+# 1. Imports
+from dataclasses import dataclass
+from typing import NamedTuple
+
+import numpy as np
+
+from app.core import metrics
+from app.models.schemas import Detection, DetectionResult
+
+# low=1, medium=2, high=3 — used to average multiple severities into one level.
+_SEVERITY_ORDINAL = {"low": 1, "medium": 2, "high": 3}
+_ORDINAL_SEVERITY = {1: "low", 2: "medium", 3: "high"}
+
+_NO_HAZARD_MESSAGE = "No road hazard detected. Retake the photo focusing on the defect."
+
+
+# 2. Raw model output
+class RawBoxes(NamedTuple):
+    """Pre-NMS model output for one image, in original-image pixel coordinates."""
+
+    xyxy: np.ndarray  # (n, 4) float
+    conf: np.ndarray  # (n,) float
+    cls: np.ndarray  # (n,) class ids
+
+
+@dataclass(frozen=True)
+class ClassTable:
+    """Per-class lookups derived once from the model's `names` mapping.
+
+    ``base_type[c]`` indexes into ``type_names`` (or is -1 when the label has no
+    hyphen and must be skipped); ``severity[c]`` is the ordinal 1–3.
+    """
+
+    labels: dict[int, str]
+    type_names: tuple[str, ...]
+    base_type: np.ndarray
+    severity: np.ndarray
+
+
+def build_class_table(names: dict[int, str]) -> ClassTable:
+    """Split every `type-level` class label into type index + severity ordinal."""
+    size = max(names) + 1 if names else 0
+    type_names: list[str] = []
+    base_type = np.full(size, -1, dtype=np.int64)
+    severity = np.ones(size, dtype=np.int64)
+
+    for class_id, label in names.items():
+        if "-" not in label:
+            # Unexpected class naming; skipped rather than guessing type/severity.
+            continue
+        type_name, _, level = label.partition("-")
+        if type_name not in type_names:
+            type_names.append(type_name)
+        base_type[class_id] = type_names.index(type_name)
+        severity[class_id] = _SEVERITY_ORDINAL.get(level, _SEVERITY_ORDINAL["low"])
+
+    return ClassTable(dict(names), tuple(type_names), base_type, severity)
+
+
+# 3. Reference path — ported from scripts/ai-model/model-testing.py
+def compute_iomin(box_a, box_b) -> float:
+    """Intersection over Minimum area — catches a small box enclosed by a larger one."""
+    x1 = max(box_a[0], box_b[0])
+    y1 = max(box_a[1], box_b[1])
+    x2 = min(box_a[2], box_b[2])
+    y2 = min(box_a[3], box_b[3])
+
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    if intersection == 0:
+        return 0.0
+
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    min_area = min(area_a, area_b)
+
+    return intersection / min_area if min_area > 0 else 0.0
+
+
+def apply_custom_nms(detections, iomin_threshold):
+    """Filter redundant boxes, but keep overlapping boxes of *different* base type
+    (e.g. a pothole sitting inside a crack)."""
+    if not detections:
+        return []
+
+    detections = sorted(detections, key=lambda d: d["conf"], reverse=True)
+    kept = []
+    suppressed = set()
+
+    for i, det_a in enumerate(detections):
+        if i in suppressed:
+            continue
+
+        kept.append(det_a)
+        box_a = [det_a["x1"], det_a["y1"], det_a["x2"], det_a["y2"]]
+        base_type_a = det_a["label"].split("-")[0]
+
+        for j, det_b in enumerate(detections):
+            if j <= i or j in suppressed:
+                continue
+
+            box_b = [det_b["x1"], det_b["y1"], det_b["x2"], det_b["y2"]]
+            base_type_b = det_b["label"].split("-")[0]
+
+            if compute_iomin(box_a, box_b) >= iomin_threshold:
+                # Exemption: never suppress a differing hazard type.
+                if base_type_a != base_type_b:
+                    continue
+                suppressed.add(j)
+
+    return kept
+
+
+def _aggregate(kept: list[dict]) -> DetectionResult:
+    """Turn surviving boxes into the report-ready result (types + mean severity)."""
+    if not kept:
+        return DetectionResult(detected=False, message=_NO_HAZARD_MESSAGE)
+
+    detections: list[Detection] = []
+    for det in kept:
+        base_type, _, level = det["label"].partition("-")
+        severity = level if level in _SEVERITY_ORDINAL else "low"
+        detections.append(
+            Detection(
+                type=base_type,
+                severity=severity,
+                confidence=round(det["conf"], 4),
+                box=[det["x1"], det["y1"], det["x2"], det["y2"]],
+            )
+        )
+
+    # Distinct base types, sorted for a stable ("crack", "pothole") ordering.
+    defect_types = sorted({d.type for d in detections})
+
+    # Mean severity across every box, rounded to the nearest level (ties round up
+    # toward the more severe reading).
+    ordinals = [_SEVERITY_ORDINAL[d.severity] for d in detections]
+    mean_ordinal = sum(ordinals) / len(ordinals)
+    severity = _ORDINAL_SEVERITY[int(mean_ordinal + 0.5)]
+
+    # Primary type = single worst box (highest severity, then highest confidence)
+    # — populates the legacy single-value defect_type column.
+    worst = max(detections, key=lambda d: (_SEVERITY_ORDINAL[d.severity], d.confidence))
+
+    mean_confidence = round(sum(d.confidence for d in detections) / len(detections), 4)
+
+    if len(defect_types) > 1:
+        summary = f"Detected {len(kept)} hazards: {' and '.join(defect_types)}."
+    else:
+        summary = f"Detected {defect_types[0]} ({severity} severity)."
+
+    return DetectionResult(
+        detected=True,
+        defect_types=defect_types,
+        primary_type=worst.type,
+        severity=severity,
+        confidence=mean_confidence,
+        detection_count=len(detections),
+        detections=detections,
+        message=summary,
+    )
+
+
+# 4. Array path
+def iomin_matrix(boxes: np.ndarray) -> np.ndarray:
+    """Pairwise IoMin for integer (n, 4) boxes; same arithmetic as `compute_iomin`."""
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    intersection = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    min_area = np.minimum(area[:, None], area[None, :])
+
+    valid = (intersection != 0) & (min_area > 0)
+    out = np.zeros(intersection.shape, dtype=np.float64)
+    np.divide(intersection, min_area, out=out, where=valid)
+    return out
+
+
+def custom_nms_indices(
+    boxes: np.ndarray, conf: np.ndarray, base_type: np.ndarray, iomin_threshold: float
+) -> tuple[np.ndarray, int]:
+    """Greedy custom NMS over arrays. Returns (kept indices in confidence order,
+    number of cross-type exemptions made).
+
+    The whole IoMin matrix is computed up front; the remaining loop visits each
+    box once and updates the suppression mask with one vector operation, so it
+    scales with the number of *kept* boxes rather than all pairs.
+    """
+    n = len(conf)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), 0
+
+    # Stable descending sort keeps equal-confidence boxes in their original
+    # order — the same tie-break as `sorted(..., reverse=True)`.
+    order = np.argsort(-conf, kind="stable")
+    boxes, base_type = boxes[order], base_type[order]
+
+    overlapping = np.triu(iomin_matrix(boxes) >= iomin_threshold, k=1)
+    same_type = base_type[:, None] == base_type[None, :]
+    suppresses = overlapping & same_type
+    exempts = overlapping & ~same_type
+
+    suppressed = np.zeros(n, dtype=bool)
+    kept: list[int] = []
+    exemptions = 0
+    for i in range(n):
+        if suppressed[i]:
+            continue
+        kept.append(i)
+        exemptions += int(np.count_nonzero(exempts[i] & ~suppressed))
+        suppressed |= suppresses[i]
+
+    return order[kept], exemptions
+
+
+def postprocess(raw: RawBoxes, classes: ClassTable, iomin_threshold: float) -> DetectionResult:
+    """Array equivalent of ``_aggregate(apply_custom_nms(<dicts from raw>))``."""
+    cls = np.asarray(raw.cls).astype(np.int64, copy=False)
+    base_type = classes.base_type[cls] if len(cls) else np.empty(0, dtype=np.int64)
+    valid = base_type >= 0
+
+    # Same int() truncation the dict path applies to each coordinate.
+    boxes = np.asarray(raw.xyxy)[valid].astype(np.int64)
+    conf = np.asarray(raw.conf)[valid].astype(np.float64)
+    cls, base_type = cls[valid], base_type[valid]
+
+    with metrics.stage("nms"):
+        keep, _ = custom_nms_indices(boxes, conf, base_type, iomin_threshold)
+    with metrics.stage("aggregate"):
+        return _aggregate_arrays(boxes[keep], conf[keep], cls[keep], classes)
+
+
+# 5. Aggregation over arrays
+def _aggregate_arrays(
+    boxes: np.ndarray, conf: np.ndarray, cls: np.ndarray, classes: ClassTable
+) -> DetectionResult:
+    """Array twin of `_aggregate`. Rounding and summation of the (few) kept
+    confidences stay in Python so the floats match the reference exactly."""
+    if not len(cls):
+        return DetectionResult(detected=False, message=_NO_HAZARD_MESSAGE)
+
+    type_idx = classes.base_type[cls]
+    ordinals = classes.severity[cls]
+    confidences = [round(c, 4) for c in conf.tolist()]
+
+    types = [classes.type_names[t] for t in type_idx.tolist()]
+    severities = [_ORDINAL_SEVERITY[o] for o in ordinals.tolist()]
+    detections = [
+        Detection(type=t, severity=s, confidence=c, box=b)
+        for t, s, c, b in zip(types, severities, confidences, boxes.tolist())
+    ]
+
+    defect_types = sorted(set(types))
+    severity = _ORDINAL_SEVERITY[int(ordinals.sum() / len(ordinals) + 0.5)]
+
+    # Worst box: highest severity, then highest (rounded) confidence, first wins.
+    candidates = np.flatnonzero(ordinals == ordinals.max())
+    worst = candidates[int(np.argmax(np.asarray(confidences)[candidates]))]
+
+    mean_confidence = round(sum(confidences) / len(confidences), 4)
+
+    if len(defect_types) > 1:
+        summary = f"Detected {len(detections)} hazards: {' and '.join(defect_types)}."
+    else:
+        summary = f"Detected {defect_types[0]} ({severity} severity)."
+
+    return DetectionResult(
+        detected=True,
+        defect_types=defect_types,
+        primary_type=types[worst],
+        severity=severity,
+        confidence=mean_confidence,
+        detection_count=len(detections),
+        detections=detections,
+        message=summary,
+    )
+
+
+# 6. Cascade verdict
+def cascade_verdict(raw: RawBoxes, accept_conf: float) -> str | None:
+    """Judge a low-resolution pass run with the cascade's low confidence floor.
+
+    "empty" — no box even reached the floor; "positive" — every box is at or
+    above ``accept_conf``, so the low-res result stands; None — something sits
+    in between and the image must be re-run at full resolution.
+    """
+    conf = np.asarray(raw.conf)
+    if conf.size == 0:
+        return "empty"
+    if bool((conf >= accept_conf).all()):
+        return "positive"
+    return None
+
+
+# 7. Severity ordering
+def severity_rank(severity: str) -> int:
+    """Ordinal of a severity level (low=1, medium=2, high=3), for comparing readings."""
+    return _SEVERITY_ORDINAL[severity]
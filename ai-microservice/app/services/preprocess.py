@@ -0,0 +1,80 @@
+"""Upload decoding — bytes → a ready-sized RGB array for the model.
+
+Phone photos are 12–50 MP, but the model letterboxes everything down to
+``imgsz`` (640 px) anyway, so fully decoding, rotating and copying the
+original costs more than inference itself. The fast path instead:
+
+1. asks libjpeg for a DCT-scaled decode (``Image.draft``) at 1/2, 1/4 or 1/8
+   size — the smallest that still covers ``imgsz`` — so the full-resolution
+   pixels are never materialised;
+2. applies the EXIF orientation in place, on the small image;
+3. resizes so the long side is exactly ``imgsz`` (the model's own letterbox
+   then has nothing left to resize) and converts to RGB only if needed;
+4. makes the single unavoidable PIL → NumPy copy.
+
+Detections come back in the coordinates of that small array; :func:`to_original`
+maps them to original-image pixels so the ``Detection.box`` contract is unchanged.
+"""
+
+# 1. Imports
+import io
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.services.postprocess import RawBoxes
+
+# EXIF orientations 5–8 rotate by 90°/270°, swapping width and height.
+_EXIF_ORIENTATION = 0x0112
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+# 2. Decoded image
+class DecodedImage(NamedTuple):
+    """A model-ready RGB array plus the factors mapping it back to the original."""
+
+    array: np.ndarray  # RGB HxWx3 uint8
+    scale_x: float  # original width / array width
+    scale_y: float  # original height / array height
+
+
+# 3. Decoding
+def decode_image(data: bytes, target: int | None) -> DecodedImage:
+    """Decode upload bytes; with a ``target`` long side, take the fast path.
+
+    ``target=None`` decodes at full resolution (scale 1). Raises whatever PIL
+    raises for undecodable input — the caller maps that to a 400.
+    """
+    pil = Image.open(io.BytesIO(data))
+
+    # Original size as the user sees it (after EXIF rotation).
+    width, height = pil.size
+    if pil.getexif().get(_EXIF_ORIENTATION, 1) in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    if target and pil.format == "JPEG":
+        # Largest DCT reduction that keeps both sides >= target; no-op otherwise.
+        pil.draft("RGB", (target, target))
+
+    # Respect EXIF orientation from phone cameras — in place, on the small image.
+    ImageOps.exif_transpose(pil, in_place=True)
+
+    if target and max(pil.size) > target:
+        pil.thumbnail((target, target), Image.BILINEAR, reducing_gap=None)
+
+    if pil.mode != "RGB":
+        pil = pil.convert("RGB")
+
+    array = np.asarray(pil)
+    return DecodedImage(array, width / array.shape[1], height / array.shape[0])
+
+
+def to_original(raw: RawBoxes, decoded: DecodedImage) -> RawBoxes:
+    """Map boxes predicted on ``decoded.array`` back to original-image pixels."""
+    if decoded.scale_x == 1 and decoded.scale_y == 1:
+        return raw
+    scale = np.array(
+        [decoded.scale_x, decoded.scale_y, decoded.scale_x, decoded.scale_y], dtype=np.float64
+    )
+    return raw._replace(xyxy=np.asarray(raw.xyxy, dtype=np.float64) * scale)
@@ -0,0 +1,131 @@
+"""Dynamic micro-batching scheduler for the YOLO forward pass.
+
+Concurrent /detect calls on one instance used to queue behind a global lock and
+run the model one image at a time. The scheduler instead owns the model on a
+single background thread: requests that arrive close together (within
+``batch_max_wait_ms`` of the first one, up to ``batch_max_size`` images) are
+grouped and run through the model in one forward pass, amortising the per-call
+overhead. Every caller blocks on its own Future and gets back only its own
+prediction, so the batching is invisible to the rest of the service.
+
+Jobs carry a ``key`` (the detector uses the pass's input size and confidence
+floor): images with different keys cannot share a forward pass, so each
+collected batch is split into one run per key, still on the same single thread.
+"""
+
+# 1. Imports
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Sequence
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# 2. Job envelope
+@dataclass
+class _Job:
+    """One caller's image plus the Future its prediction is delivered through."""
+
+    image: Any
+    key: Hashable = None
+    future: Future = field(default_factory=Future)
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+# 3. Scheduler
+class MicroBatcher:
+    """Collects submitted images into batches and runs them on one worker thread.
+
+    ``run_batch`` receives a list of images plus their shared key and must
+    return one output per image, in the same order. It is only ever called from
+    the worker thread, so the model behind it needs no extra locking.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list, Hashable], Sequence],
+        max_batch_size: int,
+        max_wait_s: float,
+        name: str = "inference-batcher",
+    ) -> None:
+        self._run_batch = run_batch
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait_s = max(0.0, max_wait_s)
+        self._name = name
+        self._queue: queue.SimpleQueue[_Job] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    # -- public API ---------------------------------------------------------
+    def submit(self, image: Any, key: Hashable = None) -> Future:
+        """Queue one image; the returned Future resolves to its own output."""
+        self._ensure_started()
+        job = _Job(image, key)
+        self._queue.put(job)
+        return job.future
+
+    def run(self, image: Any, key: Hashable = None) -> Any:
+        """Blocking convenience wrapper around :meth:`submit`."""
+        return self.submit(image, key).result()
+
+    # -- worker -------------------------------------------------------------
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self._name, daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list[_Job]:
+        """Block for the first job, then gather more until the batch is full
+        or the wait window measured from that first job has closed."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._max_wait_s
+        while len(batch) < self._max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            # Drop jobs whose caller already gave up (cancelled Futures).
+            batch = [job for job in self._collect() if job.future.set_running_or_notify_cancel()]
+            groups: dict[Hashable, list[_Job]] = {}
+            for job in batch:
+                groups.setdefault(job.key, []).append(job)
+            for key, jobs in groups.items():
+                self._run(key, jobs)
+
+    def _run(self, key: Hashable, batch: list[_Job]) -> None:
+        started = time.perf_counter()
+        for job in batch:
+            metrics.observe_stage("batch_wait", started - job.queued_at)
+        metrics.BATCH_SIZE.observe(len(batch))
+
+        try:
+            outputs = self._run_batch([job.image for job in batch], key)
+            if len(outputs) != len(batch):
+                raise RuntimeError(
+                    f"Batch runner returned {len(outputs)} outputs for {len(batch)} images."
+                )
+        except BaseException as exc:  # noqa: BLE001 — surfaced to every caller
+            logger.exception("Batched inference failed (batch of %d)", len(batch))
+            for job in batch:
+                job.future.set_exception(exc)
+            return
+
+        metrics.observe_stage("forward", time.perf_counter() - started)
+        for job, output in zip(batch, outputs):
+            job.future.set_result(output)
@@ -0,0 +1,278 @@
+"""Frame-stream sessions for the /stream WebSocket (dashcam footage).
+
+At 10–30 fps consecutive dashcam frames are mostly the same picture, so a
+session does two things on top of the normal detection pipeline:
+
+* **Near-duplicate skipping.** Each frame gets a cheap perceptual signature — a
+  16×16 grayscale thumbnail from a DCT-scaled JPEG draft decode, so the full
+  frame is never decoded for it. A frame whose signature is within
+  ``stream_duplicate_threshold`` of one of the last few *processed* frames is
+  skipped without touching the model. Comparing against processed frames only
+  means a slow drift still triggers a fresh frame once it adds up; a frame
+  whose detection failed is not remembered, so its near-duplicates are
+  inferred instead of pointing at a frame that has no result.
+* **Hazard tracking.** Detections in consecutive processed frames that have the
+  same type and overlap (IoU ≥ ``stream_track_iou``) are merged into one hazard
+  track. A track ends when it has gone unseen for ``stream_track_max_gap``
+  processed frames, or when the stream ends, and is reported once.
+
+The remaining frames of each received batch are decoded and handed to
+:func:`detector.analyze_decoded` together, so they share forward passes.
+A session is only ever used by one call at a time (the WebSocket handler
+awaits each batch), so it needs no locking.
+"""
+
+# 1. Imports
+import io
+import logging
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+from pydantic import BaseModel
+
+from app.core import metrics
+from app.core.config import Settings
+from app.models.schemas import (
+    Detection,
+    DetectionResult,
+    StreamFrameEvent,
+    StreamHazard,
+    StreamHazardEvent,
+    StreamSummary,
+)
+from app.services import detector
+from app.services.postprocess import severity_rank
+from app.services.preprocess import DecodedImage, decode_image
+
+logger = logging.getLogger(__name__)
+
+_THUMB_SIZE = 16
+
+_FRAMES = metrics.Counter("stream_frames_total", "Frames received on /stream, by outcome.", ("status",))
+
+
+# 2. Perceptual signature
+def frame_signature(data: bytes) -> np.ndarray:
+    """16×16 grayscale thumbnail in 0–1. For JPEG, libjpeg decodes straight to
+    grayscale at 1/8 scale; other formats fall back to a full decode."""
+    with Image.open(io.BytesIO(data)) as pil:
+        pil.draft("L", (_THUMB_SIZE * 8, _THUMB_SIZE * 8))
+        thumb = pil.convert("L").resize((_THUMB_SIZE, _THUMB_SIZE), Image.Resampling.BILINEAR)
+    return np.asarray(thumb, dtype=np.float32) / 255
+
+
+def frame_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference of two signatures (0 = identical, 1 = inverted)."""
+    return float(np.abs(a - b).mean())
+
+
+# 3. Hazard tracking
+def _iou(a: list[int], b: list[int]) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+@dataclass
+class _Track:
+    hazard: StreamHazard
+    last_box: list[int]
+    last_seen: int  # processed-frame sequence number
+
+
+class HazardTracker:
+    """Greedy frame-to-frame association of detections into hazard tracks."""
+
+    def __init__(self, iou_threshold: float, max_gap: int) -> None:
+        self._iou_threshold = iou_threshold
+        self._max_gap = max(0, max_gap)
+        self._open: list[_Track] = []
+        self._next_id = 0
+        self._sequence = 0
+        self.total = 0
+
+    def update(self, frame: int, detections: list[Detection]) -> tuple[list[int], list[StreamHazard]]:
+        """Add one processed frame. Returns the track id of each detection (in
+        order) and the tracks that ended because they went unseen too long."""
+        self._sequence += 1
+        matched: set[int] = set()
+        track_ids = [0] * len(detections)
+
+        # Most confident detections pick their track first.
+        for i in sorted(range(len(detections)), key=lambda i: -detections[i].confidence):
+            det = detections[i]
+            best, best_iou = None, self._iou_threshold
+            for track in self._open:
+                if track.hazard.track_id in matched or track.hazard.type != det.type:
+                    continue
+                overlap = _iou(track.last_box, det.box)
+                if overlap >= best_iou:
+                    best, best_iou = track, overlap
+            if best is None:
+                best = self._start(frame, det)
+            else:
+                self._extend(best, frame, det)
+            matched.add(best.hazard.track_id)
+            track_ids[i] = best.hazard.track_id
+
+        ended = [t for t in self._open if self._sequence - t.last_seen > self._max_gap]
+        self._open = [t for t in self._open if t not in ended]
+        return track_ids, [t.hazard for t in ended]
+
+    def close_all(self) -> list[StreamHazard]:
+        ended, self._open = self._open, []
+        return [t.hazard for t in ended]
+
+    def _start(self, frame: int, det: Detection) -> _Track:
+        self._next_id += 1
+        self.total += 1
+        track = _Track(
+            hazard=StreamHazard(
+                track_id=self._next_id, type=det.type, severity=det.severity,
+                confidence=det.confidence, box=det.box,
+                first_frame=frame, last_frame=frame, frames=1,
+            ),
+            last_box=det.box,
+            last_seen=self._sequence,
+        )
+        self._open.append(track)
+        return track
+
+    def _extend(self, track: _Track, frame: int, det: Detection) -> None:
+        hazard = track.hazard
+        if severity_rank(det.severity) > severity_rank(hazard.severity):
+            hazard.severity = det.severity
+        if det.confidence > hazard.confidence:
+            hazard.confidence, hazard.box = det.confidence, det.box
+        hazard.frames += 1
+        hazard.last_frame = frame
+        track.last_box = det.box
+        track.last_seen = self._sequence
+
+
+# 4. Session
+class StreamSession:
+    """State of one /stream connection: recent signatures, open tracks, counts."""
+
+    def __init__(self, settings: Settings) -> None:
+        self._settings = settings
+        self._recent: deque[tuple[int, np.ndarray]] = deque(maxlen=max(1, settings.stream_duplicate_window))
+        self._tracker = HazardTracker(settings.stream_track_iou, settings.stream_track_max_gap)
+        self.frames = self.processed = self.skipped = self.failed = 0
+
+    def process(self, frames: list[tuple[int, bytes]]) -> list[BaseModel]:
+        """Skip, decode and infer a batch of received frames (on the inference
+        executor); their events in frame order, each followed by any hazard
+        tracks that frame ended."""
+        settings = self._settings
+        target = settings.imgsz if settings.fast_decode else None
+        events: dict[int, StreamFrameEvent] = {}
+        signatures: dict[int, np.ndarray] = {}
+        to_infer: list[tuple[int, DecodedImage]] = []
+        # Near-duplicates of a frame earlier in this batch: index -> (source, bytes),
+        # skipped only once the source has a result.
+        held: dict[int, tuple[int, bytes]] = {}
+
+        for index, data in frames:
+            self.frames += 1
+            if len(data) > settings.max_upload_bytes:
+                events[index] = self._failed(index, "Frame exceeds the maximum allowed size.")
+                continue
+            try:
+                signature = frame_signature(data)
+                duplicate_of = self._duplicate_of(signature, [(i, signatures[i]) for i, _ in to_infer])
+                if duplicate_of is None:
+                    with metrics.stage("decode"):
+                        decoded = decode_image(data, target)
+            except Exception:  # noqa: BLE001 — recorded as this frame's error
+                events[index] = self._failed(index, "Frame is not a valid image.")
+                continue
+            signatures[index] = signature
+            if duplicate_of is None:
+                to_infer.append((index, decoded))
+            elif duplicate_of in signatures:
+                held[index] = (duplicate_of, data)
+            else:
+                events[index] = self._skipped(index, duplicate_of)
+
+        results = self._infer(to_infer)
+        retry = []
+        for index, (source, data) in held.items():
+            if isinstance(results[source], DetectionResult):
+                events[index] = self._skipped(index, source)
+                continue
+            try:
+                with metrics.stage("decode"):
+                    retry.append((index, decode_image(data, target)))
+            except Exception:  # noqa: BLE001 — recorded as this frame's error
+                events[index] = self._failed(index, "Frame is not a valid image.")
+        results.update(self._infer(retry))
+
+        out: list[BaseModel] = []
+        for index, _ in frames:
+            if index not in results:
+                out.append(events[index])
+                continue
+            outcome = results[index]
+            if not isinstance(outcome, DetectionResult):
+                if not isinstance(outcome, ValueError):
+                    logger.error("Stream frame %d failed", index, exc_info=outcome)
+                out.append(self._failed(index, "Detection failed while processing the frame."))
+                continue
+            self.processed += 1
+            _FRAMES.inc("processed")
+            self._recent.append((index, signatures[index]))
+            track_ids, ended = self._tracker.update(index, outcome.detections)
+            out.append(StreamFrameEvent(frame=index, status="processed", result=outcome, track_ids=track_ids))
+            out.extend(StreamHazardEvent(hazard=hazard) for hazard in ended)
+        return out
+
+    def dropped(self, frames: list[tuple[int, bytes]], reason: str) -> list[BaseModel]:
+        """Events for a batch the inference executor would not admit."""
+        self.frames += len(frames)
+        self.failed += len(frames)
+        _FRAMES.inc("dropped", amount=len(frames))
+        return [StreamFrameEvent(frame=index, status="dropped", error=reason) for index, _ in frames]
+
+    def finish(self) -> list[BaseModel]:
+        """Close every open track and summarise the stream."""
+        events: list[BaseModel] = [StreamHazardEvent(hazard=h) for h in self._tracker.close_all()]
+        events.append(
+            StreamSummary(
+                frames=self.frames, processed=self.processed, skipped=self.skipped,
+                failed=self.failed, hazards=self._tracker.total,
+            )
+        )
+        return events
+
+    def _duplicate_of(self, signature: np.ndarray, pending: list[tuple[int, np.ndarray]]) -> int | None:
+        """The newest processed or ``pending`` frame this signature nearly matches."""
+        threshold = self._settings.stream_duplicate_threshold
+        if threshold <= 0:
+            return None
+        for index, recent in reversed([*self._recent, *pending]):
+            if frame_difference(signature, recent) < threshold:
+                return index
+        return None
+
+    @staticmethod
+    def _infer(frames: list[tuple[int, DecodedImage]]) -> dict[int, DetectionResult | Exception]:
+        """Each frame's outcome, from shared forward passes."""
+        if not frames:
+            return {}
+        outcomes = detector.analyze_decoded([decoded for _, decoded in frames])
+        return dict(zip((index for index, _ in frames), outcomes))
+
+    def _skipped(self, index: int, duplicate_of: int) -> StreamFrameEvent:
+        self.skipped += 1
+        _FRAMES.inc("skipped")
+        return StreamFrameEvent(frame=index, status="skipped", duplicate_of=duplicate_of)
+
+    def _failed(self, index: int, reason: str) -> StreamFrameEvent:
+        self.failed += 1
+        _FRAMES.inc("failed")
+        return StreamFrameEvent(frame=index, status="failed", error=reason)
@@ -0,0 +1,13 @@
+"""Performance benchmarks for the AI service.
+
+Run from ``ai-microservice/``:
+
+* ``python -m benchmarks.micro`` — decode, custom NMS and aggregation timings.
+* ``python -m benchmarks.load --stub`` — drives ``POST /detect`` over HTTP at
+  one or more concurrency levels against a stub-model server (no best.pt needed),
+  or ``--url`` for an already-running instance.
+
+Both accept ``--save-baseline NAME`` and ``--compare NAME``: baselines are JSON
+files under ``benchmarks/baselines/``. A compare run exits non-zero when any
+metric is worse than the baseline by more than ``--tolerance``.
+"""
@@ -0,0 +1,180 @@
+"""Shared benchmark helpers: the synthetic image corpus, timing, and baselines."""
+
+# 1. Imports
+import io
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from PIL import Image
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+# Phone-ish resolutions from a small upload to a 12 MP photo.
+CORPUS_SIZES = [(640, 480), (1280, 720), (1920, 1080), (4032, 3024)]
+CORPUS_FORMATS = ["JPEG", "PNG", "WEBP"]
+_CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+_EXTENSION_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+
+
+# 2. Image corpus
+class CorpusImage:
+    """One encoded image: a name for reports, its bytes and its content type."""
+
+    def __init__(self, name: str, data: bytes, content_type: str) -> None:
+        self.name = name
+        self.data = data
+        self.content_type = content_type
+
+
+def _road_like(width: int, height: int, seed: int) -> Image.Image:
+    """Smooth gradients plus mild noise — compresses like a photo, unlike pure noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = 96 + 48 * np.sin(x / 37.0) * np.cos(y / 53.0)
+    noise = rng.normal(0, 12, (height, width, 1))
+    rgb = np.clip(base[..., None] + noise + np.array([10, 0, -10]), 0, 255).astype(np.uint8)
+    return Image.fromarray(rgb)
+
+
+def synthetic_corpus(max_bytes: int | None = None) -> list[CorpusImage]:
+    """Every CORPUS_SIZES × CORPUS_FORMATS combination, skipping encodings
+    larger than ``max_bytes`` (the service would reject them with a 413)."""
+    corpus = []
+    for i, (width, height) in enumerate(CORPUS_SIZES):
+        image = _road_like(width, height, seed=i)
+        for fmt in CORPUS_FORMATS:
+            buf = io.BytesIO()
+            image.save(buf, format=fmt, quality=90)
+            if max_bytes is not None and buf.tell() > max_bytes:
+                continue
+            corpus.append(CorpusImage(f"{fmt.lower()}_{width}x{height}", buf.getvalue(), _CONTENT_TYPES[fmt]))
+    return corpus
+
+
+def load_corpus(directory: str) -> list[CorpusImage]:
+    """Real images from a directory (jpg/png/webp)."""
+    files = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in _EXTENSION_TYPES)
+    return [CorpusImage(p.name, p.read_bytes(), _EXTENSION_TYPES[p.suffix.lower()]) for p in files]
+
+
+# 3. Timing
+def time_call(fn: Callable[[], object], min_time_s: float = 0.2, repeats: int = 5) -> float:
+    """Median milliseconds per call over ``repeats`` rounds, each round looping
+    ``fn`` until it has run for at least ``min_time_s``."""
+    fn()  # warm caches / lazy imports outside the measurement
+    rounds = []
+    for _ in range(repeats):
+        calls = 0
+        started = time.perf_counter()
+        while True:
+            fn()
+            calls += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_time_s:
+                break
+        rounds.append(elapsed * 1000 / calls)
+    return statistics.median(rounds)
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+# 4. Baselines
+def environment() -> dict:
+    """Where a run happened — numbers only compare fairly on the same box."""
+    import fastapi
+    import PIL
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "fastapi": fastapi.__version__,
+    }
+
+
+def save_baseline(name: str, kind: str, metrics: dict[str, float], config: dict) -> Path:
+    path = BASELINE_DIR / f"{name}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "kind": kind,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": config,
+        "metrics": metrics,
+    }
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n")
+    return path
+
+
+def load_baseline(name: str, kind: str) -> dict:
+    path = BASELINE_DIR / f"{name}.json"
+    if not path.is_file():
+        raise SystemExit(f"No baseline '{name}' at {path}. Create it with --save-baseline {name}.")
+    baseline = json.loads(path.read_text())
+    if baseline["kind"] != kind:
+        raise SystemExit(f"Baseline '{name}' is a {baseline['kind']} baseline, not {kind}.")
+    return baseline
+
+
+def _higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+def compare_to_baseline(metrics: dict[str, float], baseline: dict, tolerance: float) -> list[str]:
+    """Print current vs baseline per metric; return the metrics that regressed
+    by more than ``tolerance`` (relative, e.g. 0.10 = 10 %)."""
+    if baseline["environment"] != environment():
+        print("note: baseline was recorded in a different environment:")
+        for key, value in baseline["environment"].items():
+            if environment().get(key) != value:
+                print(f"  {key}: {value} -> {environment().get(key)}")
+
+    regressions = []
+    print(f"\n{'metric':<44} {'baseline':>12} {'current':>12} {'change':>9}")
+    for metric, old in sorted(baseline["metrics"].items()):
+        if metric not in metrics:
+            print(f"{metric:<44} {old:>12.3f} {'-':>12} {'missing':>9}")
+            continue
+        new = metrics[metric]
+        change = (new - old) / old if old else 0.0
+        worse = -change if _higher_is_better(metric) else change
+        flag = ""
+        if worse > tolerance:
+            regressions.append(metric)
+            flag = "  REGRESSION"
+        print(f"{metric:<44} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def finish(kind: str, metrics: dict[str, float], config: dict, args) -> int:
+    """Handle ``--save-baseline`` / ``--compare`` / ``--tolerance``; exit code."""
+    status = 0
+    if args.compare:
+        regressions = compare_to_baseline(metrics, load_baseline(args.compare, kind), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}.")
+            status = 1
+        else:
+            print(f"\nNo regressions beyond {args.tolerance:.0%}.")
+    if args.save_baseline:
+        print(f"Baseline saved to {save_baseline(args.save_baseline, kind, metrics, config)}")
+    return status
+
+
+def add_baseline_arguments(parser) -> None:
+    parser.add_argument("--save-baseline", metavar="NAME", help="Save this run as benchmarks/baselines/NAME.json.")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against a saved baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed relative regression per metric (default 0.10).")
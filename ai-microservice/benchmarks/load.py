@@ -0,0 +1,209 @@
+"""HTTP load generator for ``POST /detect``.
+
+Sends the image corpus (synthetic: several sizes × JPEG/PNG/WebP, or
+``--images DIR``) round-robin as raw bodies from ``concurrency`` closed-loop
+clients. For each concurrency level it reports p50/p95/p99 latency, throughput
+and non-200 responses; the server's peak RSS (``VmHWM`` of the server process
+and its children, from /proc) is reported at the end.
+
+    python -m benchmarks.load --stub                          # stub model, no best.pt
+    python -m benchmarks.load --stub --concurrency 1,8,32 --requests 400 --save-baseline stub
+    python -m benchmarks.load --url http://127.0.0.1:8000 --pid 1234 --duration 30
+
+``--stub`` starts ``benchmarks.stub`` on a free local port and stops it again
+afterwards. Against ``--url`` the result cache answers repeated images, so
+disable it on that server (RESULT_CACHE_ENTRIES=0) to measure inference.
+"""
+
+# 1. Imports
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import add_baseline_arguments, finish, load_corpus, percentile, synthetic_corpus
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # Settings.max_upload_bytes
+
+
+# 2. Server under test
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(args) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "benchmarks.stub", "--port", str(port),
+        "--batch-ms", str(args.batch_ms), "--image-ms", str(args.image_ms),
+    ]
+    process = subprocess.Popen(command, cwd=SERVICE_DIR)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def wait_ready(url: str, timeout_s: float, process: subprocess.Popen | None = None) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode} before becoming ready.")
+        try:
+            if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"{url} was not ready after {timeout_s:.0f} s.")
+
+
+def _children(pid: int) -> list[int]:
+    pids = []
+    for task in Path(f"/proc/{pid}/task").glob("*/children"):
+        for child in task.read_text().split():
+            pids.append(int(child))
+            pids.extend(_children(int(child)))
+    return pids
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    """Summed peak resident set size of ``pid`` and its descendants (Linux)."""
+    total_kb = 0
+    try:
+        for proc in [pid, *_children(pid)]:
+            for line in Path(f"/proc/{proc}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    total_kb += int(line.split()[1])
+    except OSError:
+        return None
+    return total_kb / 1024
+
+
+# 3. Load
+async def run_level(url: str, corpus, concurrency: int, requests: int | None, duration_s: float | None) -> dict:
+    """Closed loop: ``concurrency`` clients, each sending its next request as
+    soon as the previous one returns, until the request budget or time is up.
+
+    Like ``throughput_per_s``, the latency percentiles cover 200s only: a fast
+    429/503 rejection under overload would otherwise pull them down."""
+    images = itertools.cycle(corpus)
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    sent = 0
+    deadline = time.perf_counter() + duration_s if duration_s else None
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal sent
+        while True:
+            if requests is not None and sent >= requests:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            sent += 1
+            image = next(images)
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    f"{url}/detect", content=image.data, headers={"Content-Type": image.content_type}
+                )
+                statuses[response.status_code] += 1
+            except httpx.TransportError as exc:
+                statuses[type(exc).__name__] += 1
+                continue
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = statuses.get(200, 0)
+    return {
+        "requests": sum(statuses.values()),
+        "errors": {str(k): v for k, v in statuses.items() if k != 200},
+        "throughput_per_s": ok / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies, default=0.0),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Drive POST /detect and report latency/throughput/RSS.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Base URL of a running service.")
+    target.add_argument("--stub", action="store_true", help="Start a stub-model server for the run.")
+    parser.add_argument("--pid", type=int, help="Server PID for peak RSS when using --url.")
+    parser.add_argument("--batch-ms", type=float, default=20.0, help="Stub: simulated cost per forward pass.")
+    parser.add_argument("--image-ms", type=float, default=5.0, help="Stub: simulated cost per image.")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels.")
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument("--requests", type=int, help="Requests per level (default 200).")
+    budget.add_argument("--duration", type=float, help="Seconds per level instead of a request count.")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests before the first level.")
+    parser.add_argument("--images", help="Use the images in this directory instead of the synthetic corpus.")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+    if args.requests is None and args.duration is None:
+        args.requests = 200
+
+    max_bytes = int(os.environ.get("MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES))
+    corpus = load_corpus(args.images) if args.images else synthetic_corpus(max_bytes)
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    process = None
+    url, pid = args.url, args.pid
+    if args.stub:
+        process, url = start_stub(args)
+        pid = process.pid
+    try:
+        wait_ready(url, args.ready_timeout, process)
+        if args.warmup:
+            asyncio.run(run_level(url, corpus, 1, args.warmup, None))
+
+        print(f"{len(corpus)} corpus images against {url}\n")
+        print(f"{'conc':>5} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  errors")
+        metrics = {}
+        for level in levels:
+            result = asyncio.run(run_level(url, corpus, level, args.requests, args.duration))
+            print(f"{level:>5} {result['requests']:>9} {result['throughput_per_s']:>8.1f} "
+                  f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                  f"{result['max_ms']:>9.1f}  {result['errors'] or '-'}")
+            for key in ("throughput_per_s", "p50_ms", "p95_ms", "p99_ms"):
+                metrics[f"c{level}.{key}"] = round(result[key], 3)
+
+        rss = peak_rss_mb(pid) if pid else None
+        if rss is not None:
+            metrics["server.peak_rss_mb"] = round(rss, 1)
+            print(f"\nServer peak RSS: {rss:.1f} MB")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    config = {
+        "target": "stub" if args.stub else url,
+        "stub": {"batch_ms": args.batch_ms, "image_ms": args.image_ms} if args.stub else None,
+        "concurrency": levels,
+        "requests": args.requests,
+        "duration": args.duration,
+        "images": args.images or "synthetic",
+    }
+    return finish("load", metrics, config, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
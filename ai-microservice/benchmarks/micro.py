@@ -0,0 +1,130 @@
+"""Micro-benchmarks of the request path's CPU stages, without a model or server.
+
+* decode — ``decode_image`` for every corpus image, fast path (to imgsz) and
+  full resolution;
+* nms — the reference ``apply_custom_nms`` (per-box dicts) and the service's
+  ``custom_nms_indices`` at increasing raw box counts, plus ``postprocess`` end to end;
+* aggregate — the reference ``_aggregate`` and the array ``_aggregate_arrays``
+  at typical kept-box counts.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --save-baseline main
+    python -m benchmarks.micro --compare main --tolerance 0.15
+"""
+
+# 1. Imports
+import argparse
+import sys
+
+import numpy as np
+
+from app.services.postprocess import (
+    RawBoxes,
+    _aggregate,
+    _aggregate_arrays,
+    apply_custom_nms,
+    build_class_table,
+    custom_nms_indices,
+    postprocess,
+)
+from app.services.preprocess import decode_image
+from benchmarks.common import add_baseline_arguments, finish, load_corpus, synthetic_corpus, time_call
+from benchmarks.stub import STUB_NAMES
+
+CLASSES = build_class_table(STUB_NAMES)
+NMS_BOX_COUNTS = [10, 50, 200, 500]
+AGGREGATE_BOX_COUNTS = [1, 5, 20]
+IOMIN_THRESHOLD = 0.45
+
+
+# 2. Synthetic model output
+def raw_boxes(n: int, seed: int = 0) -> RawBoxes:
+    """``n`` boxes clustered on a 1920×1080 frame, so plenty of them overlap."""
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform([100, 100], [1820, 980], (max(1, n // 5), 2))
+    xy = centres[rng.integers(0, len(centres), n)] + rng.normal(0, 25, (n, 2))
+    wh = rng.uniform(40, 220, (n, 2))
+    xyxy = np.hstack([xy - wh / 2, xy + wh / 2])
+    return RawBoxes(xyxy, rng.uniform(0.25, 0.99, n), rng.integers(0, len(STUB_NAMES), n).astype(float))
+
+
+def as_dicts(raw: RawBoxes) -> list[dict]:
+    """The reference path's input, built like the evaluation script builds it."""
+    dicts = []
+    for (x1, y1, x2, y2), conf, cls in zip(raw.xyxy, raw.conf, raw.cls):
+        dicts.append({"x1": int(x1), "y1": int(y1), "x2": int(x2), "y2": int(y2),
+                      "conf": float(conf), "label": STUB_NAMES[int(cls)]})
+    return dicts
+
+
+def array_inputs(raw: RawBoxes):
+    cls = raw.cls.astype(np.int64)
+    return raw.xyxy.astype(np.int64), raw.conf.astype(np.float64), cls, CLASSES.base_type[cls]
+
+
+# 3. Benchmarks
+def bench_decode(corpus, imgsz: int, min_time_s: float) -> dict[str, float]:
+    results = {}
+    for image in corpus:
+        results[f"decode.{image.name}.fast_ms"] = time_call(lambda: decode_image(image.data, imgsz), min_time_s)
+        results[f"decode.{image.name}.full_ms"] = time_call(lambda: decode_image(image.data, None), min_time_s)
+    return results
+
+
+def bench_nms(min_time_s: float) -> dict[str, float]:
+    results = {}
+    for n in NMS_BOX_COUNTS:
+        raw = raw_boxes(n)
+        dicts = as_dicts(raw)
+        boxes, conf, _, base_type = array_inputs(raw)
+        results[f"nms.reference.{n}_boxes_ms"] = time_call(
+            lambda: apply_custom_nms(dicts, IOMIN_THRESHOLD), min_time_s)
+        results[f"nms.array.{n}_boxes_ms"] = time_call(
+            lambda: custom_nms_indices(boxes, conf, base_type, IOMIN_THRESHOLD), min_time_s)
+        results[f"postprocess.{n}_boxes_ms"] = time_call(
+            lambda: postprocess(raw, CLASSES, IOMIN_THRESHOLD), min_time_s)
+    return results
+
+
+def bench_aggregate(min_time_s: float) -> dict[str, float]:
+    results = {}
+    for n in AGGREGATE_BOX_COUNTS:
+        raw = raw_boxes(n, seed=n)
+        kept = sorted(as_dicts(raw), key=lambda d: d["conf"], reverse=True)
+        boxes, conf, cls, _ = array_inputs(raw)
+        results[f"aggregate.reference.{n}_boxes_ms"] = time_call(lambda: _aggregate(kept), min_time_s)
+        results[f"aggregate.array.{n}_boxes_ms"] = time_call(
+            lambda: _aggregate_arrays(boxes, conf, cls, CLASSES), min_time_s)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks: decode, custom NMS, aggregation.")
+    parser.add_argument("--images", help="Use the images in this directory instead of the synthetic corpus.")
+    parser.add_argument("--imgsz", type=int, default=640, help="Fast-decode target (Settings.imgsz).")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing round.")
+    parser.add_argument("--only", choices=["decode", "nms", "aggregate"], help="Run one group only.")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.images) if args.images else synthetic_corpus()
+    groups = {
+        "decode": lambda: bench_decode(corpus, args.imgsz, args.min_time),
+        "nms": lambda: bench_nms(args.min_time),
+        "aggregate": lambda: bench_aggregate(args.min_time),
+    }
+
+    metrics = {}
+    for name, run in groups.items():
+        if args.only and name != args.only:
+            continue
+        for metric, ms in run().items():
+            metrics[metric] = round(ms, 4)
+            print(f"{metric:<44} {ms:10.3f} ms")
+
+    config = {"images": args.images or "synthetic", "imgsz": args.imgsz, "only": args.only}
+    return finish("micro", metrics, config, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Stub-model server: the real service with the network replaced by a stand-in.
+
+The stub backend sleeps for a configurable forward-pass time (fixed cost per
+batch plus a cost per image) and returns a deterministic set of boxes sized to
+the input, so decoding, batching, admission, custom NMS, aggregation and
+serialisation all do their real work. It needs no best.pt, torch or
+onnxruntime, so load tests run on any Linux box:
+
+    python -m benchmarks.stub --port 8001 --batch-ms 20 --image-ms 5
+
+The stub replaces ``detector._load_model`` in this process, so the process-pool
+engine is disabled (INFERENCE_REPLICAS=0) and the result cache is off by default
+(RESULT_CACHE_ENTRIES=0), since a load test replays the same images. Both
+can be overridden through the environment like any other setting.
+"""
+
+# 1. Imports
+import argparse
+import os
+import time
+
+import numpy as np
+
+from app.services.postprocess import RawBoxes
+
+# Same class layout as best.pt.
+STUB_NAMES = {
+    0: "crack-high",
+    1: "crack-low",
+    2: "crack-medium",
+    3: "pothole-high",
+    4: "pothole-low",
+    5: "pothole-medium",
+}
+
+
+# 2. Backend
+class StubBackend:
+    """Implements the InferenceBackend protocol without a network."""
+
+    name = "stub"
+    names = STUB_NAMES
+
+    def __init__(self, batch_ms: float = 20.0, image_ms: float = 5.0, boxes: int = 12) -> None:
+        self.batch_s = batch_ms / 1000
+        self.image_s = image_ms / 1000
+        self.boxes = boxes
+        self.timings = {"import": 0.0, "load": 0.0}
+
+    def _raw(self, image: np.ndarray) -> RawBoxes:
+        """A grid of partly overlapping boxes: some same-type (suppressed by the
+        custom NMS), some cross-type (exempted), confidences spread over 0.3–0.95."""
+        height, width = image.shape[:2]
+        i = np.arange(self.boxes)
+        cx = width * (0.2 + 0.6 * ((i * 7) % 10) / 10)
+        cy = height * (0.2 + 0.6 * ((i * 3) % 10) / 10)
+        half = min(width, height) * (0.05 + 0.02 * (i % 4))
+        xyxy = np.stack([cx - half, cy - half, cx + half, cy + half], axis=1).astype(np.float32)
+        conf = (0.3 + 0.65 * ((i * 13) % 17) / 16).astype(np.float32)
+        cls = (i % len(STUB_NAMES)).astype(np.float32)
+        return RawBoxes(xyxy, conf, cls)
+
+    def predict(self, images: list[np.ndarray], conf: float, imgsz: int | None = None) -> list[RawBoxes]:
+        time.sleep(self.batch_s + self.image_s * len(images))
+        out = []
+        for image in images:
+            raw = self._raw(image)
+            keep = raw.conf >= conf
+            out.append(RawBoxes(raw.xyxy[keep], raw.conf[keep], raw.cls[keep]))
+        return out
+
+
+class CrashingStubBackend(StubBackend):
+    """A zero-cost stub whose process dies mid-request on an all-white image,
+    so the process-pool engine's crash handling can be exercised."""
+
+    def predict(self, images: list[np.ndarray], conf: float, imgsz: int | None = None) -> list[RawBoxes]:
+        if any(image.min() == 255 for image in images):
+            os._exit(1)
+        return super().predict(images, conf, imgsz)
+
+
+def load_crashing_stub(settings, threads: int | None = None) -> CrashingStubBackend:
+    """``load_backend`` stand-in for ``InferencePool(loader=...)`` replicas."""
+    return CrashingStubBackend(batch_ms=0.0, image_ms=0.0)
+
+
+# 3. Server
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the AI service with a stub model.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--batch-ms", type=float, default=20.0, help="Simulated cost per forward pass.")
+    parser.add_argument("--image-ms", type=float, default=5.0, help="Simulated cost per image in a pass.")
+    parser.add_argument("--boxes", type=int, default=12, help="Raw boxes returned per image.")
+    args = parser.parse_args()
+
+    # Settings are read lazily, so the environment must be in place before
+    # anything calls get_settings(). Any existing file passes the model check.
+    os.environ.setdefault("MODEL_PATH", __file__)
+    os.environ.setdefault("INFERENCE_BACKEND", "torch")
+    os.environ["INFERENCE_REPLICAS"] = "0"
+    os.environ.setdefault("RESULT_CACHE_ENTRIES", "0")
+
+    import uvicorn
+
+    import app.services.detector as detector
+    from main import app
+
+    backend = StubBackend(args.batch_ms, args.image_ms, args.boxes)
+    detector._load_model = lambda: backend
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
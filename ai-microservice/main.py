@@ -17,19 +17,26 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.core import metrics, versions
 from app.core.config import get_settings
-from app.routers import detect
+from app.routers import admin, detect, stream
 from app.services import detector
 
 # 2. Lifespan — warm the model on startup so the first /detect isn't slow.
+# In the background by default, so uvicorn binds the port (and Cloud Run's
+# startup probe can poll /ready) while the model loads.
 settings = get_settings()
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    detector.warm_up()
+    detector.start_warm_up(background=settings.background_warmup)
     yield
+    detector.shutdown()
 
 
 app = FastAPI(
@@ -52,30 +59,97 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["POST", "GET", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=[versions.VERSION_HEADER],
 )
 
-# 4. Routers
+
+# 4. Model version header — on every response, so clients (and logs) can tell
+# which weights answered. /detect sets it itself from the result, which may
+# come from the previous version while a swap is taking over.
+class ModelVersionHeader:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_version(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                version = detector.model_version()
+                if version and versions.VERSION_HEADER not in headers:
+                    headers[versions.VERSION_HEADER] = version
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
+
+
+app.add_middleware(ModelVersionHeader)
+
+# 5. Routers
 app.include_router(detect.router)
+app.include_router(stream.router)
+app.include_router(admin.router)
 
 
-# 5. Meta endpoints
+# 6. Meta endpoints
 @app.get("/health", tags=["Meta"], summary="Liveness probe")
 def health() -> dict:
-    """Health check that also reports whether the model weights are loadable.
-
-    Actually attempts to load the model (cheap after the first success, since
-    the loader is cached) rather than just checking the weights file exists —
-    a present-but-broken model (e.g. a torch/torchvision mismatch) must show
-    up here, not just report "ok" while every real request 500s.
+    """Liveness: the process is up and serving. Never loads the model itself.
+
+    Readiness is reported separately: `ready` flips to true once the
+    background warm-up (model load + one dummy forward pass) has succeeded, and
+    `startup` carries its state, any load error — a present-but-broken model,
+    e.g. a torch/torchvision mismatch, shows up here as `failed` — and the
+    per-stage timing breakdown. `model_version` names the weights serving new
+    requests (null until loaded); every response also carries it in the
+    `X-Model-Version` header.
     """
     return {
         "status": "ok",
         "service": settings.api_title,
         "version": settings.api_version,
-        "model_available": detector.warm_up(),
+        "ready": detector.is_ready(),
+        "model_version": detector.model_version(),
+        "startup": detector.startup_status(),
+        "inference_pool": detector.pool_status(),
+        "inference_queue": detector.queue_stats(),
+        "result_cache": detector.cache_stats(),
+        "duplicate_index": detector.dedup_stats(),
     }
 
 
+@app.get("/ready", tags=["Meta"], summary="Readiness probe")
+def ready() -> JSONResponse:
+    """200 once the model is loaded and warm, 503 until then (or if it failed).
+    Point the Cloud Run startup probe here."""
+    return JSONResponse(
+        status_code=200 if detector.is_ready() else 503,
+        content={
+            "ready": detector.is_ready(),
+            "model_version": detector.model_version(),
+            "startup": detector.startup_status(),
+        },
+    )
+
+
+@app.get("/metrics", tags=["Meta"], summary="Prometheus metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    """Per-stage latency histograms, request latency by status, batch sizes,
+    model startup time, and in-flight / queued request gauges."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/", include_in_schema=False)
 def root() -> dict:
-    return {"docs": "/docs", "health": "/health", "detect": "POST /detect"}
+    return {
+        "docs": "/docs",
+        "health": "/health",
+        "ready": "/ready",
+        "metrics": "/metrics",
+        "detect": "POST /detect",
+        "stream": "WS /stream",
+        "admin": "GET|POST /admin/model",
+    }
@@ -0,0 +1,141 @@
+"""Pre-fork server — load the model once, then fork the HTTP workers.
+
+``uvicorn --workers N`` starts N fresh interpreters, and each one loads its own
+copy of best.pt. This entry point loads the startup model version in the parent
+process instead. Loading fuses Conv+BN, which runs torch ops, so the parent is
+pinned to one intra-op thread first: no OpenMP worker threads exist at fork
+time, and each worker sets its own thread count. The model is not run in the
+parent. It then calls ``gc.freeze()`` so later collections leave those objects'
+pages alone, binds the listening socket and forks the workers. Each worker
+inherits the weights copy-on-write, warms up, and serves on the shared socket;
+the kernel spreads connections across the workers.
+
+The parent only supervises. A worker that dies is forked again, and SIGTERM
+(what Cloud Run sends) is forwarded to every worker for a graceful shutdown.
+
+Run:  python serve.py --workers 4          (also reads PORT and WEB_CONCURRENCY)
+
+Notes:
+* Only the torch backend shares weights. onnxruntime sessions do not survive a
+  fork, so with INFERENCE_BACKEND=onnx every worker loads its own session.
+* INFERENCE_REPLICAS must be 0; each worker already is a process.
+* POST /admin/model reaches one worker. That worker rewrites MODEL_DIR/CURRENT,
+  and the others follow within MODEL_WATCH_INTERVAL_S. A swapped-in version is
+  loaded per worker, so it is only shared again after a restart.
+"""
+
+# 1. Imports
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from app.core.config import get_settings
+from app.services import detector
+from main import app
+
+logger = logging.getLogger("serve")
+
+# A worker that dies sooner than this after being forked is re-forked only
+# after the same delay, so a broken configuration does not fork in a tight loop.
+_RESTART_BACKOFF_S = 5.0
+
+
+# 2. Worker
+def _run_worker(sock: socket.socket, threads: int) -> None:
+    """Body of a forked worker: size the runtime's thread pool, then serve."""
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)  # uvicorn installs its own
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="on", log_level="info"))
+    server.run(sockets=[sock])
+
+
+def _fork_worker(sock: socket.socket, threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, threads)
+        except BaseException:  # noqa: BLE001 — never return into the parent's loop
+            logger.exception("Worker %d failed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info("Forked worker %d", pid)
+    return pid
+
+
+# 3. Parent
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-fork server: one model load, shared by N workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--threads", type=int, default=0,
+                        help="Intra-op threads per worker (default: CPU count / workers).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     [%(name)s] %(message)s")
+
+    settings = get_settings()
+    if settings.inference_replicas > 0:
+        sys.exit("serve.py forks its own worker processes; set INFERENCE_REPLICAS=0.")
+    workers = max(1, args.workers)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+
+    if settings.inference_backend == "torch" and settings.model_exists:
+        import torch  # what preload() imports anyway
+
+        # fuse() runs on one thread, so no intra-op pool is inherited by the workers.
+        torch.set_num_threads(1)
+        started = time.perf_counter()
+        detector.preload()
+        logger.info("Model loaded in the parent in %.0f ms", (time.perf_counter() - started) * 1000)
+    gc.collect()
+    gc.freeze()  # keep the inherited heap's pages shared with the workers
+
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    sock.set_inheritable(True)
+    logger.info("Listening on %s:%d with %d workers x %d threads", args.host, args.port, workers, threads)
+
+    children: dict[int, float] = {}  # pid -> when it was forked
+    stopping = False
+
+    def stop(signum: int, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        if signum == signal.SIGTERM:  # Ctrl-C already reached the whole process group
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        children[_fork_worker(sock, threads)] = time.monotonic()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        forked_at = children.pop(pid, None)
+        if forked_at is None or stopping:
+            continue
+        logger.warning("Worker %d exited (status %d); forking a replacement", pid, status)
+        if time.monotonic() - forked_at < _RESTART_BACKOFF_S:
+            time.sleep(_RESTART_BACKOFF_S)
+        if not stopping:
+            children[_fork_worker(sock, threads)] = time.monotonic()
+    logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,807 @@
+"""Offline smoke test — no best.pt or torch needed. Exercises the upload decoder
+and the post-processing path on synthetic model output, and proves the
+vectorised NMS/aggregation is box-for-box identical to the reference port of
+the FYP evaluation script.
+Run:  .venv/Scripts/python.exe smoke_test.py
+"""
+import io
+import os
+import threading
+import time
+
+# Any existing file satisfies the "model present" check; inference is faked below.
+os.environ.setdefault("MODEL_PATH", __file__)
+os.environ.setdefault("MAX_UPLOAD_BYTES", str(64 * 1024))
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app.services.detector as detector
+from app.models.schemas import DetectionResult
+from app.services.cache import ResultCache
+from app.services.postprocess import (
+    RawBoxes,
+    _aggregate,
+    apply_custom_nms,
+    build_class_table,
+    compute_iomin,
+    custom_nms_indices,
+    iomin_matrix,
+    postprocess,
+)
+from app.services.preprocess import decode_image, to_original
+
+# Same class layout as best.pt, plus one malformed label the service must skip.
+NAMES = {
+    0: "crack-high",
+    1: "crack-low",
+    2: "crack-medium",
+    3: "pothole-high",
+    4: "pothole-low",
+    5: "pothole-medium",
+    6: "manhole",
+}
+CLASSES = build_class_table(NAMES)
+
+failures = []
+
+
+def check(name, cond):
+    print(("PASS" if cond else "FAIL"), "-", name)
+    if not cond:
+        failures.append(name)
+
+
+def reference(raw, iomin_threshold):
+    """The pre-vectorisation per-box dict path, kept as the oracle."""
+    dicts = []
+    for (x1, y1, x2, y2), conf, cls in zip(raw.xyxy, raw.conf, raw.cls):
+        label = NAMES[int(cls)]
+        if "-" not in label:
+            continue
+        dicts.append(
+            {
+                "x1": int(x1), "y1": int(y1), "x2": int(x2), "y2": int(y2),
+                "conf": float(conf), "label": label,
+            }
+        )
+    return _aggregate(apply_custom_nms(dicts, iomin_threshold))
+
+
+def random_raw(rng, n, grid):
+    """Synthetic float32 model output. A coarse `grid` forces ties, nesting and
+    exact-threshold overlaps; a fine one mimics real sub-pixel boxes."""
+    xy = rng.uniform(0, 640, size=(n, 2))
+    wh = rng.uniform(1, 300, size=(n, 2))
+    xyxy = np.concatenate([xy, xy + wh], axis=1)
+    conf = rng.uniform(0.25, 1.0, size=n)
+    if grid:
+        xyxy = np.round(xyxy / grid) * grid
+        conf = np.round(conf, 1)
+    return RawBoxes(
+        xyxy=xyxy.astype(np.float32),
+        conf=conf.astype(np.float32),
+        cls=rng.integers(0, len(NAMES), size=n).astype(np.float32),
+    )
+
+
+# 1. IoMin matrix matches the scalar reference pair-for-pair
+rng = np.random.default_rng(0)
+boxes = random_raw(rng, 40, grid=16).xyxy.astype(np.int64)
+matrix = iomin_matrix(boxes)
+check(
+    "iomin matrix == compute_iomin",
+    all(
+        matrix[i, j] == compute_iomin(boxes[i].tolist(), boxes[j].tolist())
+        for i in range(len(boxes))
+        for j in range(len(boxes))
+    ),
+)
+
+# 2. Randomised equivalence: identical DetectionResult for every case
+mismatches = 0
+cases = 0
+for seed in range(300):
+    rng = np.random.default_rng(seed)
+    n = int(rng.choice([0, 1, 2, 5, 20, 80, 300]))
+    raw = random_raw(rng, n, grid=rng.choice([0, 8, 32]))
+    for threshold in (0.0, 0.3, 0.45, 0.9):
+        cases += 1
+        if postprocess(raw, CLASSES, threshold) != reference(raw, threshold):
+            mismatches += 1
+check(f"vectorised == reference over {cases} cases", mismatches == 0)
+
+# 3. Exemption rule: a pothole inside a crack survives; a duplicate pothole does not
+raw = RawBoxes(
+    xyxy=np.array(
+        [[0, 0, 400, 400], [100, 100, 200, 200], [105, 105, 195, 195]], dtype=np.float32
+    ),
+    conf=np.array([0.9, 0.8, 0.7], dtype=np.float32),
+    cls=np.array([0, 3, 5], dtype=np.float32),
+)
+result = postprocess(raw, CLASSES, 0.45)
+check("cross-type overlap kept", result.defect_types == ["crack", "pothole"])
+check("same-type duplicate removed", result.detection_count == 2)
+_, exemptions = custom_nms_indices(
+    raw.xyxy.astype(np.int64), raw.conf.astype(np.float64), CLASSES.base_type[[0, 3, 5]], 0.45
+)
+check("exemptions counted once per surviving pair", exemptions == 2)
+
+# 4. Malformed labels are skipped, empty output is "no hazard"
+raw = RawBoxes(
+    xyxy=np.array([[0, 0, 50, 50]], dtype=np.float32),
+    conf=np.array([0.99], dtype=np.float32),
+    cls=np.array([6], dtype=np.float32),
+)
+check("label without hyphen skipped", postprocess(raw, CLASSES, 0.45).detected is False)
+empty = RawBoxes(np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.float32))
+check("empty output -> detected false", postprocess(empty, CLASSES, 0.45).detected is False)
+
+# 5. Fast decode: EXIF-rotated phone JPEG comes back ready-sized, boxes map to original pixels
+exif = Image.Exif()
+exif[0x0112] = 6  # rotate 90° CW: a 4000x3000 sensor image is viewed as 3000x4000
+buf = io.BytesIO()
+Image.new("RGB", (4000, 3000), (90, 90, 90)).save(buf, "JPEG", exif=exif)
+decoded = decode_image(buf.getvalue(), 640)
+check("jpeg decoded to model size, upright", decoded.array.shape == (640, 480, 3))
+mapped = to_original(
+    RawBoxes(np.array([[0, 0, 480, 640]], np.float32), np.ones(1, np.float32), np.zeros(1, np.float32)),
+    decoded,
+)
+check("boxes mapped back to original pixels", mapped.xyxy.tolist() == [[0, 0, 3000, 4000]])
+buf = io.BytesIO()
+Image.new("RGBA", (320, 200)).save(buf, "PNG")
+decoded = decode_image(buf.getvalue(), 640)
+check("small png kept at native size as RGB", decoded.array.shape == (200, 320, 3) and decoded.scale_x == 1)
+
+# 6. Result cache: LRU bound, TTL, single-flight, failures not cached
+cache = ResultCache(max_entries=2, max_bytes=1 << 20, ttl_s=60)
+made = []
+
+
+def compute(tag):
+    made.append(tag)
+    return DetectionResult(detected=False, message=tag)
+
+
+for key in ("a", "b", "a", "c", "b"):
+    cache.get_or_compute(key, lambda key=key: compute(key))
+check("lru evicts least recently used", made == ["a", "b", "c", "b"])
+
+gate = threading.Event()
+calls = []
+
+
+def slow():
+    calls.append(1)
+    gate.wait(5)
+    return DetectionResult(detected=False, message="slow")
+
+
+cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl_s=60)
+threads = [threading.Thread(target=cache.get_or_compute, args=("same", slow)) for _ in range(5)]
+for t in threads:
+    t.start()
+time.sleep(0.2)
+gate.set()
+for t in threads:
+    t.join()
+stats = cache.stats()
+check("concurrent identical requests share one computation", calls == [1] and stats["coalesced"] == 4)
+
+
+def boom():
+    raise ValueError("bad image")
+
+
+try:
+    cache.get_or_compute("bad", boom)
+except ValueError:
+    pass
+check("failures are not cached", cache.stats()["entries"] == 1)
+
+cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl_s=0)
+cache.get_or_compute("k", lambda: compute("ttl"))
+cache.get_or_compute("k", lambda: compute("ttl"))
+check("expired entries recomputed", made.count("ttl") == 2)
+
+# 7. /detect ingestion: multipart and raw bodies, early 413/415 rejection
+analyzed = []
+
+
+def fake_analyze(data, location=None):
+    analyzed.append(len(data))
+    return DetectionResult(detected=False, message="fake")
+
+
+real_analyze_image = detector.analyze_image
+detector.analyze_image = fake_analyze
+
+from main import app  # import after patching
+
+client = TestClient(app)
+buf = io.BytesIO()
+Image.new("RGB", (64, 48)).save(buf, "JPEG")
+jpeg = buf.getvalue()
+
+r = client.post("/detect", files={"image": ("a.jpg", jpeg, "image/jpeg")})
+check("multipart upload accepted", r.status_code == 200 and analyzed[-1] == len(jpeg))
+r = client.post("/detect", content=jpeg, headers={"Content-Type": "application/octet-stream"})
+check("raw octet-stream body accepted", r.status_code == 200 and analyzed[-1] == len(jpeg))
+r = client.post("/detect", files={"image": ("a.gif", b"GIF89a", "image/gif")})
+check("415 on unsupported part type", r.status_code == 415)
+r = client.post("/detect", content=b"x", headers={"Content-Type": "text/plain"})
+check("415 on unsupported body type", r.status_code == 415)
+r = client.post("/detect", content=b"", headers={"Content-Type": "image/jpeg"})
+check("400 on empty body", r.status_code == 400)
+
+big = b"\xff" * (200 * 1024)
+r = client.post("/detect", content=big, headers={"Content-Type": "image/jpeg"})
+check("413 from Content-Length before reading", r.status_code == 413)
+def chunked():
+    for _ in range(50):
+        yield b"\xff" * 8192
+
+
+calls_before = len(analyzed)
+r = client.post("/detect", content=chunked(), headers={"Content-Type": "image/jpeg"})
+check("413 mid-stream without Content-Length", r.status_code == 413 and len(analyzed) == calls_before)
+r = client.post("/detect", files={"image": ("big.jpg", big, "image/jpeg")})
+check("413 on oversized multipart upload", r.status_code == 413)
+check("openapi documents both body modes", len(app.openapi()["paths"]["/detect"]["post"]["requestBody"]["content"]) == 2)
+
+# 8. /detect/batch: order preserved, failures confined to their own item
+batched = []
+
+
+def fake_batch(images):
+    out = []
+    for data in images:
+        batched.append(len(data))
+        out.append(ValueError("Could not decode image.") if data == b"junk" else fake_analyze(data))
+    return out
+
+
+real_analyze_batch = detector.analyze_batch
+detector.analyze_batch = fake_batch
+r = client.post(
+    "/detect/batch",
+    files=[
+        ("images", ("a.jpg", jpeg, "image/jpeg")),
+        ("images", ("b.gif", b"GIF89a", "image/gif")),
+        ("images", ("c.jpg", b"junk", "image/jpeg")),
+        ("images", ("d.jpg", big, "image/jpeg")),
+        ("images", ("e.jpg", jpeg, "image/jpeg")),
+    ],
+)
+body = r.json()
+check("batch returns one item per image, in order",
+      r.status_code == 200 and [i["filename"] for i in body["items"]] == ["a.jpg", "b.gif", "c.jpg", "d.jpg", "e.jpg"])
+check("batch per-item errors", [i["error"] is None for i in body["items"]] == [True, False, False, False, True]
+      and body["succeeded"] == 2 and body["failed"] == 3)
+check("only valid images reach the model", batched == [len(jpeg), 4, len(jpeg)])
+r = client.post("/detect/batch", files={"image": ("a.jpg", jpeg, "image/jpeg")})
+check("422 when no 'images' parts", r.status_code == 422)
+os.environ["BATCH_MAX_UPLOAD_BYTES"] = str(100 * 1024)
+detector.get_settings.cache_clear()
+r = client.post("/detect/batch", files=[("images", (f"{i}.jpg", big, "image/jpeg")) for i in range(3)])
+check("413 when the whole batch exceeds its budget", r.status_code == 413)
+
+# 9. Admission control: bounded queue, 503 + Retry-After, queued work cancellable
+import asyncio
+
+from fastapi import HTTPException, Request
+
+from app.routers.detect import run_admitted
+from app.services.admission import InferenceExecutor, Overloaded
+
+release = threading.Event()
+executor = InferenceExecutor(workers=1, max_queue=1)
+running = executor.submit(release.wait, 5)
+queued = executor.submit(lambda: analyzed.append("queued ran"))
+try:
+    executor.submit(print)
+    check("submit past the queue cap is rejected", False)
+except Overloaded:
+    check("submit past the queue cap is rejected", executor.stats()["rejected"] == 1)
+check("queued work can be cancelled", queued.cancel() and executor.stats()["cancelled"] == 1)
+release.set()
+running.result()
+check("cancelled work never runs", "queued ran" not in analyzed and executor.stats()["queued"] == 0)
+
+os.environ.update(INFERENCE_WORKERS="1", INFERENCE_QUEUE_DEPTH="0", OVERLOAD_RETRY_AFTER_S="3")
+detector.get_settings.cache_clear()
+detector._executor.cache_clear()
+release.clear()
+blocker = detector.submit(release.wait, 5)
+r = client.post("/detect", content=jpeg, headers={"Content-Type": "image/jpeg"})
+check("503 + Retry-After when the queue is full", r.status_code == 503 and r.headers.get("retry-after") == "3")
+check("health reports the queue", client.get("/health").json()["inference_queue"]["running"] == 1)
+
+os.environ["INFERENCE_QUEUE_DEPTH"] = "1"
+detector.get_settings.cache_clear()
+detector._executor.cache_clear()
+blocker = detector.submit(release.wait, 5)
+
+
+async def gone():
+    return {"type": "http.disconnect"}
+
+
+async def call_after_disconnect():
+    try:
+        await run_admitted(Request({"type": "http"}, gone), fake_analyze, b"never")
+    except HTTPException as exc:
+        return exc.status_code
+
+
+calls_before = len(analyzed)
+check("disconnected client's queued call is cancelled", asyncio.run(call_after_disconnect()) == 499)
+release.set()
+blocker.result()
+time.sleep(0.1)
+check("cancelled call never reaches the model", len(analyzed) == calls_before)
+
+# 10. Startup: /health stays cheap, /ready gates on a timed background warm-up
+check("/ready is 503 before warm-up", client.get("/ready").status_code == 503)
+check("/health never loads the model", client.get("/health").json()["startup"]["state"] == "starting")
+
+
+class FakeBackend:
+    name = "fake"
+    names = NAMES
+    timings = {"import": 0.5, "load": 0.25, "fuse": 0.125}
+    seen = []
+
+    def predict(self, images, conf, imgsz=None):
+        self.seen.append(images[0].shape)
+        return [empty for _ in images]
+
+
+detector._load_model = FakeBackend
+detector.start_warm_up(background=True)
+for _ in range(50):
+    if detector.is_ready():
+        break
+    time.sleep(0.05)
+startup = client.get("/ready").json()["startup"]
+check("/ready is 200 after background warm-up", client.get("/ready").status_code == 200)
+check("startup timing breakdown reported",
+      list(startup["timings_ms"]) == ["import", "load", "fuse", "first_inference"]
+      and startup["timings_ms"]["import"] == 500.0)
+check("dummy forward pass at imgsz", FakeBackend.seen == [(640, 640, 3)])
+
+# 11. Metrics: stage histograms on /metrics, optional Server-Timing header
+os.environ["SERVER_TIMING"] = "true"
+detector.get_settings.cache_clear()
+detector.analyze_image = real_analyze_image
+r = client.post("/detect", content=jpeg, headers={"Content-Type": "image/jpeg"})
+stages = [part.split(";")[0] for part in r.headers.get("server-timing", "").split(", ")]
+check("detect still works through the real pipeline", r.status_code == 200 and r.json()["detected"] is False)
+check("Server-Timing breaks the request down by stage",
+      {"upload_read", "queue_wait", "decode", "infer", "nms", "aggregate", "serialize", "total"} <= set(stages))
+text = client.get("/metrics").text
+check("/metrics exposes stage histograms", 'jalanguard_ai_stage_seconds_bucket{stage="forward",le="+Inf"}' in text)
+check("/metrics exposes request latency by status",
+      'jalanguard_ai_request_seconds_count{endpoint="detect",status="503"} 1' in text)
+check("/metrics exposes readiness and queue gauges",
+      "jalanguard_ai_model_ready 1" in text and 'jalanguard_ai_inference_executor_requests{state="queued"} 0' in text)
+
+# 12. Cascade: low-res pass answers the clear cases, ambiguous ones escalate
+class CascadeBackend(FakeBackend):
+    passes = []
+
+    def predict(self, images, conf, imgsz=None):
+        self.passes.append((imgsz, len(images)))
+        out = []
+        for image in images:
+            level = int(image[0, 0, 0])  # dark = empty road, grey = unsure, bright = pothole
+            score = 0.0 if level < 64 else (0.4 if level < 192 else 0.9)
+            if imgsz is None:
+                score = 0.8 if level >= 64 else 0.0
+            if score < conf:
+                out.append(empty)
+            else:
+                out.append(RawBoxes(np.array([[4, 4, 40, 40]], np.float32),
+                                    np.array([score], np.float32), np.array([3], np.float32)))
+        return out
+
+
+def solid(level):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (level, level, level)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+os.environ["CASCADE_ENABLED"] = "true"
+detector.get_settings.cache_clear()
+detector._load_model = CascadeBackend
+results = real_analyze_batch([solid(10), solid(128), solid(250)])
+check("cascade records the path taken",
+      [r.inference_path for r in results] == ["low_res_empty", "full_res", "low_res_positive"])
+check("cascade outcomes", [r.detected for r in results] == [False, True, True]
+      and results[1].confidence == 0.8)
+check("low-res pass batched, only the ambiguous image escalated", CascadeBackend.passes == [(320, 3), (None, 1)])
+os.environ["CASCADE_ACCEPT_CONF"] = "0.2"
+detector.get_settings.cache_clear()
+try:
+    detector.get_settings()
+    check("inconsistent cascade thresholds rejected", False)
+except ValueError:
+    check("inconsistent cascade thresholds rejected", True)
+del os.environ["CASCADE_ACCEPT_CONF"], os.environ["CASCADE_ENABLED"]
+detector.get_settings.cache_clear()
+
+# 13. /stream: near-duplicate frames skipped, one hazard merged across frames
+class StreamBackend(FakeBackend):
+    def predict(self, images, conf, imgsz=None):
+        return [RawBoxes(np.array([[4, 4, 40, 40]], np.float32), np.array([0.8], np.float32),
+                         np.array([3], np.float32)) if image[0, 0, 0] >= 64 else empty for image in images]
+
+
+os.environ["STREAM_TRACK_MAX_GAP"] = "1"
+detector.get_settings.cache_clear()
+detector._load_model = StreamBackend
+with client.websocket_connect("/stream") as ws:
+    for frame in [solid(250), solid(250), solid(230), solid(10), solid(40), b"not an image"]:
+        ws.send_bytes(frame)
+    ws.send_text("end")
+    events = []
+    while not events or events[-1]["event"] != "summary":
+        events.append(ws.receive_json())
+frames = [e for e in events if e["event"] == "frame"]
+hazards = [e["hazard"] for e in events if e["event"] == "hazard"]
+check("one event per frame, in order", [e["frame"] for e in frames] == [0, 1, 2, 3, 4, 5])
+check("near-duplicate frame skipped",
+      [e["status"] for e in frames] == ["processed", "skipped", "processed", "processed", "processed", "failed"]
+      and frames[1]["duplicate_of"] == 0)
+check("frames carry DetectionResult and track ids",
+      frames[0]["result"]["primary_type"] == "pothole" and frames[0]["track_ids"] == frames[2]["track_ids"] == [1])
+check("hazard merged across frames and ended after the gap",
+      len(hazards) == 1 and hazards[0]["first_frame"] == 0 and hazards[0]["last_frame"] == 2
+      and hazards[0]["frames"] == 2 and events[events.index(frames[4]) + 1]["event"] == "hazard")
+check("summary counts", events[-1] == {"event": "summary", "frames": 6, "processed": 4, "skipped": 1,
+                                         "failed": 1, "hazards": 1})
+
+from app.services.stream import StreamSession
+
+real_analyze_decoded = detector.analyze_decoded
+failing = [True]
+
+
+def flaky_decoded(images):
+    if failing:  # the first forward pass fails every image in it
+        failing.clear()
+        return [RuntimeError("forward pass failed") for _ in images]
+    return real_analyze_decoded(images)
+
+
+def statuses(events):
+    return [(e.status, e.duplicate_of) for e in events if e.event == "frame"]
+
+
+detector.analyze_decoded = flaky_decoded
+session = StreamSession(detector.get_settings())
+check("near-duplicate of a failed frame in the same batch is inferred, not skipped",
+      statuses(session.process([(0, solid(250)), (1, solid(250))])) == [("failed", None), ("processed", None)]
+      and statuses(session.process([(2, solid(250))])) == [("skipped", 1)])
+failing.append(True)
+session = StreamSession(detector.get_settings())
+session.process([(0, solid(250))])
+check("a failed frame is not remembered as a duplicate source",
+      statuses(session.process([(1, solid(250))])) == [("processed", None)])
+detector.analyze_decoded = real_analyze_decoded
+del os.environ["STREAM_TRACK_MAX_GAP"]
+detector.get_settings.cache_clear()
+
+# 14. Near-duplicate short-circuit (perceptual hash, optional location scope)
+def scene(freq, quality, level=160):
+    y, x = np.mgrid[0:240, 0:320]
+    pixels = level + 60 * np.sin(x / freq) * np.cos(y / (freq * 1.3))
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert("RGB").save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def post(data, query=""):
+    return client.post(f"/detect{query}", content=data, headers={"Content-Type": "image/jpeg"})
+
+
+detector._duplicate_index.cache_clear()
+first, again, recoded, other = post(scene(20, 90)), post(scene(20, 90)), post(scene(20, 60)), post(scene(9, 90))
+check("first upload is not a duplicate", first.json()["detected"] and not first.json()["probable_duplicate"])
+check("re-sent identical bytes are a retry, not a duplicate", again.json() == first.json())
+check("re-encoded photo flagged as probable duplicate with the earlier result",
+      recoded.json()["probable_duplicate"] and recoded.json()["duplicate_distance"] <= 8
+      and recoded.json()["detections"] == first.json()["detections"])
+check("different scene is not a duplicate", not other.json()["probable_duplicate"])
+post(scene(20, 90, level=30))  # no hazard detected: not indexed
+check("only validated hazards are indexed", client.get("/health").json()["duplicate_index"]["entries"] == 2)
+
+detector._duplicate_index.cache_clear()
+post(scene(14, 90), "?lat=3.1390&lon=101.6869")
+far = post(scene(14, 60), "?lat=5.4141&lon=100.3288")
+near = post(scene(14, 70), "?lat=3.1395&lon=101.6861")
+check("duplicates scoped by coarse location", not far.json()["probable_duplicate"] and near.json()["probable_duplicate"])
+check("a location-less upload never matches a located one",
+      not post(scene(14, 80)).json()["probable_duplicate"]
+      and post(scene(20, 90)).json()["detected"]
+      and not post(scene(20, 60), "?lat=3.1390&lon=101.6869").json()["probable_duplicate"]
+      and post(scene(20, 70)).json()["probable_duplicate"])
+check("bad location rejected",
+      post(scene(14, 90), "?lat=91&lon=0").status_code == 422 and post(scene(14, 90), "?lat=3.1").status_code == 422)
+
+# 15. Versioned models: atomic hot swap, in-flight requests finish on the old version
+import functools
+import tempfile
+from pathlib import Path
+
+
+class VersionBackend(FakeBackend):
+    hold = threading.Event()  # set: v1 passes wait for `gate`
+    gate = threading.Event()
+    entered = threading.Event()
+
+    def __init__(self, version="v1"):
+        self.version = version
+
+    def predict(self, images, conf, imgsz=None):
+        if self.version == "v1" and self.hold.is_set():
+            self.entered.set()
+            self.gate.wait(5)
+        score = 0.5 if self.version == "v1" else 0.9
+        return [RawBoxes(np.array([[4, 4, 40, 40]], np.float32), np.array([score], np.float32),
+                         np.array([3], np.float32)) for _ in images]
+
+
+model_dir = tempfile.mkdtemp()
+for version in ("v1", "v2"):
+    os.makedirs(f"{model_dir}/{version}")
+    Path(f"{model_dir}/{version}/{Path(__file__).name}").write_bytes(b"weights " + version.encode())
+os.environ.update(MODEL_DIR=model_dir, ADMIN_TOKEN="s3cret", MODEL_WATCH_INTERVAL_S="0", DEDUP_ENTRIES="0")
+detector.get_settings.cache_clear()
+detector._duplicate_index.cache_clear()
+detector._load_model = functools.lru_cache(VersionBackend)
+detector.load_backend = lambda settings, threads=None: VersionBackend(Path(settings.active_model_path).parent.name)
+detector._startup.update(state="starting")
+detector.warm_up()
+check("newest version served when CURRENT is absent", client.get("/health").json()["model_version"] == "v2")
+os.environ["MODEL_VERSION"] = "v1"
+detector.get_settings.cache_clear()
+detector._startup.update(state="starting")
+detector.warm_up()
+check("every response carries the model version", client.get("/health").headers["x-model-version"] == "v1")
+
+
+def swap(version, token="s3cret"):
+    return client.post("/admin/model", json={"version": version}, headers={"X-Admin-Token": token})
+
+
+check("swap needs the admin token", swap("v2", token="nope").status_code == 401)
+check("unknown version is 404", swap("v9").status_code == 404)
+VersionBackend.hold.set()
+detector._RETIRE_WARN_S = 0.1
+in_flight = {}
+worker = threading.Thread(target=lambda: in_flight.update(r=post(scene(11, 90))))
+worker.start()
+VersionBackend.entered.wait(5)
+swapped = swap("v2")
+check("swap loads the new version while the old one is busy",
+      swapped.status_code == 200 and swapped.json()["previous_version"] == "v1"
+      and swapped.json()["model_version"] == "v2")
+time.sleep(0.2)
+check("a busy old version is never force-released", detector._load_model.cache_info().currsize == 1)
+fresh = post(scene(12, 90))
+check("new requests get the new version",
+      fresh.json()["model_version"] == "v2" and fresh.headers["x-model-version"] == "v2"
+      and fresh.json()["confidence"] == 0.9)
+VersionBackend.gate.set()
+worker.join(5)
+check("in-flight request finishes on the old version",
+      in_flight["r"].json()["model_version"] == "v1" and in_flight["r"].headers["x-model-version"] == "v1"
+      and in_flight["r"].json()["confidence"] == 0.5)
+detector._RETIRE_WARN_S = 600.0
+time.sleep(0.2)
+check("old version released once drained", detector._load_model.cache_info().currsize == 0)
+check("CURRENT points at the new version", Path(model_dir, "CURRENT").read_text().strip() == "v2")
+check("admin listing", client.get("/admin/model", headers={"X-Admin-Token": "s3cret"}).json()
+      == {"model_version": "v2", "available": ["v1", "v2"]})
+del os.environ["ADMIN_TOKEN"]
+detector.get_settings.cache_clear()
+check("admin endpoints hidden without a token", swap("v1").status_code == 404)
+for name in ("MODEL_DIR", "MODEL_VERSION", "MODEL_WATCH_INTERVAL_S", "DEDUP_ENTRIES"):
+    del os.environ[name]
+detector.get_settings.cache_clear()
+
+# 16. Process-pool engine: shared-memory dispatch, crash → 503 and restart, bounded waits
+import sys
+
+from app.core.config import Settings
+from app.services.engine import InferencePool, ReplicaCrashed
+from benchmarks.stub import StubBackend, load_crashing_stub
+
+# Spawned replicas re-run __main__ from its path unless it has none.
+main_file = sys.modules["__main__"].__dict__.pop("__file__", None)
+pool = InferencePool(Settings(inference_replicas=2, replica_timeout_s=5), loader=load_crashing_stub)
+reference_stub = StubBackend(batch_ms=0.0, image_ms=0.0)
+small = np.full((48, 64, 3), 90, np.uint8)
+large = np.full((480, 640, 3), 90, np.uint8)
+
+
+def same_boxes(raw, image):
+    expected = reference_stub.predict([image], pool._conf)[0]
+    return np.array_equal(raw.xyxy, expected.xyxy) and np.array_equal(raw.conf, expected.conf)
+
+
+check("pool reports the replicas' class names", pool.names == reference_stub.names)
+check("images reach a replica through shared memory, segment grown on demand",
+      same_boxes(pool.predict(small), small) and same_boxes(pool.predict(large), large)
+      and same_boxes(pool.predict(small), small))
+threads = [threading.Thread(target=lambda: analyzed.append(same_boxes(pool.predict(large), large)))
+           for _ in range(8)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+check("concurrent requests dispatched across replicas", analyzed[-8:] == [True] * 8)
+try:
+    pool.predict(np.full((48, 64, 3), 255, np.uint8))
+    check("a crashed replica fails its request", False)
+except ReplicaCrashed:
+    check("a crashed replica fails its request", True)
+for _ in range(100):
+    if pool.status()["idle"] == 2:
+        break
+    time.sleep(0.1)
+check("crashed replica restarted and back in the pool",
+      pool.status() == {"replicas": 2, "alive": 2, "idle": 2, "restarts": 1} and same_boxes(pool.predict(small), small))
+held = [pool._idle.get(), pool._idle.get()]  # every replica busy or restarting
+pool._timeout = 0.3
+started = time.perf_counter()
+try:
+    pool.predict(small)
+    check("no idle replica within the timeout → ReplicaCrashed", False)
+except ReplicaCrashed:
+    check("no idle replica within the timeout → ReplicaCrashed", time.perf_counter() - started < 2)
+for replica in held:
+    pool._idle.put(replica)
+pool.close()
+try:
+    pool.predict(small)
+    check("predict after close fails instead of hanging", False)
+except ReplicaCrashed:
+    check("predict after close fails instead of hanging", pool.status()["alive"] == 0)
+if main_file is not None:
+    sys.modules["__main__"].__file__ = main_file
+
+detector.analyze_image = lambda data, location=None: (_ for _ in ()).throw(ReplicaCrashed("replica 0 exited"))
+r = post(jpeg)
+check("replica crash → 503 with Retry-After", r.status_code == 503 and r.headers.get("retry-after") == "3")
+detector.analyze_image = real_analyze_image
+
+# 17. A model that fails to load answers JSON errors on both detection endpoints
+def broken_model():
+    raise OSError("weights unreadable")
+
+
+detector._load_model = broken_model
+detector.analyze_batch = real_analyze_batch
+detector._startup.update(state="starting")
+single = post(jpeg)
+batch = client.post("/detect/batch", files=[("images", ("a.jpg", jpeg, "image/jpeg"))])
+check("failed warm-up → JSON 500 from /detect and /detect/batch",
+      single.status_code == batch.status_code == 500
+      and batch.json()["detail"] == single.json()["detail"] == "Detection failed while processing the image.")
+
+# 18. Micro-batcher: concurrent submits grouped, lone jobs flushed, failures contained
+from app.services.scheduler import MicroBatcher
+
+passes = []
+entered, proceed = threading.Event(), threading.Event()
+
+
+def run_batch(images, key):
+    passes.append(list(images))
+    if images == ["blocker"]:
+        entered.set()
+        proceed.wait(5)
+    if "bad" in images:
+        raise RuntimeError("forward pass failed")
+    return [image.upper() for image in images]
+
+
+batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_s=0.2)
+blocker = batcher.submit("blocker")
+entered.wait(5)  # the worker is busy, so the next submits queue up together
+futures = [batcher.submit(f"img{i}") for i in range(6)]
+proceed.set()
+check("concurrent submits grouped up to batch_max_size",
+      [f.result(5) for f in futures] == [f"IMG{i}" for i in range(6)]
+      and passes[1:] == [["img0", "img1", "img2", "img3"], ["img4", "img5"]])
+
+started = time.perf_counter()
+lone = batcher.submit("lone").result(5)
+waited = time.perf_counter() - started
+check("a lone request is flushed after batch_max_wait_ms",
+      lone == "LONE" and passes[-1] == ["lone"] and 0.15 <= waited < 1.0)
+
+passes.clear()
+entered.clear()
+proceed.clear()
+blocker = batcher.submit("blocker")
+entered.wait(5)
+failed_batch = [batcher.submit(image) for image in ("a", "bad", "c", "d")]
+next_batch = [batcher.submit(image) for image in ("e", "f")]
+proceed.set()
+errors = [f.exception(5) for f in failed_batch]
+check("an exception fails only its own batch's futures",
+      all(isinstance(e, RuntimeError) for e in errors)
+      and [f.result(5) for f in next_batch] == ["E", "F"] and blocker.result(5) == "BLOCKER"
+      and passes[1:] == [["a", "bad", "c", "d"], ["e", "f"]])
+
+# 19. Backend parity: best.pt through torch vs best.onnx through onnxruntime
+here = Path(__file__).resolve().parent
+if (here / "best.pt").is_file() and (here / "best.onnx").is_file():
+    from app.services.backends import load_backend
+
+    torch_backend = load_backend(Settings(inference_backend="torch", model_path=str(here / "best.pt")))
+    onnx_backend = load_backend(Settings(inference_backend="onnx", onnx_model_path=str(here / "best.onnx")))
+    table = build_class_table(torch_backend.names)
+    samples = sorted((here.parent / "scripts" / "ai-model" / "test_images").glob("*.jp*g"))[:8]
+    arrays = [decode_image(p.read_bytes(), None).array for p in samples] or [
+        decode_image(scene(freq, 90), None).array for freq in (9, 14, 20)
+    ]
+
+    def summary(backend, image):
+        result = postprocess(backend.predict([image], 0.25)[0], table, 0.45)
+        return sorted((d.type, d.severity, d.confidence) for d in result.detections)
+
+    def same(a, b):
+        return len(a) == len(b) and all(x[:2] == y[:2] and abs(x[2] - y[2]) <= 0.05 for x, y in zip(a, b))
+
+    check("onnx backend matches torch after the service's NMS and aggregation",
+          onnx_backend.names == torch_backend.names
+          and all(same(summary(torch_backend, image), summary(onnx_backend, image)) for image in arrays))
+else:
+    print("SKIP - torch/onnx parity (needs best.pt and best.onnx in ai-microservice/)")
+
+# 20. ONNX pre/post-processing on synthetic data (no model needed)
+from app.services.backends import _MAX_DET, decode_yolo_output, letterbox
+
+boxed, gain, pad = letterbox(np.full((100, 300, 3), 7, np.uint8), (640, 640))
+check("letterbox: aspect-preserving gain, centred grey padding",
+      boxed.shape == (640, 640, 3) and abs(gain - 640 / 300) < 1e-9 and pad == (0, 213)
+      and (boxed[:213] == 114).all() and (boxed[213:426] == 7).all() and (boxed[426:] == 114).all())
+
+
+def head(rows, nc=3):
+    """(4 + nc, anchors) head output from (cx, cy, w, h, class, score) rows."""
+    out = np.zeros((4 + nc, len(rows)), np.float32)
+    for i, (cx, cy, w, h, c, score) in enumerate(rows):
+        out[:4, i] = cx, cy, w, h
+        out[4 + c, i] = score
+    return out
+
+
+# Letterboxed 240x320 -> 640x640: gain 2, 80 px of padding on top.
+raw = decode_yolo_output(head([
+    (100, 180, 40, 40, 0, 0.90),  # kept -> (40, 40, 60, 60) in the original
+    (102, 182, 40, 40, 0, 0.80),  # same class, IoU ~0.82 with the first -> suppressed
+    (100, 180, 40, 40, 1, 0.85),  # same box, other class -> survives the class offset
+    (300, 300, 40, 40, 2, 0.20),  # below the confidence floor
+    (630, 540, 40, 40, 2, 0.70),  # runs past the right edge -> clipped to the width
+]), 0.25, 2.0, (0, 80), (240, 320))
+check("onnx decode: head -> xyxy in original pixels, clipped to the image",
+      raw.xyxy.dtype == np.float32
+      and np.allclose(raw.xyxy, [[40, 40, 60, 60], [40, 40, 60, 60], [305, 220, 320, 240]])
+      and np.allclose(raw.conf, [0.90, 0.85, 0.70]) and raw.cls.tolist() == [0, 1, 2])
+
+grid = [(16 + 32 * (i % 20), 16 + 32 * (i // 20), 10, 10, 0, 0.3 + i / 1000) for i in range(_MAX_DET + 100)]
+capped = decode_yolo_output(head(grid), 0.25, 1.0, (0, 0), (640, 640))
+check("onnx decode: disjoint boxes capped at _MAX_DET, highest scores first",
+      len(capped.conf) == _MAX_DET
+      and np.allclose(capped.conf, sorted((row[5] for row in grid), reverse=True)[:_MAX_DET]))
+
+print("\nRESULT:", "ALL PASS" if not failures else f"{len(failures)} FAILURES: {failures}")
+raise SystemExit(1 if failures else 0)
@@ -2,6 +2,7 @@
 
 # 1. Imports
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -13,8 +14,50 @@ class Settings(BaseSettings):
     supabase_url: str = ""
     supabase_service_role_key: str = ""
 
+    # Async PostgREST client on the request path: one keep-alive pool per
+    # process, HTTP/2 when the `h2` package is installed. `supabase_pool_size`
+    # caps the open connections; a request waits up to
+    # `supabase_pool_timeout_s` for a free one. Connect and total per-call
+    # timeouts bound each round trip.
+    supabase_timeout_s: float = 10.0
+    supabase_connect_timeout_s: float = 3.0
+    supabase_pool_timeout_s: float = 5.0
+    supabase_pool_size: int = 20
+    supabase_keepalive_s: float = 30.0
+    supabase_http2: bool = True
+
     cors_origins: str = "*"
     rate_limit_per_minute: int = 60
+    # Rate-limiter state: "memory" is per process; "redis" (at `redis_url`,
+    # needs the `redis` package) shares the limit across workers and instances.
+    # Algorithms: fixed_window, sliding_log (exact), token_bucket (allows bursts).
+    rate_limit_backend: Literal["memory", "redis"] = "memory"
+    rate_limit_algorithm: Literal["fixed_window", "sliding_log", "token_bucket"] = "fixed_window"
+    redis_url: str = "redis://localhost:6379/0"
+    redis_timeout_s: float = 0.5
+
+    # API-key verification cache, keyed by the key's SHA-256 (never the key).
+    # A valid key is re-checked against the database after
+    # `api_key_cache_ttl_s` seconds, which is the longest a revoked or rotated
+    # key keeps working. An invalid one is re-checked after
+    # `api_key_negative_ttl_s`. A TTL of 0 disables that half of the cache.
+    api_key_cache_ttl_s: float = 60.0
+    api_key_negative_ttl_s: float = 10.0
+    api_key_cache_entries: int = 10_000
+    # api_keys.last_used_at is written in one batch this often (and on shutdown).
+    api_key_usage_flush_s: float = 30.0
+    # /api/v1/hazards response cache: pages keyed by the normalized query, at
+    # most `hazards_cache_entries`, each kept `hazards_cache_ttl_s` seconds
+    # (0 disables it). A page is reused only while max(hazards.updated_at) is
+    # unchanged; that watermark is re-read at most every `hazards_cache_check_s`.
+    hazards_cache_ttl_s: float = 300.0
+    hazards_cache_entries: int = 1000
+    hazards_cache_check_s: float = 5.0
+    # GET /api/v1/hazards/export: exports per key per hour (its own budget,
+    # separate from `rate_limit_per_minute`), and rows read per database round
+    # trip, which also bounds the memory an export holds.
+    export_rate_limit_per_hour: int = 10
+    export_batch_size: int = 1000
     default_page_size: int = 50
     max_page_size: int = 100
 
@@ -1,16 +1,36 @@
-"""Supabase client factory.
+"""Supabase client factories.
 
 The backend talks to Supabase with the SERVICE-ROLE key so it can call the
 service_role-only verify_api_key() RPC and read hazard data unhindered by RLS.
-This client must never be exposed to the browser.
+These clients must never be exposed to the browser.
+
+Two clients share those credentials:
+
+  * :func:`get_postgrest` — async PostgREST client for the request path. It
+    holds one pooled, keep-alive httpx connection pool per process (HTTP/2 when
+    the ``h2`` package is installed), with explicit timeouts. Awaiting it frees
+    the event loop instead of holding a threadpool thread per round trip.
+  * :func:`get_supabase` — the blocking supabase-py client, for scripts and
+    background threads (verify_db.py, the batched ``last_used_at`` writes).
 """
 
 # 1. Imports
+import importlib.util
 from functools import lru_cache
 
+import httpx
+from postgrest import AsyncPostgrestClient
 from supabase import Client, create_client
 
-from .config import get_settings
+from .config import Settings, get_settings
+
+
+def _require_configured(settings: Settings) -> None:
+    if not settings.is_configured:
+        raise RuntimeError(
+            "SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set "
+            "(copy backend/.env.example to backend/.env and fill them in)."
+        )
 
 
 # 2. Cached client — one connection pool per process
@@ -22,9 +42,56 @@ def get_supabase() -> Client:
     surfaces clearly at first use rather than as an opaque network error.
     """
     settings = get_settings()
-    if not settings.is_configured:
-        raise RuntimeError(
-            "SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set "
-            "(copy backend/.env.example to backend/.env and fill them in)."
-        )
+    _require_configured(settings)
     return create_client(settings.supabase_url, settings.supabase_service_role_key)
+
+
+# 3. Async pooled client — the request path
+class _PooledPostgrestClient(AsyncPostgrestClient):
+    """AsyncPostgrestClient whose httpx session is sized by Settings."""
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None) -> httpx.AsyncClient:
+        settings = get_settings()
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            proxy=proxy,
+            follow_redirects=True,
+            http2=settings.supabase_http2 and importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=settings.supabase_pool_size,
+                max_keepalive_connections=settings.supabase_pool_size,
+                keepalive_expiry=settings.supabase_keepalive_s,
+            ),
+        )
+
+
+@lru_cache
+def get_postgrest() -> AsyncPostgrestClient:
+    """Return the process-wide async PostgREST client (service_role).
+
+    Raises RuntimeError when the credentials are missing, like get_supabase().
+    The pool binds to the running event loop, so the client is created lazily on
+    first use inside the server and closed by :func:`close_postgrest` on shutdown.
+    """
+    settings = get_settings()
+    _require_configured(settings)
+    key = settings.supabase_service_role_key
+    return _PooledPostgrestClient(
+        f"{settings.supabase_url.rstrip('/')}/rest/v1",
+        headers={"apikey": key, "Authorization": f"Bearer {key}"},
+        timeout=httpx.Timeout(
+            settings.supabase_timeout_s,
+            connect=settings.supabase_connect_timeout_s,
+            pool=settings.supabase_pool_timeout_s,
+        ),
+    )
+
+
+async def close_postgrest() -> None:
+    """Close the pooled connections, if the client was ever created."""
+    if get_postgrest.cache_info().currsize:
+        await get_postgrest().aclose()
+        get_postgrest.cache_clear()
@@ -0,0 +1,50 @@
+"""Bounded, thread-safe LRU map with a per-entry time-to-live.
+
+Shared by the API-key verification cache and the hazards response cache.
+"""
+
+# 1. Imports
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+# 2. Cache
+class TTLCache:
+    """LRU map of at most ``max_entries`` whose entries expire ``ttl_s`` after
+    being stored. A TTL or size of 0 disables it (``put`` stores nothing)."""
+
+    def __init__(self, max_entries: int, ttl_s: float) -> None:
+        self._max_entries = max_entries
+        self._ttl_s = ttl_s
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """(hit, value) for ``key``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[0]
+
+    def put(self, key: str, value: Any) -> None:
+        if self._ttl_s <= 0 or self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self._ttl_s)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -2,19 +2,23 @@
 
 A FastAPI dependency that:
   1. extracts the Bearer token (or X-API-Key header),
-  2. validates it against the Vault-encrypted keys via the verify_api_key() RPC,
+  2. validates it against the Vault-encrypted keys via the verify_api_key() RPC
+     (through the short-lived verification cache in services/api_keys.py),
   3. applies the per-key rate limit.
 
 On success it yields an ``AuthContext`` with the owning user's id.
+``require_api_key`` meters the paged endpoints; ``require_export_key`` meters
+the bulk export against its own, hourly budget.
 """
 
 # 1. Imports
 from dataclasses import dataclass
 
-from fastapi import Depends, HTTPException, Request, status
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from ..core.database import get_supabase
+from ..services import api_keys
+from ..core.config import get_settings
 from .rate_limit import enforce_rate_limit
 
 # 2. Security scheme — drives the "Authorize" button in Swagger UI
@@ -42,12 +46,10 @@ def _extract_key(request: Request, creds: HTTPAuthorizationCredentials | None) -
     return header_key.strip() if header_key else None
 
 
-# 5. Dependency
-async def require_api_key(
-    request: Request,
-    creds: HTTPAuthorizationCredentials | None = Depends(_bearer_scheme),
-) -> AuthContext:
-    """Authenticate and rate-limit the request, or raise 401/429/503."""
+async def _authenticate(
+    request: Request, creds: HTTPAuthorizationCredentials | None
+) -> tuple[str, str]:
+    """(api key, owning user id) once the key is known to be valid, or raise 401/503."""
     api_key = _extract_key(request, creds)
     if not api_key:
         raise HTTPException(
@@ -56,16 +58,16 @@ async def require_api_key(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Validate against the decrypted keys in the database (service_role RPC).
+    # Validate against the decrypted keys in the database (service_role RPC),
+    # or a recent cached answer for the same key.
     try:
-        result = get_supabase().rpc("verify_api_key", {"raw_key": api_key}).execute()
+        user_id = await api_keys.verify(api_key)
     except Exception as exc:  # network / config failure — not the caller's fault
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Authentication backend is unavailable.",
         ) from exc
 
-    user_id = result.data
     if not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -73,8 +75,35 @@ async def require_api_key(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Rate limit only after the key is known-valid, so unauthenticated noise
-    # cannot exhaust a real key's budget.
-    enforce_rate_limit(api_key)
+    return api_key, str(user_id)
+
+
+# 5. Dependencies
+# Rate limit only after the key is known-valid, so unauthenticated noise
+# cannot exhaust a real key's budget.
+async def require_api_key(
+    request: Request,
+    response: Response,
+    creds: HTTPAuthorizationCredentials | None = Depends(_bearer_scheme),
+) -> AuthContext:
+    """Authenticate and rate-limit the request, or raise 401/429/503."""
+    api_key, user_id = await _authenticate(request, creds)
+    decision = await enforce_rate_limit(api_key)
+    if decision is not None:
+        response.headers.update(decision.headers)
+    return AuthContext(user_id=user_id, api_key=api_key)
+
 
-    return AuthContext(user_id=str(user_id), api_key=api_key)
+async def require_export_key(
+    request: Request,
+    response: Response,
+    creds: HTTPAuthorizationCredentials | None = Depends(_bearer_scheme),
+) -> AuthContext:
+    """Like require_api_key, metered against the export budget instead."""
+    api_key, user_id = await _authenticate(request, creds)
+    decision = await enforce_rate_limit(
+        api_key, scope="export", limit=get_settings().export_rate_limit_per_hour, window_s=3600.0
+    )
+    if decision is not None:
+        response.headers.update(decision.headers)
+    return AuthContext(user_id=user_id, api_key=api_key)
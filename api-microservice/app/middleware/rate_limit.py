@@ -1,51 +1,63 @@
 """Per-API-key rate limiting.
 
-A fixed-window counter (60 requests / minute by default). State is kept in
-process memory guarded by a lock — sufficient for a single-process FYP
-deployment. For a multi-worker/horizontal deployment, swap the in-memory
-``_BUCKETS`` store for Redis (the ``enforce_rate_limit`` contract stays the same).
+``rate_limit_per_minute`` requests per key, counted by the backend and
+algorithm configured in services/rate_limiter.py (in-process memory by default;
+Redis to share limits across workers and instances). Keys are stored there as
+a SHA-256 digest, never in plaintext.
+
+Limits are metered per *scope*: the bulk export has its own budget
+(``export_rate_limit_per_hour``), separate from the paged endpoints.
+
+Every authenticated response carries ``X-RateLimit-Limit`` / ``-Remaining`` /
+``-Reset`` (seconds until the budget is full again); a 429 adds ``Retry-After``.
 """
 
 # 1. Imports
-import threading
-import time
+import hashlib
+import logging
+import math
 
 from fastapi import HTTPException, status
 
 from ..core.config import get_settings
+from ..services.rate_limiter import Decision, get_rate_limiter
+
+logger = logging.getLogger(__name__)
 
-# 2. Module state — key -> (window_index, count_in_window)
-_LOCK = threading.Lock()
-_BUCKETS: dict[str, tuple[int, int]] = {}
+_WINDOW_S = 60.0
+_WINDOW_NAMES = {60.0: "minute", 3600.0: "hour"}
 
 
-# 3. Enforcement
-def enforce_rate_limit(api_key: str) -> None:
-    """Increment the caller's counter for the current minute.
+# 2. Enforcement
+async def enforce_rate_limit(
+    api_key: str,
+    *,
+    scope: str = "api",
+    limit: int | None = None,
+    window_s: float = _WINDOW_S,
+) -> Decision | None:
+    """Count one request for the caller against ``limit`` per ``window_s`` in
+    ``scope`` (by default the per-minute limit of the paged endpoints).
 
-    Raises HTTP 429 with a ``Retry-After`` header once the limit is exceeded.
-    Why fixed-window: it is O(1) in time and memory per key and needs no
-    per-request timestamp lists, which matters when the store is in memory.
+    Returns the decision, for the response headers. Raises HTTP 429 with a
+    ``Retry-After`` header once the limit is exceeded. If the backend cannot be
+    reached the request is let through (and None returned): an outage of the
+    limiter store must not take the API down with it.
     """
-    limit = get_settings().rate_limit_per_minute
-    now = int(time.time())
-    window = now // 60
-
-    with _LOCK:
-        stored_window, count = _BUCKETS.get(api_key, (window, 0))
-        if stored_window != window:
-            stored_window, count = window, 0
-        count += 1
-        _BUCKETS[api_key] = (stored_window, count)
-
-    if count > limit:
-        retry_after = 60 - (now % 60)
+    if limit is None:
+        limit = get_settings().rate_limit_per_minute
+    key = f"{scope}:{hashlib.sha256(api_key.encode()).hexdigest()[:32]}"
+    try:
+        decision = await get_rate_limiter().hit(key, limit, window_s)
+    except Exception:  # noqa: BLE001 — fail open
+        logger.warning("Rate-limit backend unavailable; request not counted", exc_info=True)
+        return None
+
+    if not decision.allowed:
+        per = _WINDOW_NAMES.get(window_s, f"{window_s:g} seconds")
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Rate limit exceeded: {limit} requests per minute per API key.",
-            headers={
-                "Retry-After": str(retry_after),
-                "X-RateLimit-Limit": str(limit),
-                "X-RateLimit-Remaining": "0",
-            },
+            detail=f"Rate limit exceeded: {limit} requests per {per} per API key.",
+            headers={"Retry-After": str(max(1, math.ceil(decision.retry_after_s))), **decision.headers},
         )
+    return decision
@@ -52,13 +52,25 @@ class Report(BaseModel):
 
 
 class PaginationMeta(BaseModel):
-    """Server-side pagination envelope."""
+    """Server-side pagination envelope.
 
-    total: int = Field(description="Total rows matching the filters.")
+    Offset pages carry ``offset``; cursor pages omit it. ``next_cursor`` is
+    present whenever ``has_more`` is true, in both modes.
+    """
+
+    total: int | None = Field(
+        default=None, description="Total rows matching the filters. Omitted with total=none."
+    )
+    total_estimated: bool | None = Field(
+        default=None, description="True when `total` is the planner's estimate (total=estimated)."
+    )
     limit: int = Field(description="Page size used for this response.")
-    offset: int = Field(description="Row offset of this page.")
+    offset: int | None = Field(default=None, description="Row offset of this page (offset paging only).")
     count: int = Field(description="Number of rows actually returned.")
     has_more: bool = Field(description="True if further pages exist.")
+    next_cursor: str | None = Field(
+        default=None, description="Opaque cursor for the next page; pass it back as `cursor`."
+    )
 
 
 class ReportListResponse(BaseModel):
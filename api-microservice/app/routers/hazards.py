@@ -1,19 +1,22 @@
-"""Hazards API router — GET /api/v1/hazards.
+"""Hazards API router — GET /api/v1/hazards and GET /api/v1/hazards/export.
 
 The router is thin: it validates/normalizes query parameters and delegates to
-reports_service (which queries the `hazards` table in Supabase). Every endpoint
-requires a valid API key via require_api_key.
+reports_service (which queries the `hazards` table in Supabase), through the
+response cache in services/response_cache.py. Every endpoint requires a valid
+API key via require_api_key (require_export_key for the export, which has its
+own rate limit).
 """
 
 # 1. Imports
 from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 
 from ..core.config import get_settings
-from ..middleware.auth import AuthContext, require_api_key
+from ..middleware.auth import AuthContext, require_api_key, require_export_key
 from ..models.reports import SELECTABLE_FIELDS, ReportListResponse
-from ..services import reports_service
+from ..services import reports_service, response_cache
 
 # 2. Router — path mirrors the Supabase table name (`hazards`)
 router = APIRouter(prefix="/api/v1", tags=["Hazards"])
@@ -40,28 +43,23 @@ def _resolve_fields(fields: str | None) -> set[str]:
     return requested
 
 
-# 4. Endpoint
-@router.get(
-    "/hazards",
-    response_model=ReportListResponse,
-    response_model_exclude_none=True,
-    summary="List road hazards",
-    description=(
-        "Paginated, filterable feed of verified road-hazard reports.\n\n"
-        "**Auth:** send your key as `Authorization: Bearer <key>` (or `X-API-Key`).\n"
-        "**Rate limit:** 60 requests/minute per key.\n"
-        "**Media:** image fields are always plain URL strings — never Base64."
-    ),
-)
-def list_reports(
-    auth: AuthContext = Depends(require_api_key),
-    limit: int = Query(
-        default=None,
-        ge=1,
-        le=100,
-        description="Page size (default 50, max 100).",
-    ),
-    offset: int = Query(default=0, ge=0, description="Row offset for pagination."),
+def _resolve_cursor(cursor: str | None, offset: int) -> tuple[str, str] | None:
+    """Decode the opaque ``cursor`` param; 400 when it is malformed or combined
+    with an offset."""
+    if cursor is None:
+        return None
+    if offset:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either 'cursor' or 'offset', not both.",
+        )
+    try:
+        return reports_service.decode_cursor(cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+
+def _filters(
     location: str | None = Query(
         default=None, description="Filter by administrative area name (partial match)."
     ),
@@ -87,13 +85,10 @@ def list_reports(
         default=None,
         description="Comma-separated subset of fields to return (id is always included).",
     ),
-) -> ReportListResponse:
-    settings = get_settings()
-    effective_limit = min(limit or settings.default_page_size, settings.max_page_size)
-
-    return reports_service.list_reports(
-        limit=effective_limit,
-        offset=offset,
+) -> dict:
+    """The filter and projection params shared by the list and export endpoints,
+    as keyword arguments for reports_service."""
+    return dict(
         fields=_resolve_fields(fields),
         include_media=include_media,
         location=location,
@@ -103,3 +98,113 @@ def list_reports(
         date_from=date_from,
         date_to=date_to,
     )
+
+
+# 4. Endpoints
+@router.get(
+    "/hazards",
+    response_model=ReportListResponse,
+    responses={304: {"description": "Not Modified — the page still matches `If-None-Match`."}},
+    summary="List road hazards",
+    description=(
+        "Paginated, filterable feed of verified road-hazard reports.\n\n"
+        "**Auth:** send your key as `Authorization: Bearer <key>` (or `X-API-Key`).\n"
+        "**Rate limit:** 60 requests/minute per key.\n"
+        "**Media:** image fields are always plain URL strings — never Base64.\n"
+        "**Paging:** newest first. Follow `pagination.next_cursor` (pass it back as "
+        "`cursor`) to walk the whole feed at constant cost per page; `offset` still "
+        "works but gets slower the deeper it goes. `total=estimated|none` makes the "
+        "total cheaper or skips it.\n"
+        "**Polling:** every page has an `ETag`; send it back as `If-None-Match` "
+        "and an unchanged page comes back as an empty 304."
+    ),
+)
+async def list_reports(
+    response: Response,
+    auth: AuthContext = Depends(require_api_key),
+    limit: int = Query(
+        default=None,
+        ge=1,
+        le=100,
+        description="Page size (default 50, max 100).",
+    ),
+    offset: int = Query(default=0, ge=0, description="Row offset for pagination."),
+    cursor: str | None = Query(
+        default=None,
+        description="Opaque `pagination.next_cursor` of the previous page (instead of offset).",
+    ),
+    total: reports_service.TotalMode | None = Query(
+        default=None,
+        description=(
+            "How to compute `pagination.total`: exact count, planner estimate, or none. "
+            "Defaults to exact for offset pages and none for cursor pages."
+        ),
+    ),
+    filters: dict = Depends(_filters),
+    if_none_match: str | None = Header(
+        default=None, description="ETag of a page you already have; 304 if it is unchanged."
+    ),
+) -> Response:
+    settings = get_settings()
+    effective_limit = min(limit or settings.default_page_size, settings.max_page_size)
+    after = _resolve_cursor(cursor, offset)
+
+    query = dict(
+        limit=effective_limit,
+        offset=offset,
+        after=after,
+        total=total or ("none" if after else "exact"),
+        **filters,
+    )
+    page = await response_cache.get_page(
+        response_cache.query_key(**query), lambda: reports_service.list_reports(**query), if_none_match
+    )
+
+    # Returning a Response bypasses FastAPI's merge of dependency-set headers
+    # (the X-RateLimit-* ones), so carry them over explicitly.
+    headers = {**response.headers, "ETag": page.etag, "Cache-Control": response_cache.CACHE_CONTROL}
+    if response_cache.etag_matches(if_none_match, page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+
+@router.get(
+    "/hazards/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "Every matching report, streamed newest first.",
+            "content": {media_type: {} for media_type in reports_service.EXPORT_MEDIA_TYPES.values()},
+        }
+    },
+    summary="Export all matching road hazards",
+    description=(
+        "The whole filtered dataset in one streamed response (chunked transfer), "
+        "instead of paging through `/api/v1/hazards`.\n\n"
+        "**Formats:** `ndjson` (one JSON report per line, as in `data[]` of the list "
+        "endpoint) or `csv` (header row; media URLs space-separated).\n"
+        "**Filters:** the same filters, `fields` and `include_media` as the list endpoint.\n"
+        "**Rate limit:** metered separately — 10 exports/hour per key by default; an "
+        "export does not count against the per-minute limit.\n"
+        "**Errors:** a failure after streaming has started cannot change the status "
+        "code; the stream ends without its closing chunk instead, which HTTP clients "
+        "report as an incomplete read."
+    ),
+)
+async def export_reports(
+    response: Response,
+    auth: AuthContext = Depends(require_export_key),
+    format_: reports_service.ExportFormat = Query(
+        default="ndjson", alias="format", description="Output format: ndjson or csv."
+    ),
+    filters: dict = Depends(_filters),
+) -> StreamingResponse:
+    chunks = reports_service.export_chunks(
+        format_, batch_size=get_settings().export_batch_size, **filters
+    )
+    headers = {
+        **response.headers,
+        "Content-Disposition": f'attachment; filename="jalanguard-hazards.{format_}"',
+        "Cache-Control": "no-store",
+    }
+    return StreamingResponse(chunks, media_type=reports_service.EXPORT_MEDIA_TYPES[format_], headers=headers)
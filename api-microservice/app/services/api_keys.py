@@ -0,0 +1,125 @@
+"""API-key verification with an in-process cache and batched usage stamps.
+
+Checking a key through the ``verify_api_key`` RPC costs a PostgREST round trip
+and a Vault decrypt. Results are therefore cached per process, keyed by the
+SHA-256 of the key (the plaintext key is never stored):
+
+  * a valid key is trusted for ``api_key_cache_ttl_s`` seconds, which is also
+    the longest a revoked or rotated key keeps working;
+  * an invalid key is remembered for ``api_key_negative_ttl_s`` seconds, in a
+    separate bounded map, so a spray of bad keys cannot evict good ones.
+
+``last_used_at`` is no longer written on every request. Uses are collected in
+memory (latest time per key) and written in one ``touch_api_keys`` call every
+``api_key_usage_flush_s`` seconds, and once more on shutdown. Those writes run
+on a background thread with the blocking client; the lookup itself uses the
+pooled async client.
+"""
+
+# 1. Imports
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from ..core.config import get_settings
+from ..core.database import get_postgrest, get_supabase
+from ..core.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+# 2. Verification caches
+@lru_cache
+def _valid_keys() -> TTLCache:
+    settings = get_settings()
+    return TTLCache(settings.api_key_cache_entries, settings.api_key_cache_ttl_s)
+
+
+@lru_cache
+def _invalid_keys() -> TTLCache:
+    settings = get_settings()
+    return TTLCache(settings.api_key_cache_entries, settings.api_key_negative_ttl_s)
+
+
+# 3. Usage write-back
+class UsageRecorder:
+    """Collects key uses and writes them to ``api_keys.last_used_at`` in batches."""
+
+    def __init__(self, interval_s: float) -> None:
+        self._interval_s = interval_s
+        self._pending: dict[str, datetime] = {}  # public id -> latest use
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def record(self, public_id: str) -> None:
+        with self._lock:
+            self._pending[public_id] = datetime.now(timezone.utc)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="api-key-usage", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._wake.wait(self._interval_s):
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every pending use in one RPC; the number of keys sent. On
+        failure the batch is kept (merged with newer uses) for the next try."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        usage = [{"public_id": key, "used_at": used.isoformat()} for key, used in batch.items()]
+        try:
+            get_supabase().rpc("touch_api_keys", {"usage": usage}).execute()
+        except Exception:  # noqa: BLE001 — usage stamps are best-effort
+            logger.warning("Could not write last_used_at for %d API keys; will retry", len(batch))
+            with self._lock:
+                for key, used in batch.items():
+                    self._pending[key] = max(used, self._pending.get(key, used))
+            return 0
+        return len(batch)
+
+    def close(self) -> None:
+        """Stop the timer and write what is left."""
+        self._wake.set()
+        self.flush()
+
+
+@lru_cache
+def usage_recorder() -> UsageRecorder:
+    return UsageRecorder(get_settings().api_key_usage_flush_s)
+
+
+# 4. Verification
+def _public_id(api_key: str) -> str:
+    """The plaintext lookup id embedded in ``jg_<public_id>_<secret>``."""
+    return api_key.split("_")[1]
+
+
+async def verify(api_key: str) -> str | None:
+    """The owning user id of a valid key, or None. Raises whatever the RPC
+    raises when the database cannot be reached (nothing is cached then)."""
+    digest = hashlib.sha256(api_key.encode()).hexdigest()
+    hit, user_id = _valid_keys().get(digest)
+    if not hit:
+        hit, user_id = _invalid_keys().get(digest)
+    if not hit:
+        result = await get_postgrest().rpc(
+            "verify_api_key", {"raw_key": api_key, "stamp_last_used": False}
+        ).execute()
+        user_id = str(result.data) if result.data else None
+        (_valid_keys() if user_id else _invalid_keys()).put(digest, user_id)
+
+    if user_id:
+        usage_recorder().record(_public_id(api_key))
+    return user_id
+
+
+def shutdown() -> None:
+    """Flush pending usage stamps on application shutdown."""
+    if usage_recorder.cache_info().currsize:
+        usage_recorder().close()
@@ -0,0 +1,253 @@
+"""Rate-limiter backends.
+
+Every backend answers one question per request, :meth:`RateLimiter.hit`:
+may this caller make another request, and how much of its budget is left?
+The algorithm is chosen by ``RATE_LIMIT_ALGORITHM``:
+
+  * ``fixed_window`` — a counter per calendar minute. O(1) per key, but a
+    client can send 2× the limit across a window boundary.
+  * ``sliding_log`` — the timestamps of the requests of the last minute. Exact,
+    costs one entry per request in the window.
+  * ``token_bucket`` — ``limit`` tokens refilled continuously over the window.
+    Allows short bursts while holding the long-run average to the limit.
+
+``RATE_LIMIT_BACKEND`` picks where the state lives: ``memory`` (per process;
+idle keys are evicted once their window has passed) or ``redis`` (shared by
+every worker and instance, each hit one atomic Lua script using the Redis
+server's clock, so instances never disagree about the time).
+"""
+
+# 1. Imports
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Protocol
+
+from ..core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+# 2. Decision
+@dataclass(frozen=True)
+class Decision:
+    """Outcome of one hit, in the shape of the X-RateLimit-* headers."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_s: float  # until the budget is full again
+    retry_after_s: float = 0.0  # until the next request is allowed (when denied)
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_s)),
+        }
+
+
+def _fixed_window(limit: int, count: int, until_next: float) -> Decision:
+    allowed = count <= limit
+    return Decision(allowed, limit, max(0, limit - count), until_next, 0.0 if allowed else until_next)
+
+
+def _sliding_log(limit: int, window_s: float, now: float, allowed: bool, count: int,
+                 oldest: float, newest: float) -> Decision:
+    retry_after = 0.0 if allowed else max(0.0, oldest + window_s - now)
+    return Decision(allowed, limit, max(0, limit - count), max(0.0, newest + window_s - now), retry_after)
+
+
+def _token_bucket(limit: int, window_s: float, allowed: bool, tokens: float) -> Decision:
+    rate = limit / window_s
+    retry_after = 0.0 if allowed else (1 - tokens) / rate
+    return Decision(allowed, limit, math.floor(tokens), (limit - tokens) / rate, retry_after)
+
+
+# 3. Backends
+class RateLimiter(Protocol):
+    """What ``enforce_rate_limit`` needs from a backend."""
+
+    async def hit(self, key: str, limit: int, window_s: float) -> Decision:
+        """Count one request for ``key`` against ``limit`` per ``window_s``."""
+        ...
+
+    async def aclose(self) -> None:
+        """Release connections on shutdown."""
+        ...
+
+
+class MemoryRateLimiter:
+    """Per-process state behind one lock, one map per window length so a
+    per-minute sweep never touches per-hour budgets. Keys idle for a whole
+    window are dropped on the next sweep of their map, so memory follows the
+    active keys only."""
+
+    def __init__(self, algorithm: str) -> None:
+        self._algorithm = algorithm
+        self._state: dict[float, dict[str, object]] = {}
+        self._next_sweep: dict[float, float] = {}
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, limit: int, window_s: float) -> Decision:
+        now = time.time()
+        with self._lock:
+            state = self._state.setdefault(window_s, {})
+            if now >= self._next_sweep.get(window_s, 0.0):
+                self._sweep(state, now, window_s)
+                self._next_sweep[window_s] = now + window_s
+            return getattr(self, f"_{self._algorithm}")(state, key, limit, window_s, now)
+
+    def _fixed_window(self, state: dict, key: str, limit: int, window_s: float, now: float) -> Decision:
+        window = int(now // window_s)
+        stored, count = state.get(key, (window, 0))
+        count = count + 1 if stored == window else 1
+        state[key] = (window, count)
+        return _fixed_window(limit, count, (window + 1) * window_s - now)
+
+    def _sliding_log(self, state: dict, key: str, limit: int, window_s: float, now: float) -> Decision:
+        log = state.setdefault(key, deque())
+        while log and log[0] <= now - window_s:
+            log.popleft()
+        allowed = len(log) < limit
+        if allowed:
+            log.append(now)
+        return _sliding_log(limit, window_s, now, allowed, len(log), log[0] if log else now, log[-1] if log else now)
+
+    def _token_bucket(self, state: dict, key: str, limit: int, window_s: float, now: float) -> Decision:
+        tokens, stamp = state.get(key, (float(limit), now))
+        tokens = min(float(limit), tokens + (now - stamp) * limit / window_s)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        state[key] = (tokens, now)
+        return _token_bucket(limit, window_s, allowed, tokens)
+
+    def _sweep(self, state: dict, now: float, window_s: float) -> None:
+        """Drop keys of one window's map whose state has fully expired."""
+        def expired(entry) -> bool:
+            if isinstance(entry, deque):
+                return not entry or entry[-1] <= now - window_s
+            if self._algorithm == "fixed_window":
+                return entry[0] < int(now // window_s)
+            return entry[1] <= now - window_s  # token bucket refilled to full
+
+        for key in [k for k, entry in state.items() if expired(entry)]:
+            del state[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._state.clear()
+            self._next_sweep.clear()
+
+    async def aclose(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return sum(len(state) for state in self._state.values())
+
+
+# Each script reads the clock from the Redis server (TIME) and returns floats as
+# strings, since Redis truncates Lua numbers to integers.
+_NOW = "local t = redis.call('TIME')\nlocal now = tonumber(t[1]) + tonumber(t[2]) / 1000000\n"
+
+_FIXED_WINDOW = _NOW + """
+local limit, window = tonumber(ARGV[1]), tonumber(ARGV[2])
+local index = math.floor(now / window)
+local key = KEYS[1] .. ':' .. index
+local count = redis.call('INCR', key)
+if count == 1 then redis.call('PEXPIRE', key, math.ceil(window * 1000)) end
+return {count, tostring((index + 1) * window - now)}
+"""
+
+_SLIDING_LOG = _NOW + """
+local limit, window = tonumber(ARGV[1]), tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count < limit then
+  redis.call('ZADD', KEYS[1], now, ARGV[3])
+  count = count + 1
+  allowed = 1
+end
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')[2] or tostring(now)
+local newest = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')[2] or tostring(now)
+return {allowed, count, tostring(now), oldest, newest}
+"""
+
+_TOKEN_BUCKET = _NOW + """
+local limit, window = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or limit
+local stamp = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + (now - stamp) * limit / window)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimiter:
+    """State in Redis under ``<prefix><algorithm>:<key>``, one script call per hit.
+
+    ``client`` is a ``redis.asyncio`` client, so a hit never blocks the event loop.
+    """
+
+    def __init__(self, client, algorithm: str, prefix: str = "jg:ratelimit:") -> None:
+        self._client = client
+        self._algorithm = algorithm
+        self._prefix = prefix
+        source = {"fixed_window": _FIXED_WINDOW, "sliding_log": _SLIDING_LOG, "token_bucket": _TOKEN_BUCKET}
+        self._script = client.register_script(source[algorithm])
+
+    async def hit(self, key: str, limit: int, window_s: float) -> Decision:
+        redis_key = f"{self._prefix}{self._algorithm}:{key}"
+        if self._algorithm == "fixed_window":
+            count, until_next = await self._script(keys=[redis_key], args=[limit, window_s])
+            return _fixed_window(limit, int(count), float(until_next))
+        if self._algorithm == "sliding_log":
+            allowed, count, now, oldest, newest = await self._script(
+                keys=[redis_key], args=[limit, window_s, uuid.uuid4().hex]
+            )
+            return _sliding_log(limit, window_s, float(now), bool(allowed), int(count), float(oldest), float(newest))
+        allowed, tokens = await self._script(keys=[redis_key], args=[limit, window_s])
+        return _token_bucket(limit, window_s, bool(allowed), float(tokens))
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+# 4. Factory
+@lru_cache
+def get_rate_limiter() -> RateLimiter:
+    """The process-wide backend selected by RATE_LIMIT_BACKEND."""
+    settings = get_settings()
+    if settings.rate_limit_backend == "redis":
+        import redis.asyncio  # imported only when this backend is selected
+
+        client = redis.asyncio.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_timeout_s,
+            socket_connect_timeout=settings.redis_timeout_s,
+        )
+        return RedisRateLimiter(client, settings.rate_limit_algorithm)
+    return MemoryRateLimiter(settings.rate_limit_algorithm)
+
+
+async def close_rate_limiter() -> None:
+    """Close the backend's connections, if it was ever created."""
+    if get_rate_limiter.cache_info().currsize:
+        await get_rate_limiter().aclose()
+        get_rate_limiter.cache_clear()
@@ -3,13 +3,26 @@
 Thin routers, fat services: all query building, filtering, pagination and
 row → Report shaping lives here. The router only validates input and returns
 what this module produces.
+
+Pages are ordered newest first by ``(created_at, id)``. Offset paging skips
+rows, which gets slower the deeper the page. A cursor page instead asks for the
+rows strictly after the last one the previous page returned, which the
+``(created_at DESC, id DESC)`` index answers in the same time at any depth.
 """
 
 # 1. Imports
-from datetime import date
+import asyncio
+import base64
+import csv
+import io
+import json
+import uuid
+from collections.abc import AsyncIterator
+from datetime import date, datetime
+from typing import Literal
 
-from ..core.database import get_supabase
-from ..models.reports import Report, ReportListResponse, PaginationMeta
+from ..core.database import get_postgrest
+from ..models.reports import SELECTABLE_FIELDS, Report, ReportListResponse, PaginationMeta
 
 # 2. Constants
 # PostgREST select with the two administrative-boundary embeds disambiguated by
@@ -21,8 +34,35 @@ _SELECT = (
     "adm2:administrative_boundaries!hazards_adm2_id_fkey(name)"
 )
 
+# How to compute ``pagination.total``: an exact COUNT(*), PostgREST's planner
+# estimate (cheap on large tables), or not at all.
+TotalMode = Literal["exact", "estimated", "none"]
+
+# Bulk export encodings and their media types.
+ExportFormat = Literal["ndjson", "csv"]
+EXPORT_MEDIA_TYPES: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+# 3. Cursors — opaque to clients: base64url of the last row's (created_at, id)
+def encode_cursor(created_at: str, report_id: str) -> str:
+    raw = json.dumps([created_at, report_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
 
-# 3. Row shaping
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Inverse of :func:`encode_cursor`. Raises ValueError for anything else."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, report_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(report_id))
+    except Exception as exc:  # malformed base64 / JSON / timestamp / uuid
+        raise ValueError("Invalid cursor.") from exc
+
+
+# 4. Row shaping
 def _resolve_location(row: dict) -> str | None:
     """Most specific administrative name available (district over state)."""
     for key in ("adm2", "adm1"):
@@ -62,44 +102,33 @@ def _to_report(row: dict, fields: set[str], include_media: bool) -> Report:
     return Report(**values)
 
 
-# 4. Query
-def list_reports(
-    *,
-    limit: int,
-    offset: int,
-    fields: set[str],
-    include_media: bool,
-    location: str | None = None,
-    category: str | None = None,
-    severity: str | None = None,
-    status: str | None = None,
-    date_from: date | None = None,
-    date_to: date | None = None,
-) -> ReportListResponse:
-    """Return a paginated, filtered page of reports."""
-    client = get_supabase()
-
-    # location → resolve matching boundary ids, then filter hazards on any adm level.
-    boundary_ids: list[str] | None = None
-    if location:
-        matches = (
-            client.table("administrative_boundaries")
-            .select("id")
-            .ilike("name", f"%{location}%")
-            .execute()
-        )
-        boundary_ids = [str(r["id"]) for r in (matches.data or [])]
-        if not boundary_ids:
-            # No such area — short-circuit with an empty page.
-            return ReportListResponse(
-                data=[],
-                pagination=PaginationMeta(
-                    total=0, limit=limit, offset=offset, count=0, has_more=False
-                ),
-            )
+# 5. Query building
+async def _resolve_boundaries(client, location: str | None) -> list[str] | None:
+    """Ids of the administrative areas whose name matches ``location``, or None
+    when there is no location filter."""
+    if not location:
+        return None
+    matches = await (
+        client.table("administrative_boundaries")
+        .select("id")
+        .ilike("name", f"%{location}%")
+        .execute()
+    )
+    return [str(r["id"]) for r in (matches.data or [])]
 
-    query = client.table("hazards").select(_SELECT, count="exact")
 
+def _filtered(
+    query,
+    *,
+    category: str | None,
+    severity: str | None,
+    status: str | None,
+    date_from: date | None,
+    date_to: date | None,
+    boundary_ids: list[str] | None,
+    after: tuple[str, str] | None,
+):
+    """Apply the API filters, and the keyset condition for ``after``, to ``query``."""
     if category:
         query = query.eq("defect_type", category)
     if severity:
@@ -116,21 +145,158 @@ def list_reports(
         query = query.or_(
             f"adm0_id.in.({id_list}),adm1_id.in.({id_list}),adm2_id.in.({id_list})"
         )
+    if after is not None:
+        created_at, report_id = after
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt.{report_id})'
+        )
+    return query
+
 
-    query = query.order("created_at", desc=True).range(offset, offset + limit - 1)
-    response = query.execute()
+def _newest_first(query):
+    # id breaks created_at ties, so the order (and every cursor) is total.
+    return query.order("created_at", desc=True).order("id", desc=True)
+
+
+# 6. Pages
+async def list_reports(
+    *,
+    limit: int,
+    offset: int,
+    fields: set[str],
+    include_media: bool,
+    location: str | None = None,
+    category: str | None = None,
+    severity: str | None = None,
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    after: tuple[str, str] | None = None,
+    total: TotalMode = "exact",
+) -> ReportListResponse:
+    """Return a paginated, filtered page of reports.
+
+    ``after`` (a decoded cursor) switches from offset to keyset paging: the page
+    starts right after that ``(created_at, id)``. ``has_more`` comes from
+    fetching one row beyond the page, so it is right in every ``total`` mode.
+    When a total is wanted it is counted by a separate HEAD request with the
+    same filters, issued concurrently with the page query.
+    """
+    client = get_postgrest()
+
+    # location → resolve matching boundary ids, then filter hazards on any adm level.
+    boundary_ids = await _resolve_boundaries(client, location)
+    if boundary_ids == []:
+        # No such area — short-circuit with an empty page.
+        return ReportListResponse(
+            data=[],
+            pagination=PaginationMeta(
+                total=None if total == "none" else 0,
+                total_estimated=True if total == "estimated" else None,
+                limit=limit,
+                offset=None if after else offset,
+                count=0,
+                has_more=False,
+            ),
+        )
+
+    filters = dict(
+        category=category, severity=severity, status=status, date_from=date_from,
+        date_to=date_to, boundary_ids=boundary_ids, after=after,
+    )
+    query = _newest_first(_filtered(client.table("hazards").select(_SELECT), **filters))
+    if after is not None:
+        query = query.limit(limit + 1)
+    else:
+        query = query.range(offset, offset + limit)
+
+    if total == "none":
+        response, count = await query.execute(), None
+    else:
+        counting = _filtered(client.table("hazards").select("id", count=total, head=True), **filters)
+        response, counted = await asyncio.gather(query.execute(), counting.execute())
+        count = counted.count or 0
 
     rows = response.data or []
-    total = response.count or 0
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     reports = [_to_report(row, fields, include_media) for row in rows]
 
     return ReportListResponse(
         data=reports,
         pagination=PaginationMeta(
-            total=total,
+            total=count,
+            total_estimated=True if total == "estimated" else None,
             limit=limit,
-            offset=offset,
+            offset=None if after else offset,
             count=len(reports),
-            has_more=offset + len(reports) < total,
+            has_more=has_more,
+            next_cursor=encode_cursor(rows[-1]["created_at"], str(rows[-1]["id"])) if has_more else None,
         ),
     )
+
+
+# 7. Export
+async def iter_report_batches(
+    *,
+    batch_size: int,
+    fields: set[str],
+    include_media: bool,
+    location: str | None = None,
+    category: str | None = None,
+    severity: str | None = None,
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+) -> AsyncIterator[list[Report]]:
+    """Every matching report, newest first, in batches of ``batch_size``.
+
+    Walks the table with the same keyset condition as cursor pages, so each
+    batch costs the same however deep the export is, rows inserted meanwhile
+    (always newer) are not picked up halfway, and only one batch is in memory.
+    """
+    client = get_postgrest()
+    boundary_ids = await _resolve_boundaries(client, location)
+    if boundary_ids == []:
+        return
+
+    after: tuple[str, str] | None = None
+    while True:
+        query = _filtered(
+            client.table("hazards").select(_SELECT),
+            category=category, severity=severity, status=status, date_from=date_from,
+            date_to=date_to, boundary_ids=boundary_ids, after=after,
+        )
+        rows = (await _newest_first(query).limit(batch_size).execute()).data or []
+        if rows:
+            yield [_to_report(row, fields, include_media) for row in rows]
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1]["created_at"], str(rows[-1]["id"]))
+
+
+async def export_chunks(format: ExportFormat, **query) -> AsyncIterator[bytes]:
+    """The export encoded as NDJSON (one report object per line, unselected
+    fields omitted) or CSV (a header row, then one row per report; empty cells
+    for missing values, media URLs space-separated). One chunk per batch."""
+    fields, include_media = query["fields"], query["include_media"]
+    columns = ["id"] + [
+        f for f in SELECTABLE_FIELDS if f in fields and (f != "media" or include_media)
+    ]
+    if format == "csv":
+        yield (",".join(columns) + "\r\n").encode()
+
+    async for batch in iter_report_batches(**query):
+        if format == "ndjson":
+            yield "".join(r.model_dump_json(exclude_none=True) + "\n" for r in batch).encode()
+            continue
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for report in batch:
+            values = report.model_dump(mode="json")
+            writer.writerow(
+                " ".join(v) if isinstance(v, list) else ("" if v is None else v)
+                for v in (values[c] for c in columns)
+            )
+        yield out.getvalue().encode()
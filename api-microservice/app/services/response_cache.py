@@ -0,0 +1,164 @@
+"""Response cache and conditional GET for /api/v1/hazards.
+
+Integrators poll the same query over and over, and most polls find nothing
+new. Serialized pages are therefore cached per process, keyed by the
+normalized query (filters, fields, include_media, limit, offset/cursor,
+total mode). Each entry is bounded by ``hazards_cache_entries`` and
+``hazards_cache_ttl_s``.
+
+A cached page is reused only while the table's freshness *watermark* is
+unchanged. The watermark is ``max(updated_at)`` over hazards, read by one
+index probe and shared by every query for ``hazards_cache_check_s`` seconds;
+concurrent requests past that interval wait for the same probe.
+It covers the whole table, not the filter scope: a row that leaves a filter
+(for example a status change) moves the table-wide max but not the max of the
+rows still matching. Deleted rows do not move it, so the TTL bounds how long a
+deletion can go unseen.
+
+Every page carries an ``ETag`` and ``Cache-Control: private, no-cache``, so
+clients revalidate each poll. The ETag is derived from the query key, the
+watermark and the current ``hazards_cache_ttl_s`` period, not from the body:
+an ``If-None-Match`` that matches gets a 304 after the watermark probe alone,
+without building the page, even on a worker that has never served it. The
+period keeps the TTL bound on unseen deletions (one full response per period).
+Within a period a deletion changes the body but not the tag, so the tag is
+weak (``W/"…"``). With the cache disabled, the ETag is a strong digest of the
+body instead, so a 304 saves the transfer but not the query.
+"""
+
+# 1. Imports
+import asyncio
+import hashlib
+import json
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from functools import lru_cache
+
+from ..core.config import get_settings
+from ..core.database import get_postgrest
+from ..core.ttl_cache import TTLCache
+from ..models.reports import ReportListResponse
+
+# Authenticated responses: browsers may keep them, shared caches may not, and
+# either must revalidate (cheaply, via If-None-Match) before reuse.
+CACHE_CONTROL = "private, no-cache"
+
+
+# 2. Cached pages
+@dataclass(frozen=True)
+class CachedPage:
+    """A serialized response, the watermark it was built under, and its ETag.
+    ``body`` is empty when the caller's ``If-None-Match`` already matched."""
+
+    body: bytes
+    etag: str
+    watermark: str | None
+
+
+@lru_cache
+def _pages() -> TTLCache:
+    settings = get_settings()
+    return TTLCache(settings.hazards_cache_entries, settings.hazards_cache_ttl_s)
+
+
+def query_key(**params) -> str:
+    """Stable cache key for one set of (already validated) query parameters."""
+    normalized = {
+        name: sorted(value) if isinstance(value, (set, frozenset)) else value
+        for name, value in params.items()
+    }
+    if normalized.get("location"):
+        normalized["location"] = normalized["location"].strip().lower()  # ilike match
+    raw = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def validator(key: str, watermark: str | None) -> str | None:
+    """Weak ETag of the page for ``key`` under ``watermark`` in the current TTL
+    period; None when the cache is disabled (the body digest is used then).
+    Weak, because it does not change when a deletion alone changes the body."""
+    ttl_s = get_settings().hazards_cache_ttl_s
+    if ttl_s <= 0:
+        return None
+    period = int(time.time() // ttl_s)
+    return "W/" + make_etag(f"{key}|{watermark}|{period}".encode())
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match uses the weak comparison (RFC 9110 §13.1.2), so a ``W/``
+    prefix is ignored; ``*`` matches any current page."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+# 3. Freshness watermark
+class _Watermark:
+    """The latest ``max(updated_at)`` reading and when it was taken."""
+
+    def __init__(self) -> None:
+        self.value: str | None = None
+        self.checked_at = float("-inf")
+        self._probe: asyncio.Future | None = None
+
+    async def current(self) -> str | None:
+        """Re-read at most every ``hazards_cache_check_s``; callers arriving
+        while a probe is in flight share it (shielded, so one caller going
+        away does not cancel it for the rest)."""
+        if time.monotonic() - self.checked_at < get_settings().hazards_cache_check_s:
+            return self.value
+        if self._probe is None:
+            self._probe = asyncio.ensure_future(self._read())
+        return await asyncio.shield(self._probe)
+
+    async def _read(self) -> str | None:
+        try:
+            result = await (
+                get_postgrest().table("hazards")
+                .select("updated_at")
+                .order("updated_at", desc=True)
+                .limit(1)
+                .execute()
+            )
+            rows = result.data or []
+            self.value = rows[0]["updated_at"] if rows else None
+            self.checked_at = time.monotonic()
+            return self.value
+        finally:
+            self._probe = None
+
+
+@lru_cache
+def _watermark() -> _Watermark:
+    return _Watermark()
+
+
+# 4. Lookup
+async def get_page(
+    key: str, build: Callable[[], Awaitable[ReportListResponse]], if_none_match: str | None = None
+) -> CachedPage:
+    """The page for ``key``: bodiless when ``if_none_match`` already matches
+    its ETag, else the cached page if the data has not changed since it was
+    built, otherwise ``build()`` it, serialize it and cache the result.
+
+    The watermark is read *before* building, so a change that lands during the
+    build leaves the entry already stale rather than wrongly fresh.
+    """
+    watermark = await _watermark().current()
+    etag = validator(key, watermark)
+    if etag is not None and etag_matches(if_none_match, etag):
+        return CachedPage(body=b"", etag=etag, watermark=watermark)
+    hit, page = _pages().get(key)
+    if hit and page.watermark == watermark:
+        return CachedPage(body=page.body, etag=etag or make_etag(page.body), watermark=watermark)
+
+    body = (await build()).model_dump_json(exclude_none=True).encode()
+    page = CachedPage(body=body, etag=etag or make_etag(body), watermark=watermark)
+    _pages().put(key, page)
+    return page
@@ -13,15 +13,29 @@ OpenAPI:     http://localhost:8000/openapi.json
 """
 
 # 1. Imports
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import get_settings
+from app.core.database import close_postgrest
 from app.routers import hazards
+from app.services import api_keys
+from app.services.rate_limiter import close_rate_limiter
 
 # 2. App
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    yield
+    api_keys.shutdown()  # write the last batch of key-usage stamps
+    await close_rate_limiter()
+    await close_postgrest()
+
+
 app = FastAPI(
     title=settings.api_title,
     version=settings.api_version,
@@ -36,6 +50,7 @@ app = FastAPI(
     redoc_url="/redoc",
     openapi_url="/openapi.json",
     contact={"name": "JalanGuard", "url": "https://jalanguard.org"},
+    lifespan=lifespan,
 )
 
 # 3. CORS — the dashboard and third-party integrators call this from the browser.
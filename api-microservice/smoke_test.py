@@ -2,16 +2,22 @@
 so we can exercise auth, field selection, media gating and pagination locally.
 Run:  .venv/Scripts/python.exe smoke_test.py
 """
+import asyncio
+import importlib.util
 import os
+import time
+import types
 
 os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
 os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role")
 os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000")  # high; 429 tested in isolation below
+os.environ.setdefault("API_KEY_USAGE_FLUSH_S", "3600")  # flushed by hand below
+os.environ.setdefault("HAZARDS_CACHE_TTL_S", "0")  # off; response cache tested in isolation below
 
 from fastapi.testclient import TestClient
 
 import app.core.database as db
-import app.middleware.auth as auth_mod
+import app.services.api_keys as keys_svc
 import app.services.reports_service as svc
 
 VALID_KEY = "jg_abcabcabcabcabca_" + "d" * 48
@@ -37,11 +43,40 @@ FAKE_ROWS = [
 ]
 
 
+QUERIES = []  # every hazards query built, for assertions on filters / paging
+IN_FLIGHT = [0, 0]  # [running now, most at once] across awaited fake calls
+
+
+class R:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+async def _round_trip(result):
+    """Yield to the event loop like a real HTTP call, tracking overlap."""
+    IN_FLIGHT[0] += 1
+    IN_FLIGHT[1] = max(IN_FLIGHT)
+    await asyncio.sleep(0.01)
+    IN_FLIGHT[0] -= 1
+    return result
+
+
 class FakeQuery:
     def __init__(self, table):
         self.table = table
+        self.filters = []
+        self.columns = None
+        self.count = None
+        self.head = False
+        self.window = slice(None)
+        if table == "hazards":
+            QUERIES.append(self)
 
     def select(self, *a, **k):
+        self.columns = a[0] if a else None
+        self.count = k.get("count")
+        self.head = bool(k.get("head"))
         return self
 
     def eq(self, *a, **k):
@@ -56,64 +91,83 @@ class FakeQuery:
     def ilike(self, *a, **k):
         return self
 
-    def or_(self, *a, **k):
+    def or_(self, filters, **k):
+        self.filters.append(filters)
         return self
 
     def order(self, *a, **k):
         return self
 
-    def range(self, *a, **k):
+    def range(self, start, end):
+        self.window = slice(start, end + 1)
+        return self
+
+    def limit(self, n):
+        self.window = slice(n)
         return self
 
-    def execute(self):
-        class R:
-            pass
+    async def execute(self):
+        if self.table != "hazards":
+            return await _round_trip(R([], 0))
+        if self.head:
+            return await _round_trip(R([], len(FAKE_ROWS)))
+        if self.columns == "updated_at":  # freshness watermark probe
+            return await _round_trip(R([{"updated_at": max(r["updated_at"] for r in FAKE_ROWS)}]))
+        rows = FAKE_ROWS
+        keyset = [f for f in self.filters if f.startswith("created_at.lt.")]
+        if keyset:  # rows after the cursor row, in list order
+            after_id = keyset[-1].rsplit("id.lt.", 1)[1].rstrip(")")
+            rows = rows[[str(r["id"]) for r in rows].index(after_id) + 1:]
+        return await _round_trip(R(rows[self.window]))
+
+
+def _owner(fn, params):
+    RPC_CALLS.append((fn, params))
+    raw = params.get("raw_key")
+    return "2de65c25-b393-47d0-8215-f61f2e901a26" if raw == VALID_KEY and raw not in REVOKED else None
 
-        r = R()
-        if self.table == "hazards":
-            r.data = FAKE_ROWS
-            r.count = 1
-        else:
-            r.data = []
-            r.count = 0
-        return r
+
+class FakeRpc:
+    def __init__(self, fn, params):
+        self.owner = _owner(fn, params)
+
+    async def execute(self):
+        return await _round_trip(R(self.owner))
 
 
 class FakeClient:
+    """Stands in for the async PostgREST client of the request path."""
+
     def table(self, name):
         return FakeQuery(name)
 
     def rpc(self, fn, params):
-        raw = params.get("raw_key")
+        return FakeRpc(fn, params)
 
-        class R:
-            pass
 
-        r = R()
-        r.data = "2de65c25-b393-47d0-8215-f61f2e901a26" if raw == VALID_KEY else None
-        return lambda: r  # placeholder, replaced below
+class FakeSyncClient:
+    """Stands in for the blocking client of the usage write-back thread."""
 
-    # rpc(...).execute() pattern
-    def rpc(self, fn, params):  # noqa: F811
-        raw = params.get("raw_key")
-        owner = "2de65c25-b393-47d0-8215-f61f2e901a26" if raw == VALID_KEY else None
+    def rpc(self, fn, params):
+        owner = _owner(fn, params)
 
         class Exec:
             def execute(self_inner):
-                class R:
-                    pass
-
-                r = R()
-                r.data = owner
-                return r
+                return R(owner)
 
         return Exec()
 
 
+PAGES = lambda: [q for q in QUERIES if not q.head and q.columns != "updated_at"]  # noqa: E731
+COUNTS = lambda: [q for q in QUERIES if q.head]  # noqa: E731
+RPC_CALLS = []
+REVOKED = set()
 fake = FakeClient()
-db.get_supabase = lambda: fake
-auth_mod.get_supabase = lambda: fake
-svc.get_supabase = lambda: fake
+real_get_postgrest = db.get_postgrest
+db.get_postgrest = lambda: fake
+keys_svc.get_postgrest = lambda: fake
+svc.get_postgrest = lambda: fake
+keys_svc.get_supabase = lambda: FakeSyncClient()
 
 from main import app  # import after patching
 
@@ -167,16 +221,265 @@ check("400 on unknown field", r.status_code == 400)
 # 7. limit bounds enforced (le=100)
 check("422 when limit over 100", client.get("/api/v1/hazards?limit=500", headers=H).status_code == 422)
 
-# 8. Rate limit → 429 once the per-key budget is exceeded.
-#    Tested in isolation: clear buckets and shrink the limit to 3 for this key.
-import app.middleware.rate_limit as rl
+# 8. Keyset pagination: opaque cursor, optional totals, offset mode unchanged
+FAKE_ROWS.extend(
+    dict(FAKE_ROWS[0], id=f"2222222{n}-2222-2222-2222-222222222222", created_at="2026-05-01T08:00:00.5+00:00")
+    for n in range(2)
+)
+r = client.get("/api/v1/hazards?limit=2", headers=H).json()
+check("offset page keeps exact total and offset", r["pagination"]["total"] == 3 and r["pagination"]["offset"] == 0)
+check("page fetches one extra row to detect more", PAGES()[-1].window == slice(0, 3) and r["pagination"]["has_more"])
+cursor = r["pagination"]["next_cursor"]
+QUERIES.clear()
+r = client.get(f"/api/v1/hazards?limit=2&cursor={cursor}", headers=H).json()
+check("cursor page filters after the last row's (created_at, id)",
+      PAGES()[-1].filters == ['created_at.lt."2026-05-01T08:00:00.500000+00:00",'
+                              'and(created_at.eq."2026-05-01T08:00:00.500000+00:00",'
+                              'id.lt.22222220-2222-2222-2222-222222222222)'])
+check("cursor page skips the count and omits offset/total",
+      not COUNTS() and PAGES()[-1].window == slice(3)
+      and "total" not in r["pagination"] and "offset" not in r["pagination"])
+r = client.get("/api/v1/hazards?limit=5&total=estimated", headers=H).json()
+check("estimated total flagged, no cursor on the last page",
+      COUNTS()[-1].count == "estimated" and r["pagination"]["total_estimated"] is True
+      and "next_cursor" not in r["pagination"] and r["pagination"]["has_more"] is False)
+check("400 on malformed cursor", client.get("/api/v1/hazards?cursor=bogus", headers=H).status_code == 400)
+check("400 on cursor plus offset",
+      client.get(f"/api/v1/hazards?cursor={cursor}&offset=5", headers=H).status_code == 400)
+del FAKE_ROWS[1:]
+
+# 9. Key verification cache: hashed keys, negative caching, batched last_used_at
+keys_svc._valid_keys.cache_clear()
+keys_svc._invalid_keys.cache_clear()
+RPC_CALLS.clear()
+for key in (VALID_KEY, VALID_KEY, VALID_KEY, "jg_bad_key", "jg_bad_key"):
+    client.get("/api/v1/hazards", headers={"Authorization": f"Bearer {key}"})
+verifies = [params for fn, params in RPC_CALLS if fn == "verify_api_key"]
+check("each key verified once, then answered from cache (valid and invalid)",
+      [p["raw_key"] for p in verifies] == [VALID_KEY, "jg_bad_key"])
+check("verification no longer stamps last_used_at per request",
+      all(p["stamp_last_used"] is False for p in verifies))
+check("cache keyed by hash, never the plaintext key",
+      VALID_KEY not in str(list(keys_svc._valid_keys()._entries)))
+check("usage flushed as one batched write", keys_svc.usage_recorder().flush() == 1
+      and [p["usage"][0]["public_id"] for fn, p in RPC_CALLS if fn == "touch_api_keys"] == ["abcabcabcabcabca"])
+check("nothing left to flush", keys_svc.usage_recorder().flush() == 0)
+
 from app.core.config import get_settings
 
-rl._BUCKETS.clear()
+get_settings().api_key_cache_ttl_s = 0.05
+keys_svc._valid_keys.cache_clear()
+client.get("/api/v1/hazards", headers=H)
+REVOKED.add(VALID_KEY)
+cached = client.get("/api/v1/hazards", headers=H).status_code
+time.sleep(0.1)
+check("revoked key stops working once its cache entry expires",
+      cached == 200 and client.get("/api/v1/hazards", headers=H).status_code == 401)
+REVOKED.clear()
+get_settings().api_key_cache_ttl_s = 60.0
+keys_svc._valid_keys.cache_clear()
+keys_svc._invalid_keys.cache_clear()
+
+# 10. Rate limit → 429 once the per-key budget is exceeded.
+#    Tested in isolation: clear buckets and shrink the limit to 3 for this key.
+from app.services.rate_limiter import MemoryRateLimiter, RedisRateLimiter, get_rate_limiter
+
+get_rate_limiter().clear()
 get_settings().rate_limit_per_minute = 3
-codes = [client.get("/api/v1/hazards", headers=H).status_code for _ in range(6)]
+responses = [client.get("/api/v1/hazards", headers=H) for _ in range(6)]
+codes = [r.status_code for r in responses]
 check("first 3 requests allowed", codes[:3] == [200, 200, 200])
 check("429 after limit exceeded", codes[3] == 429 and codes[-1] == 429)
+check("X-RateLimit headers on successful responses too",
+      [r.headers.get("x-ratelimit-remaining") for r in responses[:3]] == ["2", "1", "0"]
+      and responses[0].headers["x-ratelimit-limit"] == "3" and 0 < int(responses[0].headers["x-ratelimit-reset"]) <= 60)
+check("429 carries Retry-After and the limit headers",
+      int(responses[3].headers["retry-after"]) >= 1 and responses[3].headers["x-ratelimit-remaining"] == "0")
+check("rate-limit state keyed by hash, not the plaintext key", VALID_KEY not in str(get_rate_limiter()._state))
+
+
+# 11. Rate-limit algorithms, same contract on every backend
+async def limiter_contract(make, label):
+    limiter = make("fixed_window")
+    hits = [await limiter.hit("k", 3, 60) for _ in range(4)]
+    check(f"{label} fixed window: 3 allowed, then denied until the window ends",
+          [h.allowed for h in hits] == [True, True, True, False] and hits[2].remaining == 0
+          and 0 < hits[3].retry_after_s <= 60)
+
+    limiter = make("sliding_log")
+    hits = [await limiter.hit("k", 2, 0.3) for _ in range(3)]
+    await asyncio.sleep(0.35)
+    later = await limiter.hit("k", 2, 0.3)
+    check(f"{label} sliding log: denied while full, allowed once the oldest request leaves",
+          [h.allowed for h in hits] == [True, True, False] and 0 < hits[2].retry_after_s <= 0.3
+          and later.allowed and later.remaining == 1)
+
+    limiter = make("token_bucket")
+    hits = [await limiter.hit("k", 4, 0.4) for _ in range(5)]
+    await asyncio.sleep(0.15)
+    later = await limiter.hit("k", 4, 0.4)
+    check(f"{label} token bucket: burst of 4, then refills at limit/window",
+          [h.allowed for h in hits] == [True] * 4 + [False] and 0 < hits[4].retry_after_s <= 0.1
+          and later.allowed and hits[0].remaining == 3)
+
+
+asyncio.run(limiter_contract(MemoryRateLimiter, "memory"))
+try:
+    import fakeredis  # local Redis stand-in (needs the lua extra)
+
+    asyncio.run(limiter_contract(lambda algorithm: RedisRateLimiter(fakeredis.FakeAsyncRedis(), algorithm), "redis"))
+except ImportError:
+    print("SKIP - redis backend contract (pip install 'fakeredis[lua]' to run it)")
+
+limiter = MemoryRateLimiter("fixed_window")
+for n in range(100):
+    asyncio.run(limiter.hit(f"key{n}", 3, 0.05))
+time.sleep(0.1)
+asyncio.run(limiter.hit("fresh", 3, 0.05))
+check("memory backend evicts keys whose window has passed", len(limiter) == 1)
+
+
+async def mixed_windows(algorithm):
+    """An hourly export budget must survive sweeps triggered by per-minute hits."""
+    limiter = MemoryRateLimiter(algorithm)
+    clock[0] = 1_000_000.0
+    await limiter.hit("k", 1000, 60)
+    exports = [await limiter.hit("export:k", 2, 3600) for _ in range(2)]
+    clock[0] += 61
+    await limiter.hit("k", 1000, 60)
+    return [h.allowed for h in exports] == [True, True] and not (await limiter.hit("export:k", 2, 3600)).allowed
+
+
+import app.services.rate_limiter as rate_limiter_mod
+
+clock = [0.0]
+rate_limiter_mod.time = types.SimpleNamespace(time=lambda: clock[0])
+for algorithm in ("fixed_window", "sliding_log", "token_bucket"):
+    check(f"{algorithm}: per-minute sweep keeps the hourly export budget",
+          asyncio.run(mixed_windows(algorithm)))
+rate_limiter_mod.time = time
+
+# 12. Async data path: pooled client settings, count and page fetched concurrently
+get_settings().rate_limit_per_minute = 1000
+IN_FLIGHT[1] = 0
+QUERIES.clear()
+r = client.get("/api/v1/hazards?limit=5", headers=H)
+check("exact total counted by a HEAD query alongside the page",
+      r.json()["pagination"]["total"] == 1 and len(COUNTS()) == 1 and len(PAGES()) == 1)
+check("count and page queries in flight at the same time", IN_FLIGHT[1] == 2)
+
+get_settings().supabase_pool_size = 7
+pooled = real_get_postgrest()
+pool = pooled.session._transport._pool
+check("one shared PostgREST client per process", real_get_postgrest() is pooled)
+check("pool size, keep-alive and timeouts come from Settings",
+      pool._max_connections == 7 and pool._keepalive_expiry == 30.0
+      and pooled.session.timeout.connect == 3.0 and pooled.session.timeout.pool == 5.0)
+check("HTTP/2 enabled when h2 is installed",
+      pool._http2 == (importlib.util.find_spec("h2") is not None))
+check("service-role credentials sent on every call",
+      pooled.session.headers["apikey"] == "test-service-role"
+      and str(pooled.session.base_url) == "https://example.supabase.co/rest/v1/")
+db.get_postgrest = real_get_postgrest
+asyncio.run(db.close_postgrest())
+check("shutdown closes the pool", pooled.session.is_closed and real_get_postgrest() is not pooled)
+
+# 13. Response cache: ETag / 304 without Supabase, invalidated by the watermark
+from app.services import response_cache
+
+get_settings().hazards_cache_ttl_s = 60.0
+get_settings().hazards_cache_check_s = 3600.0
+response_cache._pages.cache_clear()
+response_cache._watermark.cache_clear()
+first = client.get("/api/v1/hazards?severity=high&fields=severity,category", headers=H)
+etag = first.headers.get("etag", "")
+check("weak ETag and revalidating Cache-Control on pages",
+      etag.startswith('W/"') and len(etag) == 36 and first.headers["cache-control"] == "private, no-cache"
+      and "x-ratelimit-remaining" in first.headers)
+QUERIES.clear()
+unchanged = client.get("/api/v1/hazards?severity=high&fields=severity,category",
+                       headers={**H, "If-None-Match": etag})
+check("matching If-None-Match → empty 304 with the same ETag",
+      unchanged.status_code == 304 and unchanged.content == b"" and unchanged.headers["etag"] == etag)
+again = client.get("/api/v1/hazards?fields=category,severity&severity=high", headers=H)
+check("unchanged polls (any param order) answered from cache, no Supabase query",
+      again.status_code == 200 and again.content == first.content and not QUERIES)
+check("weak and wildcard validators match too",
+      response_cache.etag_matches(f'"x", {etag}', etag) and response_cache.etag_matches(etag[2:], etag)
+      and response_cache.etag_matches("*", etag)
+      and not response_cache.etag_matches('"other"', etag))
+response_cache._pages.cache_clear()
+response_cache._watermark.cache_clear()  # a freshly started worker
+QUERIES.clear()
+cold = client.get("/api/v1/hazards?severity=high&fields=severity,category", headers={**H, "If-None-Match": etag})
+check("matching If-None-Match on a cold worker → 304 after the watermark probe alone",
+      cold.status_code == 304 and cold.headers["etag"] == etag
+      and [q.columns for q in QUERIES] == ["updated_at"])
+
+get_settings().hazards_cache_check_s = 0.0
+
+
+async def concurrent_polls():
+    return await asyncio.gather(*(response_cache._watermark().current() for _ in range(5)))
+
+
+QUERIES.clear()
+marks = asyncio.run(concurrent_polls())
+check("concurrent polls past the check interval share one watermark probe",
+      len(QUERIES) == 1 and marks == [FAKE_ROWS[0]["updated_at"]] * 5)
+FAKE_ROWS[0]["defect_type"], FAKE_ROWS[0]["updated_at"] = "crack", "2026-06-03T10:00:00+00:00"
+QUERIES.clear()
+edited = client.get("/api/v1/hazards?severity=high&fields=severity,category", headers={**H, "If-None-Match": etag})
+check("a newer updated_at invalidates the cached page",
+      len(PAGES()) == 1 and edited.status_code == 200
+      and edited.json()["data"][0]["category"] == "crack" and edited.headers["etag"] != etag)
+FAKE_ROWS[0]["defect_type"] = "pothole"
+check("cache is bounded", len(response_cache._pages()) <= get_settings().hazards_cache_entries)
+get_settings().hazards_cache_ttl_s = 0.0
+uncached = client.get("/api/v1/hazards?severity=high&fields=severity,category", headers=H)
+check("cache off: strong ETag digest of the body",
+      uncached.headers["etag"] == response_cache.make_etag(uncached.content))
+
+# 14. Bulk export: streamed in keyset batches, its own rate-limit budget
+import csv
+import io
+import json
+
+FAKE_ROWS.extend(
+    dict(FAKE_ROWS[0], id=f"3333333{n}-3333-3333-3333-333333333333", defect_type="crack", image_urls=[])
+    for n in range(4)
+)
+get_settings().export_batch_size = 2
+get_settings().export_rate_limit_per_hour = 2
+get_rate_limiter().clear()
+QUERIES.clear()
+r = client.get("/api/v1/hazards/export?fields=category", headers=H)
+lines = r.text.splitlines()
+check("export streams every row as NDJSON, chunked",
+      r.status_code == 200 and r.headers["content-type"] == "application/x-ndjson"
+      and "content-length" not in r.headers and r.text.endswith("\n")
+      and [json.loads(line)["id"] for line in lines] == [str(row["id"]) for row in FAKE_ROWS]
+      and set(json.loads(lines[0])) == {"id", "category"})
+check("read in batch-sized keyset pages, no counts",
+      [q.window for q in PAGES()] == [slice(2)] * 3 and not COUNTS()
+      and [len(q.filters) for q in PAGES()] == [0, 1, 1])
+r = client.get("/api/v1/hazards/export?format=csv&fields=category,media&include_media=true", headers=H)
+rows = list(csv.reader(io.StringIO(r.text)))
+check("CSV export: header of id + selected fields, media URLs space-separated",
+      r.headers["content-type"].startswith("text/csv") and rows[0] == ["id", "category", "media"]
+      and rows[1][2] == "https://bucket/img1.jpg https://bucket/img2.jpg" and rows[-1][1:] == ["crack", ""]
+      and len(rows) == len(FAKE_ROWS) + 1 and "attachment" in r.headers["content-disposition"])
+limited = client.get("/api/v1/hazards/export", headers=H)
+check("exports metered on their own hourly budget",
+      limited.status_code == 429 and "per hour" in limited.json()["detail"]
+      and r.headers["x-ratelimit-limit"] == "2"
+      and client.get("/api/v1/hazards", headers=H).headers["x-ratelimit-limit"] == "1000")
+get_rate_limiter().clear()
+check("export validates format and fields like the list endpoint",
+      client.get("/api/v1/hazards/export?format=xml", headers=H).status_code == 422
+      and client.get("/api/v1/hazards/export?fields=bogus", headers=H).status_code == 400
+      and "/api/v1/hazards/export" in app.openapi()["paths"])
+del FAKE_ROWS[1:]
 
 print("\nRESULT:", "ALL PASS" if not failures else f"{len(failures)} FAILURES: {failures}")
 raise SystemExit(1 if failures else 0)
@@ -0,0 +1,137 @@
+"""
+Benchmark of the AI service's cascade mode (CASCADE_ENABLED) against
+full-resolution-only inference on the evaluation image set.
+
+Every image is decoded exactly as the service does (fast decode to IMGSZ),
+run once at full resolution and once through the cascade: a low-resolution
+pass at CASCADE_IMGSZ, whose verdict (confidently empty / confidently
+positive / ambiguous) is made by the service's own ``cascade_verdict``;
+ambiguous images are charged the full-resolution pass as well. Both final
+results go through the service's custom NMS + aggregation, and the report
+shows throughput for each mode, how often each cascade path was taken, and
+how often the cascade's answer agrees with full-resolution-only inference.
+
+    python benchmark-cascade.py
+    python benchmark-cascade.py --onnx best.onnx --cascade-imgsz 256 --accept-conf 0.7
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# Reuse the service code directly so this measures exactly what is deployed.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "ai-microservice"))
+
+from app.core.config import Settings  # noqa: E402
+from app.services.backends import load_backend  # noqa: E402
+from app.services.postprocess import build_class_table, cascade_verdict, postprocess  # noqa: E402
+from app.services.preprocess import decode_image, to_original  # noqa: E402
+
+# ==========================================
+# ⚙️ CONFIGURATION & THRESHOLDS
+# ==========================================
+MODEL_PATH = "best.pt"
+INPUT_DIR = "test_images"
+
+IMGSZ = 640
+CONF_THRESHOLD = 0.25
+IOMIN_THRESHOLD = 0.45
+
+# Service defaults (app/core/config.py)
+CASCADE_IMGSZ = 320
+CASCADE_EMPTY_CONF = 0.10
+CASCADE_ACCEPT_CONF = 0.60
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascade vs full-resolution throughput and agreement.")
+    parser.add_argument("--weights", default=MODEL_PATH, help="torch weights (ignored with --onnx).")
+    parser.add_argument("--onnx", help="Benchmark the onnx backend with this graph instead.")
+    parser.add_argument("--images", default=INPUT_DIR)
+    parser.add_argument("--cascade-imgsz", type=int, default=CASCADE_IMGSZ)
+    parser.add_argument("--empty-conf", type=float, default=CASCADE_EMPTY_CONF)
+    parser.add_argument("--accept-conf", type=float, default=CASCADE_ACCEPT_CONF)
+    args = parser.parse_args()
+
+    if args.onnx:
+        backend = load_backend(Settings(inference_backend="onnx", onnx_model_path=args.onnx, imgsz=IMGSZ))
+    else:
+        backend = load_backend(Settings(inference_backend="torch", model_path=args.weights, imgsz=IMGSZ))
+    classes = build_class_table(backend.names)
+
+    image_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+    image_files = sorted(f for f in Path(args.images).iterdir() if f.suffix.lower() in image_extensions)
+    if not image_files:
+        print(f"❌ Error: No images found in '{args.images}'.")
+        return 1
+
+    def full(array):
+        return backend.predict([array], CONF_THRESHOLD, IMGSZ)[0]
+
+    def low(array):
+        return backend.predict([array], args.empty_conf, args.cascade_imgsz)[0]
+
+    # Untimed warm-up of both input sizes.
+    warm = decode_image(image_files[0].read_bytes(), IMGSZ).array
+    full(warm)
+    low(warm)
+
+    paths = Counter()
+    agree = {"detected": 0, "types": 0, "severity": 0, "exact": 0}
+    full_s = cascade_s = 0.0
+    for img_path in image_files:
+        decoded = decode_image(img_path.read_bytes(), IMGSZ)
+
+        raw_full, t_full = timed(full, decoded.array)
+        raw_low, t_low = timed(low, decoded.array)
+        full_s += t_full
+        cascade_s += t_low
+
+        verdict = cascade_verdict(raw_low, args.accept_conf)
+        if verdict is None:
+            path, raw_cascade = "full_res", raw_full
+            cascade_s += t_full  # an escalated image pays for both passes
+        else:
+            path, raw_cascade = f"low_res_{verdict}", raw_low
+        paths[path] += 1
+
+        expected = postprocess(to_original(raw_full, decoded), classes, IOMIN_THRESHOLD)
+        actual = postprocess(to_original(raw_cascade, decoded), classes, IOMIN_THRESHOLD)
+        agree["detected"] += expected.detected == actual.detected
+        agree["types"] += expected.defect_types == actual.defect_types
+        agree["severity"] += expected.severity == actual.severity
+        agree["exact"] += expected == actual
+
+        status = "✅" if expected.detected == actual.detected else "❌"
+        print(f"  {status} {img_path.name:<35} {path:<18} "
+              f"full {expected.detection_count} / cascade {actual.detection_count} box(es)")
+
+    n = len(image_files)
+    print(f"""
+    {'='*60}
+     CASCADE BENCHMARK ({args.cascade_imgsz}px, empty < {args.empty_conf}, accept >= {args.accept_conf})
+    {'='*60}
+     Images:                    {n}
+     Full-res only:             {n / full_s:6.1f} img/s
+     Cascade:                   {n / cascade_s:6.1f} img/s  ({full_s / cascade_s:.2f}x)
+
+     Path taken:                low-res empty {paths['low_res_empty']}, low-res positive {paths['low_res_positive']}, escalated {paths['full_res']}
+     Agreement with full-res:
+       hazard / no hazard:      {agree['detected']}/{n}
+       defect types:            {agree['types']}/{n}
+       severity:                {agree['severity']}/{n}
+       identical result:        {agree['exact']}/{n}
+    {'='*60}
+    """)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
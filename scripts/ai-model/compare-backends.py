@@ -0,0 +1,198 @@
+"""
+Accuracy/latency comparison between two variants of the AI service's model —
+torch vs ONNX (export parity), or FP32 vs INT8 (quantize-model.py).
+
+Runs both variants over the same sample images used by model-testing.py
+(test_images/), pushes each variant's raw boxes through the service's own
+custom NMS + aggregation, and compares the final detections image by image:
+same box count, same type/severity per box, matched boxes overlapping by at
+least BOX_IOU_MIN and confidences within CONF_TOLERANCE. Each inference is
+timed (after one untimed warm-up call per variant), and the summary reports
+per-image latency percentiles, throughput, and how many post-NMS detections
+changed type or severity, appeared or disappeared.
+
+A variant is ``backend:path``:
+
+    python compare-backends.py                                   # torch:best.pt vs onnx:best.onnx
+    python compare-backends.py --reference onnx:best.onnx --candidate onnx:best.int8.onnx \\
+        --report-only --csv int8-report.csv
+
+Exits non-zero when any image disagrees, so it can gate a model re-export;
+``--report-only`` always exits 0 (for weighing an accuracy/latency trade-off).
+"""
+import argparse
+import csv
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Reuse the service code directly so this checks exactly what is deployed.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "ai-microservice"))
+
+from app.core.config import Settings  # noqa: E402
+from app.services.backends import load_backend  # noqa: E402
+from app.services.postprocess import build_class_table, postprocess  # noqa: E402
+
+# ==========================================
+# ⚙️ CONFIGURATION & THRESHOLDS
+# ==========================================
+REFERENCE = "torch:best.pt"
+CANDIDATE = "onnx:best.onnx"
+INPUT_DIR = "test_images"
+
+CONF_THRESHOLD = 0.25
+IOMIN_THRESHOLD = 0.45
+
+BOX_IOU_MIN = 0.90      # Matched boxes must overlap at least this much
+CONF_TOLERANCE = 0.05   # Max |Δconfidence| between matched boxes
+
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare(expected, actual):
+    """Return (human-readable differences, change counts); no differences = parity."""
+    problems = []
+    changes = {"type": 0, "severity": 0, "missing": 0, "extra": 0}
+    if expected.detection_count != actual.detection_count:
+        problems.append(f"count {expected.detection_count} vs {actual.detection_count}")
+
+    unmatched = list(actual.detections)
+    for det in expected.detections:
+        best = max(unmatched, key=lambda d: box_iou(det.box, d.box), default=None)
+        if best is None or box_iou(det.box, best.box) < BOX_IOU_MIN:
+            problems.append(f"no match for {det.type}-{det.severity} {det.box}")
+            changes["missing"] += 1
+            continue
+        unmatched.remove(best)
+        if (det.type, det.severity) != (best.type, best.severity):
+            problems.append(f"{det.type}-{det.severity} became {best.type}-{best.severity}")
+            changes["type"] += det.type != best.type
+            changes["severity"] += det.type == best.type and det.severity != best.severity
+        if abs(det.confidence - best.confidence) > CONF_TOLERANCE:
+            problems.append(f"confidence {det.confidence:.3f} vs {best.confidence:.3f}")
+    changes["extra"] = len(unmatched)
+    return problems, changes
+
+
+def load_rgb(path):
+    """Decode exactly as the service does: EXIF orientation, then RGB."""
+    with Image.open(io.BytesIO(path.read_bytes())) as pil:
+        return np.asarray(ImageOps.exif_transpose(pil).convert("RGB"))
+
+
+def load_variant(spec):
+    """``torch:best.pt`` / ``onnx:best.int8.onnx`` -> a loaded service backend."""
+    backend, _, path = spec.partition(":")
+    if backend not in ("torch", "onnx") or not path:
+        raise SystemExit(f"❌ Bad variant '{spec}': expected torch:<weights.pt> or onnx:<graph.onnx>.")
+    if backend == "torch":
+        return load_backend(Settings(inference_backend="torch", model_path=path))
+    return load_backend(Settings(inference_backend="onnx", onnx_model_path=path))
+
+
+def run(backend, image, classes):
+    """One timed inference + the service's post-processing; (result, ms)."""
+    started = time.perf_counter()
+    result = postprocess(backend.predict([image], CONF_THRESHOLD)[0], classes, IOMIN_THRESHOLD)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def latency_summary(label, spec, latencies_ms):
+    lat = np.asarray(latencies_ms)
+    print(f"  {label:<10} {spec:<32} p50 {np.percentile(lat, 50):7.1f} ms  "
+          f"p95 {np.percentile(lat, 95):7.1f} ms  {1000 * len(lat) / lat.sum():6.1f} img/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two model variants' output and speed.")
+    parser.add_argument("--reference", default=REFERENCE, help="Baseline variant (backend:path).")
+    parser.add_argument("--candidate", default=CANDIDATE, help="Variant under test (backend:path).")
+    parser.add_argument("--images", default=INPUT_DIR)
+    parser.add_argument("--csv", help="Write a per-image report to this CSV file.")
+    parser.add_argument("--report-only", action="store_true",
+                        help="Always exit 0; report differences without failing.")
+    args = parser.parse_args()
+
+    reference = load_variant(args.reference)
+    candidate = load_variant(args.candidate)
+    classes = build_class_table(reference.names)
+
+    image_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+    image_files = sorted(f for f in Path(args.images).iterdir() if f.suffix.lower() in image_extensions)
+    if not image_files:
+        print(f"❌ Error: No images found in '{args.images}'.")
+        return 1
+
+    # Untimed warm-up so neither side is charged for first-call initialisation.
+    warm = load_rgb(image_files[0])
+    run(reference, warm, classes)
+    run(candidate, warm, classes)
+
+    failures = 0
+    totals = {"type": 0, "severity": 0, "missing": 0, "extra": 0}
+    reference_ms, candidate_ms, rows = [], [], []
+    for img_path in image_files:
+        image = load_rgb(img_path)
+        expected, ref_ms = run(reference, image, classes)
+        actual, cand_ms = run(candidate, image, classes)
+        reference_ms.append(ref_ms)
+        candidate_ms.append(cand_ms)
+
+        problems, changes = compare(expected, actual)
+        for key, value in changes.items():
+            totals[key] += value
+        failures += bool(problems)
+        rows.append({
+            "image": img_path.name,
+            "reference_ms": round(ref_ms, 2),
+            "candidate_ms": round(cand_ms, 2),
+            "reference_boxes": expected.detection_count,
+            "candidate_boxes": actual.detection_count,
+            "type_changed": changes["type"],
+            "severity_changed": changes["severity"],
+            "missing": changes["missing"],
+            "extra": changes["extra"],
+            "problems": "; ".join(problems),
+        })
+
+        status = "❌" if problems else "✅"
+        print(f"  {status} {img_path.name:<35} {expected.detection_count} box(es) "
+              f"{ref_ms:7.1f} → {cand_ms:7.1f} ms"
+              + (f"  [{'; '.join(problems)}]" if problems else ""))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    reference_boxes = sum(row["reference_boxes"] for row in rows)
+    print(f"""
+    {'='*60}
+     {len(image_files) - failures}/{len(image_files)} images at parity.
+    {'='*60}""")
+    latency_summary("reference", args.reference, reference_ms)
+    latency_summary("candidate", args.candidate, candidate_ms)
+    print(f"""  speed-up   {np.sum(reference_ms) / np.sum(candidate_ms):.2f}x
+
+     Post-NMS detections (reference total: {reference_boxes})
+       type changed:      {totals['type']}
+       severity changed:  {totals['severity']}
+       missing:           {totals['missing']}
+       extra:             {totals['extra']}
+    {'='*60}""" + (f"\n     Per-image report saved to: {args.csv}" if args.csv else ""))
+    return 0 if args.report_only or not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
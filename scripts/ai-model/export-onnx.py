@@ -0,0 +1,50 @@
+"""
+One-shot export of the trained YOLO weights to an ONNX graph for the AI
+service's onnxruntime backend (INFERENCE_BACKEND=onnx).
+
+    python export-onnx.py                      # best.pt -> best.onnx
+    python export-onnx.py --weights path/to/best.pt --imgsz 640
+
+The graph is exported with dynamic batch/spatial axes so the service's
+micro-batcher can send several images per forward pass. ultralytics embeds the
+class names and input size in the graph metadata, which the backend reads back.
+Copy the resulting .onnx file next to best.pt in ai-microservice/.
+"""
+import argparse
+from pathlib import Path
+
+from ultralytics import YOLO
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+MODEL_PATH = "best.pt"
+IMGSZ = 640       # Must match the training imgsz
+OPSET = 17        # Supported by every onnxruntime release since 1.14
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export best.pt to ONNX for the AI service.")
+    parser.add_argument("--weights", default=MODEL_PATH, help="Path to the trained .pt weights.")
+    parser.add_argument("--imgsz", type=int, default=IMGSZ, help="Model input size.")
+    parser.add_argument("--opset", type=int, default=OPSET, help="ONNX opset version.")
+    parser.add_argument("--static", action="store_true",
+                        help="Export fixed 1x3xIMGSZxIMGSZ input instead of dynamic axes.")
+    args = parser.parse_args()
+
+    model = YOLO(args.weights)
+    output = model.export(
+        format="onnx",
+        imgsz=args.imgsz,
+        opset=args.opset,
+        dynamic=not args.static,
+        simplify=True,
+    )
+
+    size_mb = Path(output).stat().st_size / 1e6
+    print(f"✅ Exported {args.weights} -> {output} ({size_mb:.1f} MB)")
+    print("   Serve it with INFERENCE_BACKEND=onnx (ONNX_MODEL_PATH defaults to best.onnx).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,33 @@
+"""
+FYP evaluation of the trained YOLO model over a folder of test images: custom
+cross-class NMS, annotated images, per-image results and report charts.
+
+Runs as a pipeline so regression sets of a few thousand images finish quickly:
+a pool of prefetch threads decodes images ahead of the model, the model is
+called on batches of BATCH_SIZE images, and annotation drawing + JPEG writing
+happen on a background writer pool. Per-image results are written to a
+machine-readable file (JSON, or CSV by extension) in sorted filename order, so
+CI can diff two runs.
+
+    python model-testing.py
+    python model-testing.py --images regression_set --batch 16 --no-annotate --results run.csv
+
+ultralytics letterboxes a batch of differently-sized images to a common square
+shape, so boxes can differ marginally from one-image-at-a-time inference;
+``--batch 1`` reproduces the original sequential results exactly.
+"""
+import argparse
+import csv
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import cv2
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-from pathlib import Path
 from ultralytics import YOLO
 
 # ==========================================
@@ -14,9 +38,16 @@ INPUT_DIR = "test_images"
 OUTPUT_DIR = "annotated_results"
 CHARTS_DIR = "report_charts"
 
+RESULTS_PATH = "evaluation_results.json"
+
 CONF_THRESHOLD = 0.25
 IOMIN_THRESHOLD = 0.45  # Overlap tolerance (lower = more aggressive removal)
 
+# Pipeline sizing
+BATCH_SIZE = 8          # Images per model call
+DECODE_WORKERS = 4      # Prefetch threads (cv2.imread releases the GIL)
+WRITE_WORKERS = 4       # Annotation + cv2.imwrite threads
+
 # BGR Styling for OpenCV Annotations
 CLASS_COLOURS = {
     "crack-high":     (0, 0, 220),
@@ -153,21 +184,103 @@ def generate_academic_charts(stats, class_counts, confidences):
         plt.close()
 
 
+# ==========================================
+# 🖼️ PIPELINE STAGES: DECODE, ANNOTATE, RESULTS
+# ==========================================
+def prefetch_batches(image_files, batch_size, workers):
+    """Yield (paths, images) batches in file order while a thread pool decodes
+    the next images ahead of the model. Unreadable files come back as None."""
+    lookahead = batch_size * 2
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") as pool:
+        pending = deque()
+        files = iter(image_files)
+        for img_path in files:
+            pending.append((img_path, pool.submit(cv2.imread, str(img_path))))
+            if len(pending) >= lookahead:
+                break
+        batch = []
+        while pending:
+            img_path, future = pending.popleft()
+            next_path = next(files, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(cv2.imread, str(next_path))))
+            batch.append((img_path, future.result()))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def annotate_and_save(img, final_detections, out_path):
+    """Draw the surviving boxes and label tags, then write the JPEG."""
+    for det in final_detections:
+        x1, y1, x2, y2 = det["x1"], det["y1"], det["x2"], det["y2"]
+        colour = CLASS_COLOURS.get(det["label"], DEFAULT_COLOUR)
+
+        # Draw Bounding Box
+        cv2.rectangle(img, (x1, y1), (x2, y2), colour, 2)
+
+        # Draw Label Tag
+        display_text = f"{det['label']} {det['conf']:.2f}"
+        (text_w, text_h), baseline = cv2.getTextSize(display_text, cv2.FONT_HERSHEY_SIMPLEX, 0.55, 1)
+        cv2.rectangle(img, (x1, y1 - text_h - baseline - 6), (x1 + text_w + 6, y1), colour, -1)
+        cv2.putText(img, display_text, (x1 + 3, y1 - baseline - 3),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 1, cv2.LINE_AA)
+
+    cv2.imwrite(str(out_path), img)
+
+
+def write_results(rows, path):
+    """Per-image results as JSON (full detail) or CSV (one row per image)."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["image", "raw_detections", "final_detections", "exemptions", "labels", "confidences", "boxes"])
+            for row in rows:
+                dets = row["detections"]
+                writer.writerow([
+                    row["image"], row["raw_detections"], row["final_detections"], row["exemptions"],
+                    ";".join(d["label"] for d in dets),
+                    ";".join(f"{d['conf']:.4f}" for d in dets),
+                    ";".join(" ".join(map(str, d["box"])) for d in dets),
+                ])
+    else:
+        path.write_text(json.dumps(rows, indent=2))
+
+
 # ==========================================
 # 🚀 MAIN EXECUTION WORKFLOW
 # ==========================================
 def main():
+    parser = argparse.ArgumentParser(description="Pipelined FYP evaluation of the YOLO model.")
+    parser.add_argument("--weights", default=MODEL_PATH)
+    parser.add_argument("--images", default=INPUT_DIR)
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Folder for annotated images.")
+    parser.add_argument("--results", default=RESULTS_PATH,
+                        help="Per-image results file (.json, or .csv).")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="Images per model call.")
+    parser.add_argument("--decode-workers", type=int, default=DECODE_WORKERS)
+    parser.add_argument("--write-workers", type=int, default=WRITE_WORKERS)
+    parser.add_argument("--no-annotate", action="store_true",
+                        help="Skip drawing and saving annotated images entirely.")
+    parser.add_argument("--no-charts", action="store_true", help="Skip the report charts.")
+    args = parser.parse_args()
+
     # Setup directories
-    Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
-    Path(CHARTS_DIR).mkdir(parents=True, exist_ok=True)
+    if not args.no_annotate:
+        Path(args.output).mkdir(parents=True, exist_ok=True)
+    if not args.no_charts:
+        Path(CHARTS_DIR).mkdir(parents=True, exist_ok=True)
 
     # Load Model & Validate Input Directory
-    model = YOLO(MODEL_PATH)
+    model = YOLO(args.weights)
     image_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
-    image_files = [f for f in Path(INPUT_DIR).iterdir() if f.suffix.lower() in image_extensions]
+    image_files = sorted(f for f in Path(args.images).iterdir() if f.suffix.lower() in image_extensions)
 
     if not image_files:
-        print(f"❌ Error: No images found in '{INPUT_DIR}'.")
+        print(f"❌ Error: No images found in '{args.images}'.")
         return
 
     print(f"✅ Found {len(image_files)} images. Initializing evaluation...\n")
@@ -176,81 +289,102 @@ def main():
     stats = {'total_before': 0, 'total_after': 0, 'total_removed': 0, 'images_with_hazards': 0, 'total_exemptions': 0}
     all_confidences = []
     class_counts = {k: 0 for k in CLASS_COLOURS.keys()}
+    rows = []
+    processed = 0
+
+    writers = None if args.no_annotate else ThreadPoolExecutor(
+        max_workers=args.write_workers, thread_name_prefix="write"
+    )
+    pending_writes = deque()
 
     # Process Dataset
-    for img_path in sorted(image_files):
-        img = cv2.imread(str(img_path))
-        if img is None:
+    for batch in prefetch_batches(image_files, args.batch, args.decode_workers):
+        batch = [(img_path, img) for img_path, img in batch if img is not None]
+        if not batch:
             continue
 
-        # 1. Raw Inference
-        results = model(img, conf=CONF_THRESHOLD, verbose=False)[0]
-        
-        raw_detections = []
-        for box in results.boxes:
-            raw_detections.append({
-                "x1": int(box.xyxy[0][0]), "y1": int(box.xyxy[0][1]), 
-                "x2": int(box.xyxy[0][2]), "y2": int(box.xyxy[0][3]),
-                "conf": float(box.conf[0]), 
-                "label": model.names[int(box.cls[0])]
+        # 1. Raw Inference (one call per batch)
+        results = model([img for _, img in batch], conf=CONF_THRESHOLD, verbose=False)
+
+        for (img_path, img), result in zip(batch, results):
+            processed += 1
+            raw_detections = []
+            for box in result.boxes:
+                raw_detections.append({
+                    "x1": int(box.xyxy[0][0]), "y1": int(box.xyxy[0][1]),
+                    "x2": int(box.xyxy[0][2]), "y2": int(box.xyxy[0][3]),
+                    "conf": float(box.conf[0]),
+                    "label": model.names[int(box.cls[0])]
+                })
+
+            stats['total_before'] += len(raw_detections)
+
+            # 2. Filter Detections via Custom NMS
+            final_detections, exemptions = apply_custom_nms(raw_detections, IOMIN_THRESHOLD)
+            stats['total_exemptions'] += exemptions
+            stats['total_after'] += len(final_detections)
+            stats['total_removed'] += (len(raw_detections) - len(final_detections))
+
+            if final_detections:
+                stats['images_with_hazards'] += 1
+
+            # 3. Log Analytics
+            for det in final_detections:
+                all_confidences.append(det["conf"])
+                if det["label"] in class_counts:
+                    class_counts[det["label"]] += 1
+
+            rows.append({
+                "image": img_path.name,
+                "raw_detections": len(raw_detections),
+                "final_detections": len(final_detections),
+                "exemptions": exemptions,
+                "detections": [
+                    {"label": d["label"], "conf": round(d["conf"], 4), "box": [d["x1"], d["y1"], d["x2"], d["y2"]]}
+                    for d in final_detections
+                ],
             })
 
-        stats['total_before'] += len(raw_detections)
+            # 4. Annotate & save in the background (bounded, so decoded images don't pile up)
+            if writers is not None:
+                pending_writes.append(
+                    writers.submit(annotate_and_save, img, final_detections, Path(args.output) / img_path.name)
+                )
+                while len(pending_writes) > args.write_workers * 4:
+                    pending_writes.popleft().result()
 
-        # 2. Filter Detections via Custom NMS
-        final_detections, exemptions = apply_custom_nms(raw_detections, IOMIN_THRESHOLD)
-        stats['total_exemptions'] += exemptions
-        stats['total_after'] += len(final_detections)
-        stats['total_removed'] += (len(raw_detections) - len(final_detections))
+            # Terminal Logging
+            status = "✅" if final_detections else "⬜"
+            exempt_msg = f" [Saved {exemptions} diff-type overlap!]" if exemptions > 0 else ""
+            print(f"  {status} {img_path.name:<35} {len(final_detections)} box(es){exempt_msg}")
 
-        if final_detections:
-            stats['images_with_hazards'] += 1
+    if writers is not None:
+        for future in pending_writes:
+            future.result()
+        writers.shutdown()
 
-        # 3. Draw Annotations & Log Analytics
-        for det in final_detections:
-            all_confidences.append(det["conf"])
-            if det["label"] in class_counts:
-                class_counts[det["label"]] += 1
-                
-            x1, y1, x2, y2 = det["x1"], det["y1"], det["x2"], det["y2"]
-            colour = CLASS_COLOURS.get(det["label"], DEFAULT_COLOUR)
-            
-            # Draw Bounding Box
-            cv2.rectangle(img, (x1, y1), (x2, y2), colour, 2)
-            
-            # Draw Label Tag
-            display_text = f"{det['label']} {det['conf']:.2f}"
-            (text_w, text_h), baseline = cv2.getTextSize(display_text, cv2.FONT_HERSHEY_SIMPLEX, 0.55, 1)
-            cv2.rectangle(img, (x1, y1 - text_h - baseline - 6), (x1 + text_w + 6, y1), colour, -1)
-            cv2.putText(img, display_text, (x1 + 3, y1 - baseline - 3), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 1, cv2.LINE_AA)
-
-        # Save annotated image
-        cv2.imwrite(str(Path(OUTPUT_DIR) / img_path.name), img)
-        
-        # Terminal Logging
-        status = "✅" if final_detections else "⬜"
-        exempt_msg = f" [Saved {exemptions} diff-type overlap!]" if exemptions > 0 else ""
-        print(f"  {status} {img_path.name:<35} {len(final_detections)} box(es){exempt_msg}")
+    write_results(rows, args.results)
 
     # Generate Final Report Data
-    generate_academic_charts(stats, class_counts, all_confidences)
+    if not args.no_charts:
+        generate_academic_charts(stats, class_counts, all_confidences)
 
     # Print Formal Summary
     print(f"""
     {'='*60}
      FYP TESTING COMPLETE
     {'='*60}
-     Images processed:          {len(image_files)}
+     Images processed:          {processed}
      Validated Detections:      {stats['total_after']}
      Overlapping Ghost Removed: {stats['total_removed']}
      Edge-Case Exemptions:      {stats['total_exemptions']} 🛡️
-     
-     Annotated Images saved to: {OUTPUT_DIR}/
-     Formal Charts saved to:    {CHARTS_DIR}/
+
+     Per-image results saved to: {args.results}
+     Annotated Images saved to: {'(skipped)' if args.no_annotate else args.output + '/'}
+     Formal Charts saved to:    {'(skipped)' if args.no_charts else CHARTS_DIR + '/'}
     {'='*60}
     """)
 
 # Execute Script
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,102 @@
+"""
+On-disk store of raw (pre-NMS) model predictions, so threshold tuning can
+replay the custom NMS + aggregation without running the model again.
+
+One compressed NumPy archive per model, named after a hash of the weights
+file: ``<store>/<model_hash>.npz``. Inside, every image has three arrays keyed
+by a hash of the image's bytes — ``<image_hash>/xyxy`` (float32, N×4, original
+pixels), ``<image_hash>/conf`` and ``<image_hash>/cls`` — plus one ``__meta__``
+JSON entry holding the class names and the confidence floor the predictions
+were made at. Renaming or moving images does not invalidate anything; new
+weights or edited images simply miss.
+
+    store = PredictionStore.open("prediction_cache", "best.pt", conf_floor=0.01)
+    raw = store.get(image_hash(data))       # (xyxy, conf, cls) or None
+    store.put(image_hash(data), xyxy, conf, cls)
+    store.save()
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+STORE_DIR = "prediction_cache"
+CONF_FLOOR = 0.01   # Predictions are stored down to this confidence
+_META_KEY = "__meta__"
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Hash of a weights file's contents (first 16 hex chars of SHA-256)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def image_hash(data):
+    """Hash of an image's raw bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class PredictionStore:
+    """Raw predictions of one model, keyed by image hash."""
+
+    def __init__(self, path, names, conf_floor):
+        self.path = Path(path)
+        self.names = names
+        self.conf_floor = conf_floor
+        self._entries = {}
+        self._dirty = False
+
+    @classmethod
+    def open(cls, store_dir, model_path, conf_floor=CONF_FLOOR, names=None):
+        """Load (or start) the store for the weights at ``model_path``.
+
+        An existing archive made at a higher confidence floor than requested is
+        discarded, since it lacks the low-confidence boxes the caller wants.
+        """
+        path = Path(store_dir) / f"{file_hash(model_path)}.npz"
+        store = cls(path, names or {}, conf_floor)
+        if path.is_file():
+            with np.load(path) as archive:
+                meta = json.loads(str(archive[_META_KEY]))
+                if meta["conf_floor"] <= conf_floor:
+                    store.names = {int(k): v for k, v in meta["names"].items()}
+                    store.conf_floor = meta["conf_floor"]
+                    for key in archive.files:
+                        if key.endswith("/xyxy"):
+                            h = key[: -len("/xyxy")]
+                            store._entries[h] = (archive[key], archive[f"{h}/conf"], archive[f"{h}/cls"])
+        return store
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, xyxy, conf, cls):
+        self._entries[key] = (
+            np.asarray(xyxy, dtype=np.float32).reshape(-1, 4),
+            np.asarray(conf, dtype=np.float32),
+            np.asarray(cls, dtype=np.int16),
+        )
+        self._dirty = True
+
+    def save(self):
+        """Write the archive (atomically) if anything was added."""
+        if not self._dirty:
+            return
+        arrays = {_META_KEY: np.array(json.dumps({"names": self.names, "conf_floor": self.conf_floor}))}
+        for key, (xyxy, conf, cls) in self._entries.items():
+            arrays[f"{key}/xyxy"], arrays[f"{key}/conf"], arrays[f"{key}/cls"] = xyxy, conf, cls
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        tmp.replace(self.path)
+        self._dirty = False
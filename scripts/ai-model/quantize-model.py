@@ -0,0 +1,76 @@
+"""
+Dynamic INT8 quantization of the exported ONNX graph for the AI service's
+onnxruntime backend (INFERENCE_BACKEND=onnx, MODEL_PRECISION=int8).
+
+    python quantize-model.py                         # best.onnx -> best.int8.onnx
+    python quantize-model.py --onnx path/to/best.onnx --output best.int8.onnx
+
+Weights are stored as 8-bit integers and activations are quantized on the fly,
+so no calibration images are needed. The graph first goes through
+onnxruntime's shape-inference/optimisation pre-pass. The class-name metadata
+that export-onnx.py embeds is copied over, because the backend reads the names
+from it. Check the accuracy/latency trade-off before deploying:
+
+    python compare-backends.py --reference onnx:best.onnx --candidate onnx:best.int8.onnx --report-only
+
+Copy the resulting file next to best.onnx in ai-microservice/.
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import onnx
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+ONNX_PATH = "best.onnx"
+OUTPUT_PATH = "best.int8.onnx"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize best.onnx to INT8 for the AI service.")
+    parser.add_argument("--onnx", default=ONNX_PATH, help="FP32 graph from export-onnx.py.")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Where to write the INT8 graph.")
+    parser.add_argument("--weight-type", choices=["uint8", "int8"], default="uint8",
+                        help="Weight encoding (uint8 is the faster path on most x86 CPUs).")
+    parser.add_argument("--skip-preprocess", action="store_true",
+                        help="Quantize the graph as-is, without the shape-inference pre-pass.")
+    args = parser.parse_args()
+
+    source = onnx.load(args.onnx)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_input = args.onnx
+        if not args.skip_preprocess:
+            model_input = str(Path(tmp) / "preprocessed.onnx")
+            try:
+                quant_pre_process(args.onnx, model_input)
+            except ImportError:  # symbolic shape inference needs sympy
+                print("⚠️  sympy not installed; pre-processing without symbolic shape inference.")
+                quant_pre_process(args.onnx, model_input, skip_symbolic_shape=True)
+
+        quantize_dynamic(
+            model_input,
+            args.output,
+            weight_type=QuantType.QUInt8 if args.weight_type == "uint8" else QuantType.QInt8,
+        )
+
+    # Carry the ultralytics metadata (class names, imgsz, stride) across.
+    quantized = onnx.load(args.output)
+    existing = {prop.key for prop in quantized.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            quantized.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(quantized, args.output)
+
+    before_mb = Path(args.onnx).stat().st_size / 1e6
+    after_mb = Path(args.output).stat().st_size / 1e6
+    print(f"✅ Quantized {args.onnx} ({before_mb:.1f} MB) -> {args.output} ({after_mb:.1f} MB)")
+    print("   Serve it with INFERENCE_BACKEND=onnx MODEL_PRECISION=int8.")
+
+
+if __name__ == "__main__":
+    main()
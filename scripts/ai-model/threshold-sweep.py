@@ -0,0 +1,200 @@
+"""
+Threshold sweep for the custom NMS: replays post-processing over a grid of
+confidence × IoMin thresholds from stored raw predictions, without the model.
+
+The first run (or any run that meets a new image or new weights) predicts the
+missing images once at a low confidence floor (prediction_store.CONF_FLOOR) and
+saves the raw pre-NMS boxes to prediction_cache/. Every run then replays the
+service's own custom NMS (``custom_nms_indices`` — the same-type suppression
+with the cross-type exemption) for each grid point on all cores, and reports
+per point: raw boxes above the confidence threshold, boxes kept and removed,
+cross-type exemptions, images with a hazard, and the class distribution of the
+kept boxes. The result applies to both CONF_THRESHOLD / IOMIN_THRESHOLD in
+model-testing.py and CONF_THRESHOLD / IOMIN_THRESHOLD in the service settings.
+
+    python threshold-sweep.py
+    python threshold-sweep.py --conf 0.15:0.45:0.05 --iomin 0.3,0.45,0.6 --csv sweep.csv
+    python threshold-sweep.py --onnx best.onnx          # predictions from the onnx graph
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from prediction_store import CONF_FLOOR, STORE_DIR, PredictionStore, image_hash
+
+# Reuse the service code directly so the replay is exactly what is deployed.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "ai-microservice"))
+
+from app.services.postprocess import build_class_table, custom_nms_indices  # noqa: E402
+
+# ==========================================
+# ⚙️ CONFIGURATION & THRESHOLDS
+# ==========================================
+MODEL_PATH = "best.pt"
+INPUT_DIR = "test_images"
+
+CONF_GRID = "0.10:0.50:0.05"
+IOMIN_GRID = "0.30:0.70:0.05"
+
+# Current settings, marked in the report
+CONF_THRESHOLD = 0.25
+IOMIN_THRESHOLD = 0.45
+
+PREDICT_BATCH = 8
+
+
+def parse_grid(spec):
+    """``0.1,0.2,0.3`` or ``start:stop:step`` (stop inclusive) -> sorted values."""
+    if ":" in spec:
+        start, stop, step = (float(part) for part in spec.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+    else:
+        values = [float(part) for part in spec.split(",")]
+    return sorted({round(float(v), 4) for v in values})
+
+
+def fill_store(store, image_files, args):
+    """Predict the images the store does not hold yet; the model is only
+    loaded when there is something to predict."""
+    missing = []
+    for img_path in image_files:
+        data = img_path.read_bytes()
+        key = image_hash(data)
+        if key not in store:
+            missing.append((key, data))
+    if not missing:
+        return
+
+    from app.core.config import Settings
+    from app.services.backends import load_backend
+    from app.services.preprocess import decode_image
+
+    if args.onnx:
+        backend = load_backend(Settings(inference_backend="onnx", onnx_model_path=args.onnx))
+    else:
+        backend = load_backend(Settings(inference_backend="torch", model_path=args.weights))
+    store.names = dict(backend.names)
+
+    print(f"🔍 Predicting {len(missing)} image(s) not in the store (conf >= {store.conf_floor})...")
+    started = time.perf_counter()
+    for i in range(0, len(missing), PREDICT_BATCH):
+        chunk = missing[i:i + PREDICT_BATCH]
+        # Full resolution, scale 1: boxes come back in original-image pixels.
+        arrays = [decode_image(data, None).array for _, data in chunk]
+        for (key, _), raw in zip(chunk, backend.predict(arrays, store.conf_floor)):
+            store.put(key, raw.xyxy, raw.conf, raw.cls)
+    store.save()
+    print(f"💾 Stored in {store.path} ({time.perf_counter() - started:.1f} s)\n")
+
+
+# -- replay (runs in the worker processes) -----------------------------------
+_PREDICTIONS = []
+_CLASSES = None
+
+
+def _init_worker(predictions, names):
+    """Keep every image's boxes (valid classes only, truncated to int pixels,
+    as the service does) in the worker once, instead of per grid point."""
+    global _PREDICTIONS, _CLASSES
+    _CLASSES = build_class_table(names)
+    _PREDICTIONS = []
+    for xyxy, conf, cls in predictions:
+        cls = cls.astype(np.int64)
+        base_type = _CLASSES.base_type[cls] if len(cls) else np.empty(0, dtype=np.int64)
+        valid = base_type >= 0
+        conf = conf.astype(np.float64)
+        _PREDICTIONS.append((conf, xyxy.astype(np.int64)[valid], conf[valid], cls[valid], base_type[valid]))
+
+
+def _replay(point):
+    conf_threshold, iomin_threshold = point
+    raw = kept = exemptions = detected = 0
+    classes = Counter()
+    for all_conf, boxes, conf, cls, base_type in _PREDICTIONS:
+        raw += int(np.count_nonzero(all_conf >= conf_threshold))
+        above = conf >= conf_threshold
+        keep, exempt = custom_nms_indices(boxes[above], conf[above], base_type[above], iomin_threshold)
+        kept += len(keep)
+        exemptions += exempt
+        detected += bool(len(keep))
+        classes.update(cls[above][keep].tolist())
+    return {
+        "conf": conf_threshold,
+        "iomin": iomin_threshold,
+        "raw_boxes": raw,
+        "kept_boxes": kept,
+        "removed": raw - kept,
+        "exemptions": exemptions,
+        "images_detected": detected,
+        "classes": {_CLASSES.labels[c]: n for c, n in sorted(classes.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep NMS thresholds over stored raw predictions.")
+    parser.add_argument("--weights", default=MODEL_PATH, help="torch weights (ignored with --onnx).")
+    parser.add_argument("--onnx", help="Predict with this onnx graph instead.")
+    parser.add_argument("--images", default=INPUT_DIR)
+    parser.add_argument("--store", default=STORE_DIR, help="Directory of the prediction store.")
+    parser.add_argument("--conf", default=CONF_GRID, help="Confidence grid: a,b,c or start:stop:step.")
+    parser.add_argument("--iomin", default=IOMIN_GRID, help="IoMin grid: a,b,c or start:stop:step.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Replay processes.")
+    parser.add_argument("--csv", help="Write one row per grid point to this CSV file.")
+    args = parser.parse_args()
+
+    conf_grid, iomin_grid = parse_grid(args.conf), parse_grid(args.iomin)
+    if conf_grid[0] < CONF_FLOOR:
+        print(f"❌ Error: the store only holds boxes with confidence >= {CONF_FLOOR}.")
+        return 1
+
+    image_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+    image_files = sorted(f for f in Path(args.images).iterdir() if f.suffix.lower() in image_extensions)
+    if not image_files:
+        print(f"❌ Error: No images found in '{args.images}'.")
+        return 1
+
+    store = PredictionStore.open(args.store, args.onnx or args.weights)
+    fill_store(store, image_files, args)
+    predictions = [store.get(image_hash(f.read_bytes())) for f in image_files]
+
+    grid = [(c, i) for c in conf_grid for i in iomin_grid]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(predictions, store.names)) as pool:
+        rows = list(pool.map(_replay, grid, chunksize=max(1, len(grid) // (4 * args.workers))))
+    elapsed = time.perf_counter() - started
+
+    print(f"  {'conf':>5} {'iomin':>5} {'raw':>6} {'kept':>6} {'removed':>8} {'exempt':>6} {'images':>7}  classes")
+    for row in rows:
+        current = "  ◀ current" if (row["conf"], row["iomin"]) == (CONF_THRESHOLD, IOMIN_THRESHOLD) else ""
+        removed_pct = 100 * row["removed"] / row["raw_boxes"] if row["raw_boxes"] else 0.0
+        classes = ", ".join(f"{label} {n}" for label, n in row["classes"].items())
+        print(f"  {row['conf']:5.2f} {row['iomin']:5.2f} {row['raw_boxes']:6d} {row['kept_boxes']:6d} "
+              f"{row['removed']:5d} ({removed_pct:4.1f}%) {row['exemptions']:6d} "
+              f"{row['images_detected']:3d}/{len(image_files):<3d}  {classes}{current}")
+
+    if args.csv:
+        labels = [store.names[c] for c in sorted(store.names)]
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[k for k in rows[0] if k != "classes"] + labels)
+            writer.writeheader()
+            for row in rows:
+                counts = Counter(row.pop("classes"))
+                writer.writerow({**row, **{label: counts[label] for label in labels}})
+
+    print(f"""
+    {'='*60}
+     {len(grid)} grid points over {len(image_files)} images in {elapsed:.2f} s ({args.workers} workers)
+    {'='*60}""" + (f"\n     Sweep saved to: {args.csv}" if args.csv else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
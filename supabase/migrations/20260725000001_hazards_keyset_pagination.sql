@@ -0,0 +1,22 @@
+-- ============================================================
+-- JalanGuard — Keyset pagination index for the Open Data API
+-- Run this in: Supabase Dashboard → SQL Editor → New Query
+--
+-- GET /api/v1/hazards pages newest-first with an opaque cursor on
+-- (created_at, id): each page asks for rows strictly "after" the last one it
+-- returned instead of skipping OFFSET rows. With a matching composite index
+-- that is an index range scan of `limit` rows, however deep the page.
+--
+-- Keyset order needs every row to have a created_at. The column has always
+-- defaulted to now(), so NULLs can only come from rows inserted with an
+-- explicit NULL; they are backfilled from updated_at before the constraint.
+-- ============================================================
+
+UPDATE public.hazards
+   SET created_at = COALESCE(updated_at, now())
+ WHERE created_at IS NULL;
+
+ALTER TABLE public.hazards ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_hazards_created_at_id
+  ON public.hazards USING btree (created_at DESC, id DESC);
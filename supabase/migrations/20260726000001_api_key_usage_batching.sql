@@ -0,0 +1,89 @@
+-- ============================================================
+-- JalanGuard — Batched API-key usage stamps
+-- Run this in: Supabase Dashboard → SQL Editor → New Query
+--
+-- The Open Data API now caches verified keys for a short TTL and records
+-- last_used_at in memory, flushing it every few seconds in one call instead
+-- of one UPDATE per request.
+--
+--   • verify_api_key(raw_key, stamp_last_used) — same check as before; the
+--     new flag (default true, so existing callers are unchanged) lets the
+--     backend skip the per-call UPDATE.
+--   • touch_api_keys(usage) — applies a batch of
+--     [{"public_id": "...", "used_at": "<timestamptz>"}] stamps. A stamp never
+--     moves last_used_at backwards, and ids of revoked keys simply match no row.
+-- ============================================================
+
+-- ------------------------------------------------------------
+-- 1. verify_api_key — optional last_used_at stamp
+--    The one-argument version is dropped first; the new signature's default
+--    keeps verify_api_key(raw_key) calls working.
+-- ------------------------------------------------------------
+DROP FUNCTION IF EXISTS public.verify_api_key(TEXT);
+
+CREATE OR REPLACE FUNCTION public.verify_api_key(raw_key TEXT, stamp_last_used BOOLEAN DEFAULT true)
+RETURNS UUID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, vault, extensions
+AS $$
+DECLARE
+  v_public_id TEXT;
+  v_row       public.api_keys%ROWTYPE;
+  v_stored    TEXT;
+BEGIN
+  IF raw_key IS NULL OR raw_key !~ '^jg_[0-9a-f]+_[0-9a-f]+$' THEN
+    RETURN NULL;
+  END IF;
+
+  v_public_id := split_part(raw_key, '_', 2);
+
+  SELECT * INTO v_row FROM public.api_keys WHERE key_public_id = v_public_id;
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  SELECT ds.decrypted_secret INTO v_stored
+    FROM vault.decrypted_secrets ds
+   WHERE ds.id = v_row.secret_id;
+
+  IF v_stored IS NULL OR v_stored IS DISTINCT FROM raw_key THEN
+    RETURN NULL;
+  END IF;
+
+  IF stamp_last_used THEN
+    UPDATE public.api_keys SET last_used_at = now() WHERE id = v_row.id;
+  END IF;
+  RETURN v_row.user_id;
+END;
+$$;
+
+-- ------------------------------------------------------------
+-- 2. touch_api_keys(usage) — batched last_used_at write-back
+-- ------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.touch_api_keys(usage JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_updated INTEGER;
+BEGIN
+  UPDATE public.api_keys k
+     SET last_used_at = GREATEST(COALESCE(k.last_used_at, u.used_at), u.used_at)
+    FROM jsonb_to_recordset(usage) AS u(public_id TEXT, used_at TIMESTAMPTZ)
+   WHERE k.key_public_id = u.public_id;
+  GET DIAGNOSTICS v_updated = ROW_COUNT;
+  RETURN v_updated;
+END;
+$$;
+
+-- ------------------------------------------------------------
+-- 3. Grants — backend service_role ONLY (see 20260712000001 for why the
+--    explicit anon/authenticated revokes are needed)
+-- ------------------------------------------------------------
+REVOKE EXECUTE ON FUNCTION public.verify_api_key(TEXT, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT  EXECUTE ON FUNCTION public.verify_api_key(TEXT, BOOLEAN) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.touch_api_keys(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT  EXECUTE ON FUNCTION public.touch_api_keys(JSONB) TO service_role;
@@ -0,0 +1,31 @@
+-- ============================================================
+-- JalanGuard — Freshness watermark for the Open Data API cache
+-- Run this in: Supabase Dashboard → SQL Editor → New Query
+--
+-- The API caches GET /api/v1/hazards pages and reuses one only while
+-- max(hazards.updated_at) is unchanged. That needs three things:
+--   * every UPDATE of a column the API serves moves updated_at (until now only
+--     the lifecycle function set it, by hand). The existing set_updated_at()
+--     trigger provides that; it is limited to those columns so bookkeeping
+--     writes such as last_checkin_at neither change the public updated_at nor
+--     invalidate the cache;
+--   * no NULLs, which would sort first in the DESC probe and hide the max;
+--   * an index, so the probe reads one index entry instead of the table.
+-- ============================================================
+
+UPDATE public.hazards
+   SET updated_at = created_at
+ WHERE updated_at IS NULL;
+
+ALTER TABLE public.hazards ALTER COLUMN updated_at SET NOT NULL;
+
+DROP TRIGGER IF EXISTS hazards_set_updated_at ON public.hazards;
+CREATE TRIGGER hazards_set_updated_at
+  BEFORE UPDATE OF defect_type, severity, status, confidence, latitude, longitude,
+                   description, reporter_name, image_urls, adm0_id, adm1_id, adm2_id
+  ON public.hazards
+  FOR EACH ROW
+  EXECUTE FUNCTION public.set_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_hazards_updated_at
+  ON public.hazards USING btree (updated_at DESC);